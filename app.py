@@ -1,167 +1,357 @@
-from flask import Flask, request, jsonify, render_template, send_from_directory
+from flask import Flask, Response, g, has_request_context, request, jsonify, send_from_directory
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
+from werkzeug.local import LocalProxy
+from werkzeug.security import safe_join
+import base64
 import json
 import os
+import random
 import urllib.parse
+import numpy as np
+from catalog import (PATTERNS_FILE, HERBS_FILE, PRODUCTS_FILE, Catalog, load_herbs, load_patterns,
+                     load_products, validate_catalog)
+from color_index import DEFAULT_TOLERANCE as DEFAULT_COLOR_TOLERANCE, ColorIndexManager, lab_to_hex, parse_hex
+from compact import freeze_heap
+from compiled_catalog import COMPILED_FILE, load_compiled
+from data_store import DataStore, Snapshot
+from facets import HERB_FACETS, PATTERN_FACETS, CombinationFacets
+from file_sender import FileStatCache, send_cached_file
+from image_derivatives import MAX_AGE as DERIVATIVE_MAX_AGE, get_derivative, normalize_format
+from image_store import ImageStore
+from metrics import (CACHE_LOOKUPS, CONTENT_TYPE as METRICS_CONTENT_TYPE, IMAGE_BYTES, REGISTRY,
+                     init_app as init_metrics, stage)
+from page_cache import init_app as init_page_cache, render_page
 from pattern_matcher import PatternMatcher
+from payloads import SHAPES, normalize_combinations, parse_fields, project, record_fields
+from profiler import RequestProfiler
+from recommendations import build_recommendations
+from response_cache import PrecomputedResponse
+from sampler import CombinationSampler, decode_session, encode_session
+from score_artifacts import load_artifact as load_score_artifact
+from visual_index import VisualIndexManager
 
 app = Flask(__name__)
 
+# Request counts, latency histograms and stage timers, served at /metrics
+init_metrics(app)
+# Compiled templates persist in cache/templates across restarts
+init_page_cache(app)
+# Opt-in cProfile capture via the X-Profile header; disabled unless PROFILE_TOKEN is set
+profiler = RequestProfiler(os.environ.get('PROFILE_TOKEN'),
+                           min_interval=float(os.environ.get('PROFILE_MIN_INTERVAL', '60')))
+profiler.init_app(app)
+
 
 # ========== Data Loading Functions ==========
-def load_patterns():
-    """Load pattern data from patterns.json"""
-    try:
-        with open('data/patterns/patterns.json', 'r', encoding='utf-8') as f:
-            patterns = json.load(f)
-
-        # Add data validation for each pattern
-        for pattern in patterns:
-            # Ensure required fields exist
-            if 'id' not in pattern:
-                pattern['id'] = f"pattern_{patterns.index(pattern) + 1}"
-            if 'style_tags' not in pattern:
-                pattern['style_tags'] = []
-            if 'elements' not in pattern:
-                pattern['elements'] = []
-            if 'colors' not in pattern:
-                pattern['colors'] = []
-
-        return patterns
-    except Exception as e:
-        print(f"Failed to load pattern data: {e}")
-        return []
+# Built by `python compiled_catalog.py`; an empty value always parses the JSON files
+COMPILED_CATALOG = os.environ.get('COMPILED_CATALOG', COMPILED_FILE)
 
 
-def load_herbs():
-    """Load herbal medicine data from herbs.json"""
-    try:
-        with open('data/herbs.json', 'r', encoding='utf-8') as f:
-            herbs = json.load(f)
-        return herbs
-    except Exception as e:
-        print(f"Failed to load herbal medicine data: {e}")
-        return []
+def materialized_recommendations(snapshot):
+    """Recommendation sets, built once per snapshot"""
+    return snapshot.derived('recommendations', lambda: build_recommendations(snapshot.matcher))
+
+
+def combination_sampler(snapshot):
+    """Score-weighted alias sampler for /api/combinations/random, built once per snapshot"""
+    return snapshot.derived('combination_sampler', lambda: CombinationSampler.from_matcher(snapshot.matcher))
 
-def load_products():
-    """Load product data from products.json"""
-    try:
-        with open('data/products/products.json', 'r', encoding='utf-8') as f:
-            products = json.load(f)
-        return products
-    except Exception as e:
-        print(f"Failed to load product data: {e}")
-        return []
+
+def combination_facets(snapshot):
+    """Facet bitmaps for /api/combinations/query, built once per snapshot"""
+    return snapshot.derived('combination_facets', lambda: CombinationFacets.from_matcher(snapshot.matcher))
+
+
+def build_snapshot(strict=False):
+    """Load the data files into a new Snapshot (strict: validate and raise on bad data)"""
+    # The compiled catalog is validated and indexed already; it is only used while it matches the JSON files
+    catalog = load_compiled(COMPILED_CATALOG) if COMPILED_CATALOG else None
+    if catalog is None:
+        patterns, herbs, products = load_patterns(strict), load_herbs(strict), load_products(strict)
+        if strict:
+            validate_catalog(patterns, herbs, products)
+        # Indexed catalog: built once per data version, not per request
+        catalog = Catalog(patterns, herbs, products)
+
+    # Shared matcher, also built once per data version
+    matcher = PatternMatcher(catalog.patterns, catalog.herbs)
+
+    # Prefer the offline score artifact (memory-mapped, shared by all workers)
+    scores = load_score_artifact(catalog, matcher.matching_rules)
+    if scores is not None:
+        matcher.attach_score_matrix(scores)
+    else:
+        matcher.score_matrix()  # warm up before the snapshot is swapped in
+
+    snapshot = Snapshot(catalog, matcher)
+    # Recommendations (and their response body), the random-feed sampler and the query facets are ready
+    # before the swap, so reloads rebuild them in the watcher thread and no request waits on them
+    # under the derived lock
+    snapshot.responses.get('recommended', snapshot.version,
+                           lambda: PrecomputedResponse.from_json(app, materialized_recommendations(snapshot)))
+    combination_sampler(snapshot)
+    combination_facets(snapshot)
+    return snapshot
 
 
 # ========== Load Data ==========
-patterns_data = load_patterns()
-herbs_data = load_herbs()
-products_data = load_products()
+# Re-reads the JSON files in the background when they change (0 disables the watcher)
+DATA_RELOAD_INTERVAL = float(os.environ.get('DATA_RELOAD_INTERVAL', '2'))
+
+data_store = DataStore([PATTERNS_FILE, HERBS_FILE, PRODUCTS_FILE], build_snapshot,
+                       interval=DATA_RELOAD_INTERVAL)
+
+# Everything loaded so far lives as long as the process; keep the GC off those pages
+freeze_heap()
+
+
+def current_snapshot():
+    """The snapshot pinned to the current request, or the latest one outside requests"""
+    if has_request_context():
+        snapshot = getattr(g, 'snapshot', None)
+        if snapshot is None:
+            snapshot = g.snapshot = data_store.current
+        return snapshot
+    return data_store.current
+
+
+@app.before_request
+def pin_snapshot():
+    """Every request sees one consistent snapshot, even if a reload lands mid-request"""
+    g.snapshot = data_store.current
+
+
+# Routes use these as before; they resolve to the request's snapshot
+catalog = LocalProxy(lambda: current_snapshot().catalog)
+matcher = LocalProxy(lambda: current_snapshot().matcher)
+
+
+# Memory-mapped image descriptors, shared by all workers through the page cache
+visual_index = VisualIndexManager()
+# Dominant-color palettes of the pattern and product images, searched by Lab distance
+color_index = ColorIndexManager()
+
+
+def cached_json(name, build, cache=None):
+    """Serve build()'s JSON from the response cache, honouring If-None-Match and Accept-Encoding"""
+    built = []
+
+    def precompute():
+        built.append(True)
+        return PrecomputedResponse.from_json(app, build())
+
+    if cache is None:
+        cache = current_snapshot().responses
+    precomputed = cache.get(name, catalog.version, precompute)
+    CACHE_LOOKUPS.inc(cache='response', result='miss' if built else 'hit')
+    return precomputed.to_response(request)
+
+
+def requested_shape():
+    """?shape= for combination payloads: 'full' (default) or 'normalized', None for anything else"""
+    shape = request.args.get('shape', 'full')
+    return shape if shape in SHAPES else None
+
+
+def unknown_shape():
+    return jsonify({'error': f"Unknown shape, use one of: {', '.join(SHAPES)}"}), 400
+
+
+def combination_json(payload):
+    """jsonify a combination payload; ?shape=normalized side-loads the patterns and herbs once"""
+    shape = requested_shape()
+    if shape is None:
+        return unknown_shape()
+    if shape == 'normalized':
+        with stage('assembly'):
+            payload = normalize_combinations(payload)
+    return jsonify(payload)
+
+
+def projected_json(name, records):
+    """cached_json for a record list, projected to ?fields=a,b,c when given"""
+    known = current_snapshot().derived(f'{name}_fields', lambda: record_fields(records))
+    fields = parse_fields(request.args.get('fields'), known)
+    if fields is None:
+        return cached_json(name, lambda: records)
+    if not fields:
+        return jsonify({'error': f"No known fields requested, available: {', '.join(known)}"}), 400
+    # Canonical field list in the key, so ?fields=b,a and ?fields=a,,b share one cached body
+    return cached_json(f"{name}?fields={','.join(fields)}", lambda: project(records, fields),
+                       current_snapshot().projections)
 
 
 # ========== Basic Routes ==========
 @app.route('/')
 def home():
-    """Home page - Platform introduction"""
+    """Home page - Platform introduction; ?lang=zh for the Chinese page"""
     # 只获取前6个图案和产品作为特色展示
-    featured_patterns = patterns_data[:6]
-    featured_products = products_data[:6]
-
-    return render_template('index.html',
-                           featured_patterns=featured_patterns,
-                           featured_products=featured_products,
-                           total_patterns=len(patterns_data),
-                           total_products=len(products_data),
-                           total_herbs=len(herbs_data),
-                           total_combinations=len(patterns_data) * len(herbs_data))
+    return render_page(current_snapshot(), request, 'index.html', request.args.get('lang'),
+                       featured_patterns=lambda: catalog.patterns[:6],
+                       featured_products=lambda: catalog.products[:6],
+                       total_patterns=lambda: len(catalog.patterns),
+                       total_products=lambda: len(catalog.products),
+                       total_herbs=lambda: len(catalog.herbs),
+                       total_combinations=lambda: len(catalog.patterns) * len(catalog.herbs))
 
 
 @app.route('/patterns')
 def get_patterns_page():
     """Render HTML page showing all patterns"""
-    return render_template('patterns.html', patterns=patterns_data)
+    return render_page(current_snapshot(), request, 'patterns.html', request.args.get('lang'),
+                       patterns=lambda: catalog.patterns)
 
 
 @app.route('/combinations')
 def combinations_page():
     """Pattern + Herbal Medicine combination matching page"""
-    return render_template('combinations.html')
+    return render_page(current_snapshot(), request, 'combinations.html', request.args.get('lang'))
 
 @app.route('/products')
 def get_products_page():
     """Render HTML page showing all products"""
-    return render_template('products.html', products=products_data)
+    return render_page(current_snapshot(), request, 'products.html', request.args.get('lang'),
+                       products=lambda: catalog.products)
 
 
 # ========== API Routes ==========
 @app.route('/api/patterns')
 def get_patterns():
     """Get all patterns"""
-    return jsonify(patterns_data)
+    return projected_json('patterns', catalog.patterns)
 
 
 @app.route('/api/herbs')
 def get_herbs():
     """Get all herbal medicines"""
-    return jsonify(herbs_data)
+    return cached_json('herbs', lambda: catalog.herbs)
 
 @app.route('/api/products')
 def get_products():
     """Get all products"""
-    return jsonify(products_data)
+    return projected_json('products', catalog.products)
 
 
 @app.route('/api/search/patterns')
 def search_patterns():
-    """Search patterns by keyword"""
-    keyword = request.args.get('q', '').lower()
+    """Search patterns by keyword, ranked by relevance"""
+    keyword = request.args.get('q', '')
     culture = request.args.get('culture', '')
+    limit = request.args.get('limit', type=int)
+    offset = request.args.get('offset', default=0, type=int)
 
-    filtered_patterns = []
-    for pattern in patterns_data:
-        match = False
-
-        # Search logic
-        if keyword:
-            search_fields = [
-                pattern.get('name', ''),
-                pattern.get('meaning', ''),
-                pattern.get('description', '')
-            ] + pattern.get('style_tags', []) + pattern.get('elements', [])
-
-            if any(keyword in str(field).lower() for field in search_fields):
-                match = True
-        else:
-            match = True
+    filtered_patterns, total = catalog.search_index.search(keyword, culture, limit=limit, offset=offset)
 
-        # Culture filter
-        if culture and pattern.get('culture') != culture:
-            match = False
-
-        if match:
-            filtered_patterns.append(pattern)
-
-    return jsonify(filtered_patterns)
+    response = jsonify(filtered_patterns)
+    response.headers['X-Total-Count'] = str(total)
+    return response
 
 
 @app.route('/api/match/patterns', methods=['POST'])
 def match_patterns():
     """Simple pattern matching"""
     data = request.json
+    if 'pattern_ids' in data:
+        return match_patterns_batch(data)
     pattern_id = data.get('pattern_id')
 
     if not pattern_id:
         return jsonify({'error': 'pattern_id is required'}), 400
 
-    # Create matcher
-    matcher = PatternMatcher(patterns_data, herbs_data)
-
     # Find similar patterns
     similar_patterns = matcher.find_similar_patterns(pattern_id)
 
     return jsonify(similar_patterns)
 
 
+# Upper bounds on one batch request
+MAX_BATCH_PATTERNS = 1000
+MAX_BATCH_PAIRS = 5000
+
+
+def match_patterns_batch(data):
+    """Similar patterns for every id in pattern_ids; unknown ids get an inline error"""
+    pattern_ids = data.get('pattern_ids')
+    if not isinstance(pattern_ids, list) or not pattern_ids:
+        return jsonify({'error': 'pattern_ids must be a non-empty list'}), 400
+    if len(pattern_ids) > MAX_BATCH_PATTERNS:
+        return jsonify({'error': f'At most {MAX_BATCH_PATTERNS} pattern_ids per request'}), 400
+    top_n = data.get('top_n', 5)
+    if isinstance(top_n, bool) or not isinstance(top_n, int):
+        return jsonify({'error': 'top_n must be an integer'}), 400
+    top_n = max(1, min(top_n, 50))
+
+    hashable = [pattern_id for pattern_id in pattern_ids if isinstance(pattern_id, (str, int))]
+    similar = matcher.find_similar_batch(hashable, top_n)
+
+    with stage('assembly'):
+        results, patterns = [], {}
+        for pattern_id in pattern_ids:
+            if not isinstance(pattern_id, (str, int)) or pattern_id not in similar:
+                results.append({'pattern_id': pattern_id, 'error': 'Pattern not found'})
+                continue
+            matches = []
+            for index, similarity in similar[pattern_id]:
+                pattern = matcher.patterns[index]
+                patterns.setdefault(pattern.get('id'), pattern)
+                matches.append({'id': pattern.get('id'), 'similarity': similarity})
+            results.append({'pattern_id': pattern_id, 'similar': matches})
+
+    return jsonify({
+        'top_n': top_n,
+        'data_version': catalog.version,
+        'results': results,
+        'errors': sum(1 for result in results if 'error' in result),
+        'patterns': patterns
+    })
+
+
+@app.route('/api/match/patterns/all')
+def match_all_patterns():
+    """Similar patterns for every pattern (bulk export), ids and similarity only"""
+    top_n = max(1, min(request.args.get('top_n', default=5, type=int), 50))
+    return jsonify({
+        'top_n': top_n,
+        'data_version': catalog.version,
+        'similar': matcher.find_similar_for_all(top_n)
+    })
+
+
+@app.route('/api/match/visual', methods=['POST'])
+def match_visual():
+    """Find visually similar patterns by image descriptor (cosine similarity)"""
+    data = request.json or {}
+    image = data.get('image')
+    try:
+        top_k = max(1, min(int(data.get('top_k', 5)), 50))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'top_k must be an integer'}), 400
+
+    pattern_id = data.get('pattern_id')
+    if pattern_id:
+        pattern = catalog.get_pattern(pattern_id)
+        if not pattern:
+            return jsonify({'error': 'Pattern not found'}), 404
+        image = pattern.get('image')
+
+    if not image:
+        return jsonify({'error': 'pattern_id or image is required'}), 400
+
+    index = visual_index.get()
+    if index is None:
+        # The first build runs in the background; python visual_index.py builds it at deploy time
+        return jsonify({'error': 'Visual index is being built, try again shortly'}), 503
+    results = index.similar_to_image(image, top_k)
+    if results is None:
+        return jsonify({'error': f'No visual descriptor for {image}'}), 404
+
+    return jsonify([{
+        'image': name,
+        'similarity': round(similarity, 4),
+        'pattern': catalog.patterns_by_image.get(name)
+    } for name, similarity in results])
+
+
 # ========== Combination Matching API Routes ==========
 @app.route('/api/combine/story', methods=['POST'])
 def create_story():
@@ -173,42 +363,93 @@ def create_story():
     if not pattern_id or not herb_id:
         return jsonify({'error': 'pattern_id and herb_id are required'}), 400
 
-    # Find pattern
-    pattern = None
-    herb = None
-
-    for p in patterns_data:
-        if p.get('id') == pattern_id:
-            pattern = p
-            break
-
-    for h in herbs_data:
-        if h.get('id') == herb_id:
-            herb = h
-            break
+    # Find pattern and herb
+    pattern = catalog.get_pattern(pattern_id)
+    herb = catalog.get_herb(herb_id)
 
     if not pattern or not herb:
         return jsonify({'error': 'Pattern or herbal medicine not found'}), 404
 
-    # Create matcher and generate story
-    matcher = PatternMatcher(patterns_data, herbs_data)
-    story = matcher.generate_story(pattern, herb)
+    # Score once and generate story
+    score = matcher.calculate_match_score(pattern, herb)
+    story = matcher.generate_story(pattern, herb, score, data.get('language'))
 
     return jsonify({
         'pattern': pattern,
         'herb': herb,
         'story': story,
         'combination_name': f"{pattern['name']}·{herb['name']} Series",
-        'match_score': matcher.calculate_match_score(pattern, herb)
+        'match_score': score
+    })
+
+
+@app.route('/api/combine/batch', methods=['POST'])
+def create_story_batch():
+    """Score (and tell the story of) many pattern + herb pairs in one request.
+
+    Body: {'pairs': [{'pattern_id', 'herb_id'}, ...], 'language', 'stories'}. Results
+    keep the request order; a pair that cannot be scored gets an inline 'error'.
+    Pattern and herb records are side-loaded once, keyed by id, like ?shape=normalized.
+    """
+    data = request.json or {}
+    pairs = data.get('pairs')
+    if not isinstance(pairs, list) or not pairs:
+        return jsonify({'error': 'pairs must be a non-empty list'}), 400
+    if len(pairs) > MAX_BATCH_PAIRS:
+        return jsonify({'error': f'At most {MAX_BATCH_PAIRS} pairs per request'}), 400
+    language = data.get('language')
+    with_stories = data.get('stories', True) is not False
+
+    # Resolve ids to score matrix positions; bad items keep their error and are not scored
+    results, positions = [], []
+    for item in pairs:
+        if not isinstance(item, dict):
+            results.append({'error': 'Each pair must be an object with pattern_id and herb_id'})
+            continue
+        pattern_id, herb_id = item.get('pattern_id'), item.get('herb_id')
+        result = {'pattern_id': pattern_id, 'herb_id': herb_id}
+        results.append(result)
+        if not pattern_id or not herb_id:
+            result['error'] = 'pattern_id and herb_id are required'
+            continue
+        try:
+            row, col = matcher.pattern_rows.get(pattern_id), matcher.herb_cols.get(herb_id)
+        except TypeError:  # unhashable ids
+            row = col = None
+        if row is None or col is None:
+            result['error'] = 'Pattern not found' if row is None else 'Herbal medicine not found'
+            continue
+        positions.append((result, row, col))
+
+    scores = matcher.score_pairs([row for _, row, _ in positions], [col for _, _, col in positions]).tolist()
+
+    with stage('stories'):
+        stories = {}
+        patterns, herbs = {}, {}
+        for (result, row, col), score in zip(positions, scores):
+            pattern, herb = matcher.patterns[row], matcher.herbs[col]
+            patterns.setdefault(pattern.get('id'), pattern)
+            herbs.setdefault(herb.get('id'), herb)
+            result['match_score'] = score
+            result['combination_name'] = f"{pattern['name']}·{herb['name']} Series"
+            if with_stories:
+                # Repeated pairs share one story; cache=False keeps a big batch out of the story LRU
+                if (row, col) not in stories:
+                    stories[row, col] = matcher.story_engine.render(pattern, herb, score, language, cache=False)
+                result['story'] = stories[row, col]
+
+    return jsonify({
+        'count': len(results),
+        'errors': sum(1 for result in results if 'error' in result),
+        'results': results,
+        'patterns': patterns,
+        'herbs': herbs
     })
 
 
 @app.route('/api/combinations/all')
 def get_all_combinations():
     """Get all pattern + herbal medicine combinations (sorted by match score)"""
-    # Create matcher
-    matcher = PatternMatcher(patterns_data, herbs_data)
-
     # Get all combinations
     combinations = matcher.find_all_combinations(max_results=50)
 
@@ -217,7 +458,7 @@ def get_all_combinations():
     good = [c for c in combinations if 50 <= c['score'] < 70]
     experimental = [c for c in combinations if c['score'] < 50]
 
-    return jsonify({
+    return combination_json({
         'total_combinations': len(combinations),
         'excellent_matches': excellent,
         'good_matches': good,
@@ -231,22 +472,133 @@ def get_all_combinations():
     })
 
 
+def encode_cursor(version, score, flat_index):
+    """Opaque resume token for the combination stream"""
+    raw = json.dumps([version, score, flat_index], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(version, score, flat_index), or None if the cursor is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        version, score, flat_index = json.loads(raw)
+        return str(version), int(score), int(flat_index)
+    except (ValueError, TypeError):
+        return None
+
+
+@app.route('/api/combinations/stream')
+def stream_combinations():
+    """Stream the full ranked combination space as NDJSON (one combination per line)"""
+    min_score = request.args.get('min_score', default=0, type=int)
+    culture = request.args.get('culture', '')
+    limit = request.args.get('limit', type=int)
+    with_stories = request.args.get('stories', '0') in ('1', 'true')
+    language = request.args.get('lang')
+
+    # Pin the snapshot now: the generator keeps running after the request context is gone
+    snapshot = current_snapshot()
+    stream_catalog, stream_matcher = snapshot.catalog, snapshot.matcher
+
+    after = None
+    cursor = request.args.get('cursor')
+    if cursor:
+        decoded = decode_cursor(cursor)
+        if decoded is None:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        if decoded[0] != snapshot.version:
+            return jsonify({'error': 'Cursor belongs to an older data version, restart the stream'}), 409
+        after = decoded[1:]
+
+    pattern_mask = None
+    if culture:
+        pattern_mask = np.array([p.get('culture') == culture for p in stream_catalog.patterns], dtype=bool)
+
+    ranked = stream_matcher.iter_ranked_combinations(min_score=min_score, pattern_mask=pattern_mask, after=after)
+    herb_count = len(stream_catalog.herbs)
+
+    def generate():
+        for count, (pattern_index, herb_index, score) in enumerate(ranked):
+            if limit is not None and count >= limit:
+                break
+            pattern = stream_catalog.patterns[pattern_index]
+            herb = stream_catalog.herbs[herb_index]
+            line = {
+                'pattern_id': pattern.get('id'),
+                'herb_id': herb.get('id'),
+                'combination_name': f"{pattern['name']}·{herb['name']} Series",
+                'score': score,
+                'cursor': encode_cursor(snapshot.version, score, pattern_index * herb_count + herb_index)
+            }
+            if with_stories:
+                line['story'] = stream_matcher.story_engine.render(pattern, herb, score, language, cache=False)
+            yield json.dumps(line, ensure_ascii=False) + '\n'
+
+    return Response(generate(), mimetype='application/x-ndjson',
+                    headers={'X-Data-Version': snapshot.version})
+
+
+@app.route('/api/combinations/query')
+def query_combinations():
+    """Filter combinations by any mix of facets and a score range, with per-facet counts"""
+    filters = {}
+    for name in (*PATTERN_FACETS, *HERB_FACETS):
+        # ?color=Red&color=Gold and ?color=Red,Gold both mean Red or Gold
+        values = [value.strip() for raw in request.args.getlist(name) for value in raw.split(',') if value.strip()]
+        if values:
+            filters[name] = [value.lower() for value in values] if name == 'color' else values
+    min_score = request.args.get('min_score', default=0, type=int)
+    max_score = request.args.get('max_score', default=100, type=int)
+    limit = min(max(request.args.get('limit', default=20, type=int), 0), 100)
+    offset = max(request.args.get('offset', default=0, type=int), 0)
+    with_stories = request.args.get('stories', '0') in ('1', 'true')
+
+    if min_score > max_score:
+        return jsonify({'error': 'min_score must not be greater than max_score'}), 400
+
+    facets = combination_facets(current_snapshot())
+    with stage('scoring'):
+        total, ranked, counts = facets.query(filters, min_score, max_score, limit=limit, offset=offset)
+
+    combinations = []
+    with stage('stories' if with_stories else 'assembly'):
+        for pattern_index, herb_index, score in ranked:
+            pattern = catalog.patterns[pattern_index]
+            herb = catalog.herbs[herb_index]
+            combinations.append({
+                'pattern': pattern,
+                'herb': herb,
+                'score': score,
+                'story': matcher.generate_story(pattern, herb, score) if with_stories else None,
+                'combination_name': f"{pattern['name']}·{herb['name']} Series",
+                'combination_id': f"{pattern.get('id', '')}_{herb.get('id', '')}"
+            })
+
+    return combination_json({
+        'total': total,
+        'offset': offset,
+        'limit': limit,
+        'filters': dict(filters, min_score=min_score, max_score=max_score),
+        'combinations': combinations,
+        'facets': counts
+    })
+
+
 @app.route('/api/combinations/cultural')
 def get_cultural_combinations():
     """Get combinations by cultural matching"""
     # Group by culture
-    chinese_patterns = [p for p in patterns_data if p.get('culture') == 'chinese']
-    muslim_patterns = [p for p in patterns_data if p.get('culture') == 'muslim']
-
-    matcher = PatternMatcher(patterns_data, herbs_data)
+    chinese_patterns = catalog.patterns_with_culture('chinese')
+    muslim_patterns = catalog.patterns_with_culture('muslim')
 
     results = []
 
     # Chinese patterns + herbal medicines
     for pattern in chinese_patterns[:3]:
-        for herb in herbs_data[:2]:
+        for herb in catalog.herbs[:2]:
             score = matcher.calculate_match_score(pattern, herb)
-            story = matcher.generate_story(pattern, herb)
+            story = matcher.generate_story(pattern, herb, score)
             results.append({
                 'type': 'Cultural Match (Chinese)',
                 'pattern': pattern,
@@ -258,9 +610,9 @@ def get_cultural_combinations():
     # Muslim patterns + herbal medicines
     if muslim_patterns:
         for pattern in muslim_patterns[:2]:
-            for herb in herbs_data[:2]:
+            for herb in catalog.herbs[:2]:
                 score = matcher.calculate_match_score(pattern, herb)
-                story = matcher.generate_story(pattern, herb)
+                story = matcher.generate_story(pattern, herb, score)
                 results.append({
                     'type': 'Cultural Match (Muslim)',
                     'pattern': pattern,
@@ -269,135 +621,200 @@ def get_cultural_combinations():
                     'story': story
                 })
 
-    return jsonify(results)
+    return combination_json(results)
 
 
 @app.route('/api/combinations/random')
 def get_random_combinations():
-    """Get random combinations (for inspiration)"""
-    import random
+    """Get random combinations (for inspiration), drawn in proportion to their match score.
 
+    ?session= (empty to start) makes a feed that does not repeat itself: pass
+    back the X-Session header of each response to exclude the pairs it served.
+    """
     count = request.args.get('count', default=10, type=int)
+    temperature = request.args.get('temperature', default=1.0, type=float)
+    min_score = request.args.get('min_score', default=0, type=int)
+    culture = request.args.get('culture') or None
+    session = request.args.get('session')
+    seed = request.args.get('seed')
+
+    if not temperature > 0:
+        return jsonify({'error': 'temperature must be greater than 0'}), 400
+    if requested_shape() is None:
+        return unknown_shape()
+
+    snapshot = current_snapshot()
+    sampler = combination_sampler(snapshot)
+    # A seed makes the draw reproducible for one data version
+    rng = random.Random(seed) if seed is not None else random.Random()
+    history = decode_session(session, snapshot.version) if session else []
+
+    with stage('sampling'):
+        drawn = sampler.sample(min(count, 20), rng, temperature=temperature, min_score=min_score,
+                               culture=culture, exclude=set(history))
 
     random_combinations = []
-    matcher = PatternMatcher(patterns_data, herbs_data)
+    with stage('stories'):
+        for pattern_index, herb_index, score in drawn:
+            pattern = catalog.patterns[pattern_index]
+            herb = catalog.herbs[herb_index]
+            random_combinations.append({
+                'pattern': pattern,
+                'herb': herb,
+                'score': score,
+                'story': matcher.generate_story(pattern, herb, score),
+                'combination_name': f"{pattern['name']}·{herb['name']}"
+            })
 
-    for _ in range(min(count, 20)):
-        pattern = random.choice(patterns_data)
-        herb = random.choice(herbs_data)
+    response = combination_json(random_combinations)
+    if session is not None:
+        response.headers['X-Session'] = encode_session(snapshot.version, history + [
+            pattern_index * sampler.herb_count + herb_index for pattern_index, herb_index, _ in drawn])
+    return response
 
-        score = matcher.calculate_match_score(pattern, herb)
-        story = matcher.generate_story(pattern, herb)
 
-        random_combinations.append({
-            'pattern': pattern,
-            'herb': herb,
-            'score': score,
-            'story': story,
-            'combination_name': f"{pattern['name']}·{herb['name']}"
-        })
+def color_theme_combinations(color_theme, matching_patterns, **extra):
+    """Best combinations of the first matching patterns with the first herbs, as by-color returns them"""
+    # Generate combinations
+    combinations = []
+    with stage('scoring'):
+        for pattern in matching_patterns[:5]:
+            for herb in catalog.herbs[:3]:
+                score = matcher.calculate_match_score(pattern, herb)
 
-    return jsonify(random_combinations)
+                combinations.append({
+                    'color_theme': color_theme,
+                    'pattern': pattern,
+                    'herb': herb,
+                    'score': score
+                })
+
+    # Sort by score, then only write stories for the combinations we return
+    with stage('sorting'):
+        combinations.sort(key=lambda x: x['score'], reverse=True)
+    with stage('stories'):
+        for combo in combinations[:10]:
+            combo['story'] = matcher.generate_story(combo['pattern'], combo['herb'], combo['score'])
+
+    return combination_json({
+        'color_theme': color_theme,
+        **extra,
+        'total_combinations': len(combinations),
+        'combinations': combinations[:10]
+    })
 
 
 @app.route('/api/combinations/by-color/<color>')
 def get_combinations_by_color(color):
     """Get combinations by color theme"""
     # Find patterns containing this color
+    matching_patterns = catalog.patterns_with_color(color)
+
+    if not matching_patterns:
+        return jsonify({'error': f'No patterns found with {color} color'}), 404
+
+    return color_theme_combinations(color, matching_patterns)
+
+
+def color_query():
+    """(hex, Lab, tolerance) from ?hex=&tolerance=, or an error response"""
+    hex_color = request.args.get('hex', '')
+    tolerance = request.args.get('tolerance', default=DEFAULT_COLOR_TOLERANCE, type=float)
+    if not hex_color:
+        return None, (jsonify({'error': 'hex is required, e.g. ?hex=c03a2b'}), 400)
+    try:
+        lab = parse_hex(hex_color)
+    except ValueError as e:
+        return None, (jsonify({'error': str(e)}), 400)
+    if not 0 < tolerance <= 100:
+        return None, (jsonify({'error': 'tolerance must be in (0, 100]'}), 400)
+    return (lab_to_hex(lab), lab, tolerance), None
+
+
+@app.route('/api/combinations/by-color')
+def get_combinations_near_color():
+    """Get combinations whose pattern images contain a color near ?hex= (ΔE within ?tolerance=)"""
+    query, error = color_query()
+    if error:
+        return error
+    hex_color, lab, tolerance = query
+
+    index = color_index.get()
+    if index is None:
+        return jsonify({'error': 'Color index is being built, try again shortly'}), 503
     matching_patterns = []
-    for pattern in patterns_data:
-        pattern_colors = [c.lower() for c in pattern.get('colors', [])]
-        if color.lower() in pattern_colors:
+    # Closest first; images that no pattern record uses are skipped
+    for row, _, _ in index.nearest(lab, tolerance, kind='pattern'):
+        pattern = catalog.patterns_by_image.get(index.entries[row]['name'])
+        if pattern is not None:
             matching_patterns.append(pattern)
 
     if not matching_patterns:
-        return jsonify({'error': f'No patterns found with {color} color'}), 404
+        return jsonify({'error': f'No patterns found near {hex_color}'}), 404
 
-    # Generate combinations
-    combinations = []
-    matcher = PatternMatcher(patterns_data, herbs_data)
+    return color_theme_combinations(hex_color, matching_patterns, tolerance=tolerance)
 
-    for pattern in matching_patterns[:5]:
-        for herb in herbs_data[:3]:
-            score = matcher.calculate_match_score(pattern, herb)
-            story = matcher.generate_story(pattern, herb)
 
-            combinations.append({
-                'color_theme': color,
-                'pattern': pattern,
-                'herb': herb,
-                'score': score,
-                'story': story
-            })
+@app.route('/api/colors/search')
+def search_colors():
+    """Pattern and product images with a dominant color near ?hex=, closest first"""
+    query, error = color_query()
+    if error:
+        return error
+    hex_color, lab, tolerance = query
+    kind = request.args.get('kind') or None
+    limit = max(1, min(request.args.get('limit', default=20, type=int), 100))
+    if kind not in (None, 'pattern', 'product'):
+        return jsonify({'error': 'kind must be pattern or product'}), 400
 
-    # Sort by score
-    combinations.sort(key=lambda x: x['score'], reverse=True)
+    index = color_index.get()
+    if index is None:
+        return jsonify({'error': 'Color index is being built, try again shortly'}), 503
 
-    return jsonify({
-        'color_theme': color,
-        'total_combinations': len(combinations),
-        'combinations': combinations[:10]
-    })
+    products_by_image = current_snapshot().derived('products_by_image', lambda: {
+        image: product for product in reversed(catalog.products) for image in product.get('images', [])})
+    results = []
+    for row, distance, weight in index.nearest(lab, tolerance, kind=kind)[:limit]:
+        entry = index.entries[row]
+        result = {
+            'kind': entry['kind'],
+            'image': entry['name'],
+            'distance': round(distance, 2),
+            'coverage': round(weight, 3),
+            'palette': index.palette(row)
+        }
+        if entry['kind'] == 'pattern':
+            result['pattern'] = catalog.patterns_by_image.get(entry['name'])
+        else:
+            result['product'] = products_by_image.get(entry['name'])
+        results.append(result)
+
+    return jsonify({'hex': hex_color, 'tolerance': tolerance, 'results': results})
 
 
 @app.route('/api/combinations/recommended')
 def get_recommended_combinations():
-    """Get recommended combinations (algorithm-based)"""
-    matcher = PatternMatcher(patterns_data, herbs_data)
-
-    # Get all combinations and sort
-    all_combinations = matcher.find_all_combinations(max_results=30)
-
-    # Categorized recommendations
-    recommendations = {
-        'top_picks': all_combinations[:3],
-        'cultural_matches': [],
-        'color_matches': [],
-        'meaning_matches': []
-    }
-
-    # Cultural match recommendations
-    for combo in all_combinations:
-        pattern_culture = combo['pattern'].get('culture', '')
-        herb_name = combo['herb'].get('name', '')
-
-        if pattern_culture == 'chinese' and herb_name in ['Ginseng', 'Goji Berry', 'Angelica', 'Astragalus', 'Chrysanthemum']:
-            if len(recommendations['cultural_matches']) < 3:
-                recommendations['cultural_matches'].append(combo)
-        elif pattern_culture == 'muslim' and herb_name not in ['Ginseng', 'Goji Berry', 'Angelica', 'Astragalus', 'Chrysanthemum']:
-            if len(recommendations['cultural_matches']) < 3:
-                recommendations['cultural_matches'].append(combo)
-
-    # Color theme recommendations
-    color_groups = {}
-    for combo in all_combinations:
-        colors = combo['pattern'].get('colors', [])
-        if colors:
-            main_color = colors[0]
-            if main_color not in color_groups:
-                color_groups[main_color] = []
-            if len(color_groups[main_color]) < 2:
-                color_groups[main_color].append(combo)
-
-    recommendations['color_matches'] = []
-    for color, combos in color_groups.items():
-        recommendations['color_matches'].extend(combos)
-
-    return jsonify(recommendations)
+    """Get recommended combinations (algorithm-based, materialized per data version)"""
+    shape = requested_shape()
+    if shape is None:
+        return unknown_shape()
+    if shape == 'normalized':
+        return cached_json('recommended?shape=normalized',
+                           lambda: normalize_combinations(materialized_recommendations(current_snapshot())))
+    return cached_json('recommended', lambda: materialized_recommendations(current_snapshot()))
 
 
 @app.route('/api/stats')
 def get_stats():
     """Get platform statistics"""
-    total_patterns = len(patterns_data)
-    total_herbs = len(herbs_data)
+    total_patterns = len(catalog.patterns)
+    total_herbs = len(catalog.herbs)
 
     # Calculate possible combinations
     total_possible_combinations = total_patterns * total_herbs
 
     # Calculate generated combinations
-    matcher = PatternMatcher(patterns_data, herbs_data)
-    generated_combinations = matcher.find_all_combinations(max_results=100)
+    generated_combinations = matcher.find_all_combinations(max_results=100, with_stories=False)
 
     return jsonify({
         'total_patterns': total_patterns,
@@ -409,23 +826,129 @@ def get_stats():
 
 
 # ========== Image Serving Routes ==========
+# Image stat() results are cached briefly, so hot images need no filesystem check per request
+file_stats = FileStatCache(ttl=float(os.environ.get('FILE_STAT_TTL', '5')))
+# name -> content hash manifest of data/patterns and data/products; /img/<hash> URLs never change content
+image_store = ImageStore(check_interval=float(os.environ.get('FILE_STAT_TTL', '5')))
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+def send_image(file_path, file_stat, etag=None, max_age=None, immutable=False):
+    """Send an image, or a resized derivative when ?w= or ?format= is given"""
+    width = request.args.get('w', type=int)
+    fmt = request.args.get('format')
+    if width is None and not fmt:
+        return count_image_bytes(send_cached_file(file_path, file_stat, etag=etag, max_age=max_age,
+                                                  immutable=immutable), 'original')
+
+    # Without an explicit format, serve WebP to clients that advertise it
+    negotiated = normalize_format(fmt) is None
+    if negotiated:
+        fmt = 'webp' if 'image/webp' in request.headers.get('Accept', '') else 'jpeg'
+
+    try:
+        path, derivative_etag, mimetype = get_derivative(file_path, width, fmt, stat=file_stat)
+        path = os.path.abspath(path)
+        derivative_stat = file_stats.stat(path)
+        if derivative_stat is None:
+            raise FileNotFoundError(path)
+    except Exception as e:
+        print(f"Cannot create derivative of {file_path}: {e}")
+        return count_image_bytes(send_cached_file(file_path, file_stat, etag=etag, max_age=max_age,
+                                                  immutable=immutable), 'original')
+
+    response = send_cached_file(path, derivative_stat, mimetype=mimetype, etag=derivative_etag,
+                                max_age=max(max_age or 0, DERIVATIVE_MAX_AGE), immutable=immutable)
+    if negotiated:
+        response.vary.add('Accept')
+    return count_image_bytes(response, 'derivative')
+
+
+def count_image_bytes(response, kind):
+    """Record the bytes an image response sends (nothing for 304s)"""
+    if response.status_code in (200, 206) and response.content_length:
+        IMAGE_BYTES.inc(response.content_length, kind=kind)
+    return response
+
+
+def find_image(image_directory, filename):
+    """(absolute path, FileStat) of an image inside image_directory, or (None, None)"""
+    # Data paths are relative to the working directory, like the JSON files; Flask would use the app root
+    file_path = safe_join(os.path.abspath(image_directory), filename)
+    if file_path is None:
+        return None, None
+    file_stat = file_stats.stat(file_path)
+    return (file_path, file_stat) if file_stat is not None else (None, None)
+
+
+def unchanged(stored):
+    """Whether the file still has the size and mtime it had when it was hashed"""
+    file_stat = file_stats.stat(stored.path)
+    return file_stat is not None and (file_stat.st_size, file_stat.st_mtime_ns) == (
+        stored.stat.st_size, stored.stat.st_mtime_ns)
+
+
+def stored_image(kind, filename):
+    """Current manifest entry of an image name; Flask has already decoded the URL, older links quote it twice"""
+    manifest = image_store.get()
+    stored = manifest.lookup(kind, filename)
+    if stored is None:
+        stored = manifest.lookup(kind, urllib.parse.unquote(filename))
+    # Edited since the last scan: its digest is stale until the background rehash
+    return stored if stored is not None and unchanged(stored) else None
+
+
+@app.route('/img/<digest>')
+def serve_stored_image(digest):
+    """Serve an image by content hash; the URL changes whenever the content does"""
+    stored = image_store.get().by_digest.get(digest)
+    if stored is None or not unchanged(stored):
+        return jsonify({'error': 'Image not found'}), 404
+    try:
+        return send_image(stored.path, stored.stat, etag=digest, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    except RequestedRangeNotSatisfiable:
+        raise
+    except Exception as e:
+        print(f"Cannot serve image {digest}: {e}")
+        return jsonify({'error': 'Image not available'}), 500
+
+
+@app.route('/api/images/manifest')
+def image_manifest():
+    """Image names -> /img/<hash> URLs, plus the duplicate report"""
+    manifest = image_store.get()
+    names = {}
+    for image in manifest.images:
+        names.setdefault(image.kind, {})[image.name] = f"/img/{image.digest}"
+    return jsonify({
+        'version': manifest.version,
+        'images': names,
+        'duplicates': [[f"{image.kind}/{image.name}" for image in group] for group in manifest.exact_duplicates()],
+        'near_duplicates': [{'images': [f"{first.kind}/{first.name}", f"{second.kind}/{second.name}"],
+                             'distance': distance} for first, second, distance in manifest.near_duplicates()]
+    })
+
+
 @app.route('/data/patterns/<path:filename>')
 def serve_pattern_image(filename):
     """Serve pattern images, supporting Chinese filenames"""
     try:
-        # Decode URL-encoded Chinese filenames
+        stored = stored_image('pattern', filename)
+        if stored is not None:
+            return send_image(stored.path, stored.stat, etag=stored.digest)
+
+        # Not in the manifest yet (added since the last scan): check the disk
         decoded_filename = urllib.parse.unquote(filename)
-        # Ensure directory exists
         image_directory = os.path.join('data', 'patterns')
-
-        # Check if file exists
-        file_path = os.path.join(image_directory, decoded_filename)
-        if not os.path.exists(file_path):
-            print(f"Image not found: {file_path}")
+        file_path, file_stat = find_image(image_directory, decoded_filename)
+        if file_path is None:
+            print(f"Image not found: {os.path.join(image_directory, decoded_filename)}")
             # Return placeholder image
             return send_from_directory('static', 'placeholder.jpg')
 
-        return send_from_directory(image_directory, decoded_filename)
+        return send_image(file_path, file_stat)
+    except RequestedRangeNotSatisfiable:
+        raise
     except Exception as e:
         print(f"Cannot serve image {filename}: {e}")
         # Return placeholder image
@@ -436,25 +959,35 @@ def serve_pattern_image(filename):
 def serve_product_image(filename):
     """Serve product images"""
     try:
-        # Decode URL-encoded Chinese filenames
+        stored = stored_image('product', filename)
+        if stored is not None:
+            return send_image(stored.path, stored.stat, etag=stored.digest)
+
+        # Not in the manifest yet (added since the last scan): check the disk
         decoded_filename = urllib.parse.unquote(filename)
-        # Ensure directory exists
         image_directory = os.path.join('data', 'products')
-
-        # Check if file exists
-        file_path = os.path.join(image_directory, decoded_filename)
-        if not os.path.exists(file_path):
-            print(f"Product image not found: {file_path}")
+        file_path, file_stat = find_image(image_directory, decoded_filename)
+        if file_path is None:
+            print(f"Product image not found: {os.path.join(image_directory, decoded_filename)}")
             # Return placeholder image
             return send_from_directory('static', 'placeholder.jpg')
 
-        return send_from_directory(image_directory, decoded_filename)
+        return send_image(file_path, file_stat)
+    except RequestedRangeNotSatisfiable:
+        raise
     except Exception as e:
         print(f"Cannot serve product image {filename}: {e}")
         # Return placeholder image
         return send_from_directory('static', 'placeholder.jpg')
 
 
+# ========== Monitoring Routes ==========
+@app.route('/metrics')
+def metrics():
+    """Request, stage and image metrics of this worker in Prometheus text format"""
+    return Response(REGISTRY.render(), content_type=METRICS_CONTENT_TYPE)
+
+
 # ========== Main Program Entry ==========
 if __name__ == '__main__':
     # Ensure necessary directories exist
@@ -462,5 +995,9 @@ if __name__ == '__main__':
     os.makedirs('data/patterns', exist_ok=True)
     os.makedirs('data/products', exist_ok=True)  # 添加这行
 
+    # Pick up edits to the JSON files without restarting
+    if DATA_RELOAD_INTERVAL > 0:
+        data_store.start()
+
     # Run application
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,72 @@
+# benchmarks/cold_start.py
+"""Import-to-first-request time of the app, parsing JSON vs loading the compiled catalog snapshot.
+
+Each measurement is a fresh interpreter started in a temporary directory
+holding a synthetic data/ tree, so nothing is warm except the OS file cache.
+
+    python benchmarks/cold_start.py
+    python benchmarks/cold_start.py --sizes 1000 100000 --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from synthetic import generate_catalog  # noqa: E402
+
+CHILD = '''
+import sys, time, json
+start = time.perf_counter()
+sys.path.insert(0, {root!r})
+import app
+imported = time.perf_counter()
+response = app.app.test_client().get('/api/patterns')
+assert response.status_code == 200, response.status_code
+print(json.dumps({{'import': imported - start, 'first_request': time.perf_counter() - start}}))
+'''
+
+
+def write_dataset(directory, size):
+    patterns, herbs, products = generate_catalog(patterns=size, herbs=50)
+    for path, records in (('data/patterns/patterns.json', patterns), ('data/herbs.json', herbs),
+                          ('data/products/products.json', products)):
+        path = os.path.join(directory, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False, indent=2)
+
+
+def run_child(directory, compiled):
+    env = dict(os.environ, COMPILED_CATALOG='' if not compiled else os.path.join('cache', 'catalog.snapshot'))
+    output = subprocess.run([sys.executable, '-c', CHILD.format(root=ROOT)], cwd=directory, env=env,
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure app cold start with and without the compiled catalog')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'patterns':>9}  {'source':<9} {'import s':>9}  {'first request s':>15}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            write_dataset(directory, size)
+            subprocess.run([sys.executable, os.path.join(ROOT, 'compiled_catalog.py')], cwd=directory,
+                           check=True, capture_output=True)
+            for compiled in (False, True):
+                runs = [run_child(directory, compiled) for _ in range(args.runs)]
+                print(f"{size:>9}  {'compiled' if compiled else 'json':<9} "
+                      f"{statistics.median(r['import'] for r in runs):>9.3f}  "
+                      f"{statistics.median(r['first_request'] for r in runs):>15.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+# benchmarks/memory_bench.py
+"""Per-worker memory of the catalog after fork: plain json.load records vs compact.load_json + freeze_heap.
+
+Each run loads a synthetic catalog in a fresh interpreter, forks --workers
+children that walk every record (as serving requests would) and run a GC
+pass, then reports how much of each child's memory is private, i.e. pages
+copied from the parent. Linux only (reads /proc/self/smaps_rollup).
+
+    python benchmarks/memory_bench.py
+    python benchmarks/memory_bench.py --sizes 10000 100000 --workers 4
+"""
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compact import compact_object, freeze_heap  # noqa: E402
+from synthetic import generate_catalog  # noqa: E402
+
+MODES = ('plain', 'compact')
+
+
+def memory_kb():
+    """{'Rss': kB, 'Private_Dirty': kB, ...} for this process"""
+    fields = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    return fields
+
+
+def walk(records):
+    """Read every field the way the routes do; touches each object's reference count"""
+    total = 0
+    for record in records:
+        for value in record.values():
+            if isinstance(value, (list, tuple)):
+                for item in value:
+                    total += len(item) if isinstance(item, str) else 1
+            elif isinstance(value, str):
+                total += len(value)
+    return total
+
+
+def measure(size, mode, workers):
+    """Runs inside a fresh interpreter; prints one JSON line"""
+    # Round-trip through JSON so the records look exactly like json.load output
+    raw = json.dumps(generate_catalog(patterns=size, herbs=50, products=size // 10))
+    gc.collect()
+    before = memory_kb()['Rss']
+    if mode == 'compact':
+        patterns, herbs, products = json.loads(raw, object_hook=compact_object)
+        del raw
+        freeze_heap()
+    else:
+        patterns, herbs, products = json.loads(raw)
+        del raw
+        gc.collect()
+    parent_rss = memory_kb()['Rss']
+
+    pipes = []
+    for _ in range(workers):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            for records in (patterns, herbs, products):
+                walk(records)
+            gc.collect()
+            os.write(write_fd, json.dumps(memory_kb()).encode())
+            os._exit(0)
+        os.close(write_fd)
+        pipes.append((pid, read_fd))
+
+    private = []
+    for pid, read_fd in pipes:
+        with os.fdopen(read_fd) as f:
+            private.append(json.loads(f.read())['Private_Dirty'])
+        os.waitpid(pid, 0)
+
+    print(json.dumps({'size': size, 'mode': mode, 'catalog_kb': parent_rss - before,
+                      'worker_private_kb': sum(private) / len(private)}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure per-worker catalog memory after fork')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 50000, 100000])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--child', nargs=2, metavar=('SIZE', 'MODE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        measure(int(args.child[0]), args.child[1], args.workers)
+        return
+
+    print(f"{'records':>8}  {'mode':<8} {'catalog MB':>10}  {'private MB/worker':>17}")
+    for size in args.sizes:
+        for mode in MODES:
+            output = subprocess.run([sys.executable, __file__, '--child', str(size), mode,
+                                     '--workers', str(args.workers)],
+                                    check=True, capture_output=True, text=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{size:>8}  {mode:<8} {result['catalog_kb'] / 1024:>10.1f}  "
+                  f"{result['worker_private_kb'] / 1024:>17.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,294 @@
+# benchmarks/run.py
+"""Scale benchmarks for PatternMatcher and every app route, on synthetic catalogs.
+
+Each scale runs in a fresh interpreter inside a temporary directory holding a
+synthetic data/ tree (see synthetic.py), so scales share no caches or memory.
+Every case reports the first (cold) call separately from the median of the
+repeated (warm) calls. Routes go through Flask's test client.
+
+Results are written as JSON together with the regression thresholds. Pass an
+earlier result file as --baseline to compare: a case regresses when its median
+grows by more than its threshold *and* by more than MIN_DELTA_MS. The exit
+status is 1 if anything regressed.
+
+    python benchmarks/run.py                                  # 10^2 .. 10^4
+    python benchmarks/run.py --scales 100 1000 10000 100000
+    python benchmarks/run.py --output new.json --baseline old.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sampler import CombinationSampler  # noqa: E402
+from synthetic import generate_catalog  # noqa: E402
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+DEFAULT_SCALES = [100, 1000, 10000]
+DEFAULT_REPEAT = 5
+
+# Allowed relative slowdown of a median before it counts as a regression
+DEFAULT_THRESHOLD = 0.25
+THRESHOLDS = {
+    'GET /api/combinations/random': 0.5,  # random records, so noisier
+}
+# Differences below this are timer noise at any ratio
+MIN_DELTA_MS = 2.0
+
+# Cases that are O(P²) or worse are skipped above this many patterns
+QUADRATIC_MAX_SCALE = 10000
+
+
+def herb_count(scale):
+    """Herbs grow much slower than patterns in practice"""
+    return min(200, max(12, scale // 100))
+
+
+def matcher_cases(catalog, matcher):
+    """(name, callable, max scale or None) for the matcher and search functions"""
+    patterns, herbs = catalog.patterns, catalog.herbs
+    ids = [p['id'] for p in patterns[:100]]
+    calls = {'similar': 0, 'story': 0}
+    sampler = CombinationSampler.from_matcher(matcher)
+    rng = random.Random(0)
+
+    def similar():
+        calls['similar'] += 1
+        return matcher.find_similar_patterns(ids[calls['similar'] % len(ids)])
+
+    def story():
+        # Walk through different pairs so the story LRU does not answer every call
+        calls['story'] += 1
+        pattern = patterns[calls['story'] * 7919 % len(patterns)]
+        return matcher.generate_story(pattern, herbs[calls['story'] % len(herbs)])
+
+    return [
+        ('matcher.find_all_combinations', lambda: matcher.find_all_combinations(max_results=50), None),
+        ('matcher.find_similar_patterns', similar, None),
+        ('matcher.find_similar_for_all', lambda: matcher.find_similar_for_all(5), QUADRATIC_MAX_SCALE),
+        ('matcher.generate_story', story, None),
+        ('sampler.sample', lambda: sampler.sample(20, rng, temperature=0.7), None),
+        ('search.keyword', lambda: catalog.search_index.search('lotus', '', limit=20), None),
+        ('search.prefix_culture', lambda: catalog.search_index.search('auspic', 'chinese', limit=20), None),
+    ]
+
+
+def route_cases(catalog):
+    """(method, path, json body, max scale or None) for every route"""
+    pattern_id = catalog.patterns[0]['id']
+    herb_id = catalog.herbs[0]['id']
+    image = catalog.patterns[0]['image']
+    return [
+        ('GET', '/', None, None),
+        ('GET', '/patterns', None, None),
+        ('GET', '/combinations', None, None),
+        ('GET', '/products', None, None),
+        ('GET', '/api/patterns', None, None),
+        ('GET', '/api/patterns?fields=id,name,image', None, None),
+        ('GET', '/api/herbs', None, None),
+        ('GET', '/api/products', None, None),
+        ('GET', '/api/search/patterns?q=lotus&limit=20', None, None),
+        ('GET', '/api/search/patterns?q=cloud&culture=chinese', None, None),
+        ('POST', '/api/match/patterns', {'pattern_id': pattern_id}, None),
+        ('GET', '/api/match/patterns/all', None, QUADRATIC_MAX_SCALE),
+        ('POST', '/api/match/patterns', {'pattern_ids': [p['id'] for p in catalog.patterns[:200]]}, None),
+        ('POST', '/api/combine/story', {'pattern_id': pattern_id, 'herb_id': herb_id}, None),
+        ('POST', '/api/combine/batch', {'pairs': [{'pattern_id': p['id'], 'herb_id': h['id']}
+                                                  for p in catalog.patterns[:100] for h in catalog.herbs[:20]]}, None),
+        ('GET', '/api/combinations/all', None, None),
+        ('GET', '/api/combinations/all?shape=normalized', None, None),
+        ('GET', '/api/combinations/stream?limit=200', None, None),
+        ('GET', '/api/combinations/query?culture=chinese&color=red,gold&min_score=30', None, None),
+        ('GET', '/api/combinations/query?herb_category=tonic&min_score=40&max_score=80', None, None),
+        ('GET', '/api/combinations/cultural', None, None),
+        ('GET', '/api/combinations/random', None, None),
+        ('GET', '/api/combinations/by-color/Red', None, None),
+        ('GET', '/api/combinations/recommended', None, None),
+        ('GET', '/api/stats', None, None),
+        ('GET', f'/data/patterns/{image}', None, None),
+        ('GET', f'/data/patterns/{image}?w=320', None, None),
+    ]
+
+
+def time_case(func, repeat):
+    start = time.perf_counter()
+    func()
+    cold = time.perf_counter() - start
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - start)
+    return {
+        'cold_ms': round(cold * 1000, 3),
+        'median_ms': round(statistics.median(runs) * 1000, 3),
+        'min_ms': round(min(runs) * 1000, 3),
+        'max_ms': round(max(runs) * 1000, 3),
+        'runs': repeat
+    }
+
+
+def run_scale(scale, repeat):
+    """Runs inside a fresh interpreter whose working directory holds the synthetic data"""
+    start = time.perf_counter()
+    import app
+    startup = time.perf_counter() - start
+
+    snapshot = app.data_store.current
+    catalog, matcher = snapshot.catalog, snapshot.matcher
+    results = {}
+
+    for name, func, max_scale in matcher_cases(catalog, matcher):
+        if max_scale is not None and scale > max_scale:
+            results[name] = {'skipped': f'O(P^2), only run up to {max_scale} patterns'}
+            continue
+        results[name] = time_case(func, repeat)
+
+    client = app.app.test_client()
+    for method, path, body, max_scale in route_cases(catalog):
+        name = f"{method} {path.split('?')[0] if path.startswith('/data/') else path}"
+        if '?w=' in path:
+            name += ' (derivative)'
+        if body and any(isinstance(value, list) for value in body.values()):
+            name += f" (batch of {max(len(value) for value in body.values() if isinstance(value, list))})"
+        if max_scale is not None and scale > max_scale:
+            results[name] = {'skipped': f'O(P^2), only run up to {max_scale} patterns'}
+            continue
+
+        def request():
+            response = client.open(path, method=method, json=body)
+            response.get_data()  # drain streamed bodies
+            if response.status_code != 200:
+                raise RuntimeError(f"{method} {path} returned {response.status_code}")
+
+        results[name] = time_case(request, repeat)
+
+    return {
+        'counts': {'patterns': len(catalog.patterns), 'herbs': len(catalog.herbs),
+                   'products': len(catalog.products)},
+        'startup_s': round(startup, 3),
+        'cases': results
+    }
+
+
+def write_dataset(directory, scale):
+    patterns, herbs, products = generate_catalog(patterns=scale, herbs=herb_count(scale))
+
+    # The first pattern gets a real image, for the image routes
+    source = os.path.join(ROOT, 'data', 'patterns')
+    images = sorted(name for name in os.listdir(source) if name.lower().endswith('.jpg'))
+    if images:
+        patterns[0]['image'] = images[0]
+        os.makedirs(os.path.join(directory, 'data', 'patterns'), exist_ok=True)
+        shutil.copyfile(os.path.join(source, images[0]), os.path.join(directory, 'data', 'patterns', images[0]))
+
+    for path, records in (('data/patterns/patterns.json', patterns), ('data/herbs.json', herbs),
+                          ('data/products/products.json', products)):
+        path = os.path.join(directory, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False)
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, check=True,
+                                capture_output=True, text=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                                    check=True, capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def compare(results, baseline):
+    """[(scale, case, baseline ms, current ms)] for every case over its threshold"""
+    thresholds = results['thresholds']
+    regressions = []
+    for scale, current in results['scales'].items():
+        previous = baseline.get('scales', {}).get(scale)
+        if previous is None:
+            continue
+        for name, case in current['cases'].items():
+            old = previous['cases'].get(name, {}).get('median_ms')
+            new = case.get('median_ms')
+            if old is None or new is None:
+                continue
+            limit = old * (1 + thresholds['cases'].get(name, thresholds['default']))
+            if new > limit and new - old > thresholds['min_delta_ms']:
+                regressions.append((scale, name, old, new))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark PatternMatcher and the app routes at several scales')
+    parser.add_argument('--scales', type=int, nargs='+', default=DEFAULT_SCALES)
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--output', help='result file (default: benchmarks/results/<commit>.json)')
+    parser.add_argument('--baseline', help='earlier result file to check for regressions')
+    parser.add_argument('--child', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_scale(args.child, args.repeat)))
+        return
+
+    commit, dirty = git_commit()
+    results = {
+        'meta': {'commit': commit, 'dirty': dirty, 'python': platform.python_version(),
+                 'platform': platform.platform(), 'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                 'repeat': args.repeat},
+        'thresholds': {'default': DEFAULT_THRESHOLD, 'cases': THRESHOLDS, 'min_delta_ms': MIN_DELTA_MS},
+        'scales': {}
+    }
+
+    for scale in args.scales:
+        with tempfile.TemporaryDirectory() as directory:
+            write_dataset(directory, scale)
+            env = dict(os.environ, COMPILED_CATALOG='', DATA_RELOAD_INTERVAL='0')
+            child = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', str(scale),
+                                    '--repeat', str(args.repeat)],
+                                   cwd=directory, env=env, capture_output=True, text=True)
+        if child.returncode != 0:
+            print(child.stderr)
+            sys.exit(f"Benchmark at scale {scale} failed")
+        output = child.stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        results['scales'][str(scale)] = result
+
+        print(f"\n{scale} patterns, {result['counts']['herbs']} herbs, startup {result['startup_s']:.2f}s")
+        for name, case in result['cases'].items():
+            if 'skipped' in case:
+                print(f"  {name:<52} skipped: {case['skipped']}")
+            else:
+                print(f"  {name:<52} {case['median_ms']:>10.2f} ms  (cold {case['cold_ms']:.2f} ms)")
+
+    output_path = args.output or os.path.join(RESULTS_DIR, f"{commit or 'results'}{'-dirty' if dirty else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nWrote {output_path}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline)
+        for scale, name, old, new in regressions:
+            print(f"REGRESSION {scale:>7} {name:<52} {old:.2f} ms -> {new:.2f} ms ({new / old:.2f}x)")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
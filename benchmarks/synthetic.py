@@ -0,0 +1,85 @@
+# benchmarks/synthetic.py
+"""Deterministic synthetic catalogs shaped like the files in data/, for benchmarks"""
+import random
+
+CULTURES = ['chinese', 'muslim', 'persian', 'tibetan']
+PATTERN_TYPES = ['Plant Pattern', 'Animal Pattern', 'Geometric Pattern', 'Cloud Pattern', 'Figure Pattern']
+PATTERN_CATEGORIES = ['plant_patterns', 'animal_patterns', 'geometric_patterns', 'auspicious_patterns']
+COLORS = ['Red', 'Green', 'Gold', 'Blue', 'Purple', 'White', 'Black', 'Pink', 'Multicolor']
+STYLE_TAGS = ['Plant', 'Simple', 'Elegant', 'Traditional', 'Auspicious', 'Animal', 'Geometric', 'Classical',
+              'Royal', 'Folk']
+MEANINGS = ['Auspicious', 'Health', 'Harmony', 'Strength', 'Prosperity', 'Balance', 'Purity', 'Longevity',
+            'Wisdom', 'Vitality']
+ELEMENTS = ['Lotus', 'Cloud', 'Dragon', 'Phoenix', 'Vine', 'Flowers', 'Wings', 'Waves', 'Mountains', 'Knot']
+HERB_NAMES = ['Ginseng', 'Goji Berry', 'Chinese Angelica', 'Astragalus', 'Chrysanthemum', 'Frankincense',
+              'Myrrh', 'Saffron', 'Clove', 'Licorice', 'Mint', 'Lavender', 'Turmeric', 'Jujube']
+HERB_TAGS = ['energy', 'immunity', 'tonic', 'chinese', 'warming', 'calming', 'digestion', 'beauty']
+HERB_CATEGORIES = ['tonic', 'aromatic', 'clearing', 'calming']
+PRODUCT_CATEGORIES = ['fashion', 'home', 'stationery', 'accessories']
+PRODUCT_TAGS = ['luxury', 'traditional', 'handmade', 'gift', 'modern']
+
+
+def generate_patterns(count, seed=0):
+    rng = random.Random(seed)
+    patterns = []
+    for i in range(count):
+        meaning = rng.sample(MEANINGS, 2)
+        patterns.append({
+            'id': f"pattern_{i + 1}",
+            'name': f"{rng.choice(ELEMENTS)} Pattern {i + 1}",
+            'image': f"pattern_{i + 1}.jpg",
+            'culture': rng.choice(CULTURES),
+            'type': rng.choice(PATTERN_TYPES),
+            'meaning': f"{meaning[0]} and {meaning[1].lower()}",
+            'elements': rng.sample(ELEMENTS, rng.randint(1, 3)),
+            'colors': rng.sample(COLORS, rng.randint(1, 4)),
+            'style_tags': rng.sample(STYLE_TAGS, rng.randint(1, 4)),
+            'description': f"Synthetic pattern {i + 1} with {' and '.join(meaning).lower()} motifs",
+            'category': rng.choice(PATTERN_CATEGORIES),
+            'origin': 'Synthetic',
+            'significance': f"Symbolizes {meaning[0].lower()}"
+        })
+    return patterns
+
+
+def generate_herbs(count, seed=0):
+    rng = random.Random(seed + 1)
+    herbs = []
+    for i in range(count):
+        name = HERB_NAMES[i] if i < len(HERB_NAMES) else f"{rng.choice(HERB_NAMES)} {i + 1}"
+        herbs.append({
+            'id': f"herb_{i + 1}",
+            'name': name,
+            'effect': f"Supports {rng.choice(MEANINGS).lower()}",
+            'description': f"Synthetic herb {i + 1}",
+            'color': rng.choice(COLORS),
+            'tags': rng.sample(HERB_TAGS, rng.randint(1, 4)),
+            'category': rng.choice(HERB_CATEGORIES),
+            'origin': 'Synthetic'
+        })
+    return herbs
+
+
+def generate_products(count, patterns, seed=0):
+    rng = random.Random(seed + 2)
+    products = []
+    for i in range(count):
+        pattern = rng.choice(patterns)
+        products.append({
+            'name': f"{pattern['name']} Item {i + 1}",
+            'category': rng.choice(PRODUCT_CATEGORIES),
+            'description': f"Synthetic product featuring {pattern['name']}",
+            'images': [pattern['image']],
+            'colors': list(pattern['colors']),
+            'tags': rng.sample(PRODUCT_TAGS, rng.randint(1, 3)),
+            'status': 'in_stock',
+            'pattern_details': {key: pattern[key] for key in ('name', 'image', 'culture', 'type', 'meaning')}
+        })
+    return products
+
+
+def generate_catalog(patterns=1000, herbs=50, products=None, seed=0):
+    """(patterns, herbs, products) lists; products default to one per ten patterns"""
+    pattern_list = generate_patterns(patterns, seed)
+    products = patterns // 10 if products is None else products
+    return pattern_list, generate_herbs(herbs, seed), generate_products(products, pattern_list, seed)
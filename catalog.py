@@ -0,0 +1,173 @@
+# catalog.py
+import hashlib
+import json
+import os
+
+from compact import load_json
+from search_index import SearchIndex
+
+PATTERNS_FILE = os.path.join('data', 'patterns', 'patterns.json')
+HERBS_FILE = os.path.join('data', 'herbs.json')
+PRODUCTS_FILE = os.path.join('data', 'products', 'products.json')
+
+
+def load_patterns(strict=False):
+    """Load pattern data from patterns.json (strict: raise instead of returning [])"""
+    try:
+        with open(PATTERNS_FILE, 'r', encoding='utf-8') as f:
+            patterns = load_json(f)
+
+        # Add data validation for each pattern
+        for position, pattern in enumerate(patterns):
+            # Ensure required fields exist
+            if 'id' not in pattern:
+                pattern['id'] = f"pattern_{position + 1}"
+            if 'style_tags' not in pattern:
+                pattern['style_tags'] = ()
+            if 'elements' not in pattern:
+                pattern['elements'] = ()
+            if 'colors' not in pattern:
+                pattern['colors'] = ()
+
+        return patterns
+    except Exception as e:
+        if strict:
+            raise
+        print(f"Failed to load pattern data: {e}")
+        return []
+
+
+def load_herbs(strict=False):
+    """Load herbal medicine data from herbs.json"""
+    try:
+        with open(HERBS_FILE, 'r', encoding='utf-8') as f:
+            herbs = load_json(f)
+        return herbs
+    except Exception as e:
+        if strict:
+            raise
+        print(f"Failed to load herbal medicine data: {e}")
+        return []
+
+def load_products(strict=False):
+    """Load product data from products.json"""
+    try:
+        with open(PRODUCTS_FILE, 'r', encoding='utf-8') as f:
+            products = load_json(f)
+        return products
+    except Exception as e:
+        if strict:
+            raise
+        print(f"Failed to load product data: {e}")
+        return []
+
+
+def _first_by_key(records, key):
+    """key -> record, keeping the first record for repeated keys (like a linear scan would)"""
+    index = {}
+    for record in records:
+        index.setdefault(record.get(key), record)
+    return index
+
+
+def content_version(*collections):
+    """Short content hash identifying one version of the catalog data"""
+    raw = json.dumps(collections, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+
+def validate_catalog(patterns, herbs, products):
+    """Raise ValueError if freshly loaded data is not safe to serve"""
+    for label, records, required in (('patterns', patterns, ('id', 'name')),
+                                     ('herbs', herbs, ('id', 'name')),
+                                     ('products', products, ('name',))):
+        if not isinstance(records, list):
+            raise ValueError(f"{label}: expected a list, got {type(records).__name__}")
+        for position, record in enumerate(records):
+            if not isinstance(record, dict):
+                raise ValueError(f"{label}[{position}]: expected an object")
+            missing = [field for field in required if not record.get(field)]
+            if missing:
+                raise ValueError(f"{label}[{position}]: missing {', '.join(missing)}")
+    if not patterns or not herbs:
+        raise ValueError("patterns and herbs must not be empty")
+
+
+def _group_by(records, key_func):
+    """key -> [records] in catalog order; key_func returns an iterable of keys"""
+    groups = {}
+    for record in records:
+        for key in dict.fromkeys(key_func(record)):
+            groups.setdefault(key, []).append(record)
+    return groups
+
+
+class Catalog:
+    """Patterns, herbs and products with id maps and secondary indexes.
+
+    Indexes are built once from the lists passed in; every lookup and facet
+    filter is a dict probe. Index lists keep catalog order, so slicing them
+    gives the same records a filtered scan would.
+    """
+
+    def __init__(self, patterns, herbs, products=None):
+        self.patterns = patterns
+        self.herbs = herbs
+        self.products = products if products is not None else []
+        self.version = content_version(self.patterns, self.herbs, self.products)
+
+        # Primary keys
+        self.patterns_by_id = _first_by_key(patterns, 'id')
+        self.herbs_by_id = _first_by_key(herbs, 'id')
+
+        # Secondary indexes
+        self.patterns_by_culture = _group_by(patterns, lambda p: [p.get('culture')])
+        self.patterns_by_type = _group_by(patterns, lambda p: [p.get('type')])
+        self.patterns_by_category = _group_by(patterns, lambda p: [p.get('category')])
+        self.patterns_by_color = _group_by(patterns, lambda p: [c.lower() for c in p.get('colors', [])])
+        self.herbs_by_category = _group_by(herbs, lambda h: [h.get('category')])
+        self.products_by_category = _group_by(self.products, lambda p: [p.get('category')])
+
+        # Products -> pattern join, via pattern_details name or image
+        patterns_by_name = _first_by_key(patterns, 'name')
+        patterns_by_name = {name.lower(): p for name, p in patterns_by_name.items() if name}
+        self.patterns_by_image = _first_by_key(patterns, 'image')
+        self.patterns_by_image.pop(None, None)
+        self.product_patterns = []
+        self.products_by_pattern_id = {}
+        for product in self.products:
+            details = product.get('pattern_details') or {}
+            pattern = (patterns_by_name.get((details.get('name') or '').lower())
+                       or self.patterns_by_image.get(details.get('image')))
+            self.product_patterns.append(pattern)
+            if pattern is not None:
+                self.products_by_pattern_id.setdefault(pattern.get('id'), []).append(product)
+
+        self.search_index = SearchIndex(patterns)
+
+    def get_pattern(self, pattern_id):
+        # Ids come straight from request bodies; a list or object id matches nothing
+        if not isinstance(pattern_id, (int, str)):
+            return None
+        return self.patterns_by_id.get(pattern_id)
+
+    def get_herb(self, herb_id):
+        if not isinstance(herb_id, (int, str)):
+            return None
+        return self.herbs_by_id.get(herb_id)
+
+    def patterns_with_culture(self, culture):
+        return self.patterns_by_culture.get(culture, [])
+
+    def patterns_with_type(self, pattern_type):
+        return self.patterns_by_type.get(pattern_type, [])
+
+    def patterns_with_color(self, color):
+        """Patterns listing this color (case-insensitive)"""
+        return self.patterns_by_color.get(color.lower(), [])
+
+    def herbs_in_category(self, category):
+        return self.herbs_by_category.get(category, [])
+
+    def products_for_pattern(self, pattern_id):
+        return self.products_by_pattern_id.get(pattern_id, [])
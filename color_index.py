@@ -0,0 +1,301 @@
+# color_index.py
+"""Dominant-color palettes of the pattern and product images, searchable by color.
+
+Each image is decoded at reduced size and downsampled to at most
+SAMPLE_SIZE × SAMPLE_SIZE pixels. Its pixels are clustered with a vectorized
+k-means in CIE Lab. The PALETTE_SIZE centers and their pixel shares become the
+image's palette. All palettes live in one (images, PALETTE_SIZE, 4) float32
+matrix of L, a, b, weight, which is memory-mapped like the visual index.
+Queries go through a KD-tree (scipy cKDTree) over the palette colors, so a
+"near #c03a2b" lookup is a radius search rather than a pixel scan.
+
+Palettes are cached by file content hash: renamed, copied or touched images
+are not clustered again. The app updates the index in a background thread;
+build it at deploy time so color queries work from the first request:
+
+    python color_index.py
+    python color_index.py --workers 4
+"""
+import argparse
+import hashlib
+import os
+import string
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+from scipy.spatial import cKDTree
+
+from index_files import IMAGE_SOURCES, LOCK_FILE, acquire_build_lock, list_images, read_manifest, write_index
+from visual_index import BackgroundIndexManager
+
+INDEX_DIR = os.path.join('cache', 'colors')
+SOURCES = IMAGE_SOURCES
+
+# Bump when the palette extraction changes so old indexes are rebuilt instead of mixed
+PALETTE_VERSION = 'lab-kmeans5-64px-v1'
+PALETTE_SIZE = 5
+SAMPLE_SIZE = 64
+KMEANS_ITERATIONS = 25
+# Palette colors covering less of the image than this are not searchable
+MIN_WEIGHT = 0.05
+# CIE76 ΔE: about 2.3 is just noticeable, 20 keeps the same hue family
+DEFAULT_TOLERANCE = 20.0
+
+HEX_DIGITS = frozenset(string.hexdigits)
+
+
+def _read_pixels(path):
+    """Opaque pixels of the image, downsampled, as a float32 (n, 3) BGR array in 0..1"""
+    data = np.fromfile(path, dtype=np.uint8)
+    if path.lower().endswith('.png'):
+        image = cv2.imdecode(data, cv2.IMREAD_UNCHANGED)  # keep alpha: transparent areas are not colors
+    else:
+        image = cv2.imdecode(data, cv2.IMREAD_REDUCED_COLOR_4)  # the JPEG decoder scales for free
+    if image is None:
+        raise ValueError(f"cannot decode {path}")
+    if image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+
+    height, width = image.shape[:2]
+    scale = SAMPLE_SIZE / max(height, width)
+    if scale < 1:
+        image = cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))),
+                           interpolation=cv2.INTER_AREA)
+    pixels = image.reshape(-1, image.shape[2])
+    if pixels.shape[1] == 4:
+        pixels = pixels[pixels[:, 3] >= 128, :3]
+    if len(pixels) == 0:
+        raise ValueError(f"{path} has no opaque pixels")
+    return pixels.astype(np.float32) / 255
+
+
+def bgr_to_lab(bgr):
+    """(n, 3) BGR in 0..1 -> (n, 3) CIE Lab (L 0..100)"""
+    return cv2.cvtColor(np.asarray(bgr, dtype=np.float32).reshape(-1, 1, 3), cv2.COLOR_BGR2LAB).reshape(-1, 3)
+
+
+def lab_to_hex(lab):
+    bgr = cv2.cvtColor(np.asarray(lab, dtype=np.float32).reshape(1, 1, 3), cv2.COLOR_LAB2BGR).reshape(3)
+    blue, green, red = (int(round(float(np.clip(c, 0, 1)) * 255)) for c in bgr)
+    return f"#{red:02x}{green:02x}{blue:02x}"
+
+
+def parse_hex(value):
+    """'#c03a2b', 'c03a2b' or 'f00' -> Lab; ValueError for anything else"""
+    digits = value.strip().lstrip('#')
+    if len(digits) == 3:
+        digits = ''.join(c * 2 for c in digits)
+    # Checked here rather than left to int(), which also takes '+f' and reports its own message
+    if len(digits) != 6 or not all(c in HEX_DIGITS for c in digits):
+        raise ValueError('hex must be 3 or 6 hex digits, e.g. c03a2b')
+    red, green, blue = (int(digits[i:i + 2], 16) for i in (0, 2, 4))
+    return bgr_to_lab([[blue / 255, green / 255, red / 255]])[0]
+
+
+def kmeans(points, k, seed=0, iterations=KMEANS_ITERATIONS):
+    """(centers, counts) of a k-means++ seeded Lloyd clustering; fewer than k centers for tiny inputs"""
+    rng = np.random.default_rng(seed)
+    unique = np.unique(points, axis=0)
+    k = min(k, len(unique))
+    centers = np.empty((k, points.shape[1]), dtype=np.float64)
+    centers[0] = points[rng.integers(len(points))]
+    closest = ((points - centers[0]) ** 2).sum(axis=1)
+    for i in range(1, k):
+        # k-means++: the next seed is far from the ones chosen so far
+        centers[i] = points[rng.choice(len(points), p=closest / closest.sum())] if closest.sum() > 0 else unique[i]
+        closest = np.minimum(closest, ((points - centers[i]) ** 2).sum(axis=1))
+
+    squared = (points ** 2).sum(axis=1)[:, None]
+    labels = None
+    for _ in range(iterations):
+        distances = squared - 2 * points @ centers.T + (centers ** 2).sum(axis=1)[None, :]
+        new_labels = distances.argmin(axis=1)
+        if labels is not None and np.array_equal(labels, new_labels):
+            break
+        labels = new_labels
+        counts = np.bincount(labels, minlength=k)
+        for dim in range(points.shape[1]):
+            sums = np.bincount(labels, weights=points[:, dim], minlength=k)
+            centers[:, dim] = np.where(counts > 0, sums / np.maximum(counts, 1), centers[:, dim])
+    return centers, np.bincount(labels, minlength=k)
+
+
+def compute_palette(path, seed=0):
+    """(PALETTE_SIZE, 4) float32 rows of L, a, b, pixel share; best-covered first, zero-padded"""
+    lab = bgr_to_lab(_read_pixels(path)).astype(np.float64)
+    centers, counts = kmeans(lab, PALETTE_SIZE, seed=seed)
+    palette = np.zeros((PALETTE_SIZE, 4), dtype=np.float32)
+    order = np.argsort(-counts, kind='stable')
+    palette[:len(order), :3] = centers[order]
+    palette[:len(order), 3] = counts[order] / counts.sum()
+    return palette
+
+
+def _content_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def _palette(args):
+    path, seed = args
+    try:
+        return compute_palette(path, seed), None
+    except Exception as e:
+        return None, str(e)
+
+
+def build_index(sources=SOURCES, index_dir=INDEX_DIR, workers=1):
+    """Create or update the index; only images with unseen content are decoded.
+
+    Returns the number of palettes computed.
+    """
+    previous = ColorIndex.load(index_dir)
+    known_hashes, palettes = {}, {}
+    if previous is not None:
+        for row, entry in enumerate(previous.entries):
+            known_hashes[(entry['kind'], entry['name'])] = (entry['mtime_ns'], entry['size'], entry['sha1'])
+            palettes[entry['sha1']] = previous.palettes[row]
+
+    entries, pending = [], {}
+    for kind, directory in sources:
+        for name in list_images(directory):
+            path = os.path.join(directory, name)
+            stat = os.stat(path)
+            known = known_hashes.get((kind, name))
+            # Unchanged files keep their hash; anything else is hashed again
+            if known is not None and known[:2] == (stat.st_mtime_ns, stat.st_size):
+                sha1 = known[2]
+            else:
+                sha1 = _content_hash(path)
+            if sha1 not in palettes:
+                pending.setdefault(sha1, path)
+            entries.append({'kind': kind, 'name': name, 'sha1': sha1,
+                            'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size})
+
+    unchanged = previous is not None and [(e['kind'], e['name'], e['sha1']) for e in entries] == [
+        (e['kind'], e['name'], e['sha1']) for e in previous.entries]
+    if not pending and unchanged:
+        return 0
+
+    # The content hash seeds k-means, so a palette only depends on the image bytes
+    jobs = [(path, int(sha1[:8], 16)) for sha1, path in pending.items()]
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_palette, jobs))
+    else:
+        results = [_palette(job) for job in jobs]
+
+    for (sha1, path), (palette, error) in zip(pending.items(), results):
+        if palette is None:
+            print(f"Cannot extract palette from {path}: {error}")
+        else:
+            palettes[sha1] = palette
+
+    entries = [entry for entry in entries if entry['sha1'] in palettes]
+    matrix = np.zeros((len(entries), PALETTE_SIZE, 4), dtype=np.float32)
+    for row, entry in enumerate(entries):
+        matrix[row] = palettes[entry['sha1']]
+    write_index(index_dir, 'palettes', matrix, {'palette': PALETTE_VERSION, 'size': PALETTE_SIZE, 'entries': entries})
+    return sum(1 for palette, _ in results if palette is not None)
+
+
+class ColorIndex:
+    """Read-only palettes (memory-mapped) with a KD-tree over their Lab colors"""
+
+    def __init__(self, entries, palettes):
+        self.entries = entries
+        self.palettes = palettes
+        weights = np.asarray(palettes[:, :, 3]).ravel()
+        searchable = np.flatnonzero(weights >= MIN_WEIGHT)
+        self._point_rows = searchable // PALETTE_SIZE
+        self._point_weights = weights[searchable]
+        self._tree = cKDTree(np.asarray(palettes[:, :, :3]).reshape(-1, 3)[searchable]) if len(searchable) else None
+
+    @classmethod
+    def load(cls, index_dir=INDEX_DIR):
+        """Open the index, or return None if it is missing or was built with another palette version"""
+        try:
+            manifest = read_manifest(index_dir)
+            if manifest.get('palette') != PALETTE_VERSION:
+                return None
+            palettes = np.load(os.path.join(index_dir, manifest['matrix']), mmap_mode='r')
+        except (OSError, ValueError, KeyError):
+            return None
+        return cls(manifest['entries'], palettes)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def palette(self, row):
+        """[{'hex', 'lab', 'weight'}] of one image, best-covered first"""
+        return [{'hex': lab_to_hex(color[:3]), 'lab': [round(float(v), 1) for v in color[:3]],
+                 'weight': round(float(color[3]), 3)}
+                for color in np.asarray(self.palettes[row]) if color[3] > 0]
+
+    def nearest(self, lab, tolerance=DEFAULT_TOLERANCE, kind=None):
+        """[(row, ΔE, weight)] of images with a palette color within tolerance, closest first.
+
+        Each image counts once, by its closest color; ties go to the color that
+        covers more of the image.
+        """
+        if self._tree is None:
+            return []
+        points = np.asarray(self._tree.query_ball_point(lab, r=tolerance), dtype=np.intp)
+        if kind is not None:
+            points = points[[self.entries[row]['kind'] == kind for row in self._point_rows[points]]]
+        if len(points) == 0:
+            return []
+        distances = np.linalg.norm(self._tree.data[points] - lab, axis=1)
+        order = np.lexsort((-self._point_weights[points], distances))
+        rows = self._point_rows[points[order]]
+        _, first = np.unique(rows, return_index=True)
+        first.sort()
+        return [(int(rows[i]), float(distances[order[i]]), float(self._point_weights[points[order[i]]]))
+                for i in first]
+
+
+class ColorIndexManager(BackgroundIndexManager):
+    """Color index of the pattern and product images, refreshed when images are added or changed"""
+
+    def __init__(self, sources=SOURCES, index_dir=INDEX_DIR, check_interval=5.0):
+        super().__init__(index_dir, check_interval)
+        self.sources = sources
+
+    def _signature_now(self):
+        signature = []
+        for kind, directory in self.sources:
+            for name in list_images(directory):
+                stat = os.stat(os.path.join(directory, name))
+                signature.append((kind, name, stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    def _load(self):
+        return ColorIndex.load(self.index_dir)
+
+    def _build(self):
+        build_index(self.sources, self.index_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or update the dominant-color index')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    lock = acquire_build_lock(INDEX_DIR)
+    if lock is None:
+        print(f"Another process is building the index ({os.path.join(INDEX_DIR, LOCK_FILE)})")
+        return
+
+    start = time.time()
+    try:
+        updated = build_index(workers=args.workers)
+    finally:
+        os.remove(lock)
+    index = ColorIndex.load()
+    print(f"Color index: {len(index) if index else 0} images, {updated} palettes computed in {time.time() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
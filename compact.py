@@ -0,0 +1,52 @@
+# compact.py
+"""Compact, fork-friendly in-memory form of the catalog records.
+
+Plain json.load gives every record its own copies of repeated values
+("chinese", "Red", "Traditional", ...) and a growable list per field. After a
+fork, every worker that reads them also writes their reference counts and GC
+headers, so the parent's pages get copied into every worker.
+
+load_json() decodes the catalog files into the same dicts (routes, templates
+and jsonify use them as-is), but:
+
+* short strings and all keys are interned, so repeated values share one object;
+* lists inside records become tuples, which are smaller and immutable;
+* records that hold only atomic values are left untracked by the cyclic GC.
+
+Compacting during decoding, rather than afterwards, matters: a second copy of
+the data would leave the heap fragmented and the records spread over more pages.
+
+freeze_heap() moves everything allocated so far into the permanent GC
+generation. Call it once the catalog is loaded and before workers fork.
+"""
+import gc
+import json
+import sys
+
+# Longer strings (descriptions, stories) are rarely repeated; interning them only costs a lookup
+INTERN_MAX_LENGTH = 64
+
+
+def compact_value(value):
+    """Interned / tuple-ized form of one decoded JSON value (dicts are handled by the hook)"""
+    if isinstance(value, str):
+        return sys.intern(value) if len(value) <= INTERN_MAX_LENGTH else value
+    if isinstance(value, list):
+        return tuple(compact_value(item) for item in value)
+    return value
+
+
+def compact_object(obj):
+    """json object_hook: interned keys and compacted values"""
+    return {sys.intern(key): compact_value(value) for key, value in obj.items()}
+
+
+def load_json(f):
+    """json.load with compact records; top-level lists stay lists"""
+    return json.load(f, object_hook=compact_object)
+
+
+def freeze_heap():
+    """Exclude everything allocated so far from future collections"""
+    gc.collect()
+    gc.freeze()
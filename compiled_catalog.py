@@ -0,0 +1,100 @@
+# compiled_catalog.py
+"""Validated, fully indexed Catalog compiled into one binary snapshot for fast startup.
+
+The build step runs the JSON loaders once in strict mode, validates the data,
+builds the Catalog (id maps, facet indexes and the search index), and pickles
+it (protocol 5) behind a small header. Startup then unpickles the snapshot
+instead of parsing and indexing.
+
+The header records the SHA-1 of every source JSON file and of the modules that
+define the pickled classes. If either has changed, the snapshot is ignored and
+the app falls back to the JSON files.
+
+    python compiled_catalog.py            # (re)build cache/catalog.snapshot
+
+The snapshot is a local build artifact: like any pickle, only load files you built.
+"""
+import hashlib
+import json
+import os
+import pickle
+import time
+
+from catalog import (PATTERNS_FILE, HERBS_FILE, PRODUCTS_FILE, Catalog, load_herbs, load_patterns,
+                     load_products, validate_catalog)
+
+COMPILED_FILE = os.path.join('cache', 'catalog.snapshot')
+SOURCE_FILES = (PATTERNS_FILE, HERBS_FILE, PRODUCTS_FILE)
+MAGIC = b'XIECAT\x00\x01'
+
+# Modules whose classes and normalization end up in the pickle
+_HERE = os.path.dirname(os.path.abspath(__file__))
+CODE_FILES = tuple(os.path.join(_HERE, name) for name in ('catalog.py', 'search_index.py', 'compact.py'))
+
+
+def file_hashes(paths):
+    """SHA-1 of the file contents, None for missing files"""
+    hashes = []
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                hashes.append(hashlib.sha1(f.read()).hexdigest())
+        except OSError:
+            hashes.append(None)
+    return hashes
+
+
+def _fingerprint():
+    return {'sources': file_hashes(SOURCE_FILES), 'code': file_hashes(CODE_FILES)}
+
+
+def build_compiled(path=COMPILED_FILE):
+    """Load, validate, index and write the snapshot; returns the header"""
+    fingerprint = _fingerprint()
+    patterns, herbs, products = load_patterns(True), load_herbs(True), load_products(True)
+    validate_catalog(patterns, herbs, products)
+    catalog = Catalog(patterns, herbs, products)
+    header = dict(fingerprint,
+                  version=catalog.version,
+                  counts=[len(patterns), len(herbs), len(products)],
+                  created=time.strftime('%Y-%m-%dT%H:%M:%S'))
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(json.dumps(header, ensure_ascii=False).encode('utf-8') + b'\n')
+        pickle.dump(catalog, f, protocol=5)
+    os.replace(tmp_path, path)
+    return header
+
+
+def load_compiled(path=COMPILED_FILE):
+    """The compiled Catalog if the snapshot matches the current JSON files and code, else None"""
+    try:
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                print(f"Ignoring compiled catalog {path}: not a catalog snapshot")
+                return None
+            header = json.loads(f.readline())
+            fingerprint = _fingerprint()
+            if any(header.get(key) != value for key, value in fingerprint.items()):
+                return None  # stale: the JSON files or the catalog code changed since the build
+            catalog = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Ignoring compiled catalog {path}: {e}")
+        return None
+    return catalog
+
+
+def main():
+    start = time.time()
+    header = build_compiled()
+    print(f"Wrote {COMPILED_FILE} ({header['counts'][0]} patterns, {header['counts'][1]} herbs, "
+          f"{header['counts'][2]} products, version {header['version']}) in {time.time() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
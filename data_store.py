@@ -0,0 +1,108 @@
+# data_store.py
+import os
+import threading
+import time
+
+from response_cache import ResponseCache
+
+
+class Snapshot:
+    """One consistent version of the catalog plus everything derived from it.
+
+    A request pins one snapshot for its whole lifetime. Derived indexes and
+    caches hang off the snapshot, so swapping snapshots drops them all at once.
+    """
+
+    def __init__(self, catalog, matcher):
+        self.catalog = catalog
+        self.matcher = matcher
+        self.version = catalog.version
+        self.responses = ResponseCache()
+        # ?fields= projections are keyed by client input; their own cache keeps them from evicting the above
+        self.projections = ResponseCache(max_entries=64)
+        self._derived = {}
+        self._lock = threading.Lock()
+
+    def derived(self, name, build):
+        """Build a derived structure once per snapshot and share it"""
+        try:
+            return self._derived[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name not in self._derived:
+                self._derived[name] = build()
+            return self._derived[name]
+
+
+class DataStore:
+    """Holds the current Snapshot and swaps in a new one when the source files change.
+
+    A background thread polls the files' mtime and size. On a change it loads
+    and validates a new snapshot off the request path, then replaces the
+    reference in one assignment. Requests already running keep the old one.
+    """
+
+    def __init__(self, paths, build_snapshot, interval=2.0):
+        self.paths = list(paths)
+        self.build_snapshot = build_snapshot
+        self.interval = interval
+        self._signature = self.file_signature()
+        self.current = build_snapshot(False)
+        self._listeners = []
+        self._thread = None
+        self._reload_lock = threading.Lock()
+
+    def file_signature(self):
+        signature = []
+        for path in self.paths:
+            try:
+                stat = os.stat(path)
+                signature.append((path, stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append((path, None, None))
+        return tuple(signature)
+
+    def add_listener(self, callback):
+        """callback(snapshot) runs in the watcher thread after every swap"""
+        self._listeners.append(callback)
+
+    def reload(self):
+        """Load, validate and swap in a new snapshot if the files changed. Returns True on swap."""
+        with self._reload_lock:
+            signature = self.file_signature()
+            if signature == self._signature:
+                return False
+
+            try:
+                snapshot = self.build_snapshot(True)
+            except Exception as e:
+                # Keep serving the old snapshot; retry when the files change again
+                print(f"Data reload failed, keeping version {self.current.version}: {e}")
+                self._signature = signature
+                return False
+
+            self._signature = signature
+            if snapshot.version == self.current.version:
+                return False  # touched but identical content
+
+            previous, self.current = self.current, snapshot
+            print(f"Data reloaded: version {previous.version} -> {snapshot.version}")
+
+        for callback in self._listeners:
+            try:
+                callback(snapshot)
+            except Exception as e:
+                print(f"Data reload listener failed: {e}")
+        return True
+
+    def _watch(self):
+        while True:
+            time.sleep(self.interval)
+            self.reload()
+
+    def start(self):
+        """Start the polling thread (once per process)"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._watch, name='data-store-watcher', daemon=True)
+            self._thread.start()
@@ -1,11 +1,14 @@
 # database.py
 import json
 
+from catalog import Catalog
+
 
 class PatternDatabase:
     def __init__(self):
         self.patterns = []
         self.herbs = []
+        self.catalog = Catalog([], [])
         self.load_data()
 
     def load_data(self):
@@ -18,6 +21,8 @@ class PatternDatabase:
         except Exception as e:
             print(f"加载数据失败: {e}")
 
+        self.catalog = Catalog(self.patterns, self.herbs)
+
     def get_all_patterns(self):
         return self.patterns
 
@@ -25,32 +30,11 @@ class PatternDatabase:
         return self.herbs
 
     def get_pattern(self, pattern_id):
-        for pattern in self.patterns:
-            if pattern.get('id') == pattern_id:
-                return pattern
-        return None
+        return self.catalog.get_pattern(pattern_id)
 
     def get_herb(self, herb_id):
-        for herb in self.herbs:
-            if herb.get('id') == herb_id:
-                return herb
-        return None
-
-    def search_patterns(self, keyword, culture):
-        results = []
-        for pattern in self.patterns:
-            match = True
-
-            if keyword:
-                keyword_lower = keyword.lower()
-                if not (keyword_lower in pattern.get('name', '').lower() or
-                        keyword_lower in pattern.get('meaning', '').lower()):
-                    match = False
-
-            if culture and pattern.get('culture') != culture:
-                match = False
-
-            if match:
-                results.append(pattern)
+        return self.catalog.get_herb(herb_id)
 
-        return results
\ No newline at end of file
+    def search_patterns(self, keyword, culture, limit=None, offset=0):
+        results, _ = self.catalog.search_index.search(keyword, culture, limit=limit, offset=offset)
+        return results
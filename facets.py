@@ -0,0 +1,215 @@
+# facets.py
+"""Faceted filtering of the pattern × herb combination space.
+
+Every facet value has a packed bitmap over patterns or herbs (np.packbits).
+Values of one facet are OR'ed and facets are AND'ed, so a filter set comes
+down to a few word-wise intersections. Pattern facets and herb facets are
+independent, and the combinations that match are every (pattern, herb) pair
+of the two bitmaps whose score is in range.
+
+Facet counts follow the usual disjunctive rule: a facet's counts apply every
+filter except that facet's own, so the UI can show what each other value
+would give. Counts are numbers of combinations, not of patterns or herbs.
+With no score range they need nothing but the bitmaps. With a score range they
+use per-pattern and per-herb score histograms, precomputed once, or, when
+both sides are filtered, a scan of the selected rows × columns only.
+"""
+import numpy as np
+
+from score_engine import top_k
+
+SCORE_LEVELS = 101  # scores are 0..100
+
+# Query parameter -> record field; list fields match on any element
+PATTERN_FACETS = {
+    'culture': lambda p: [p.get('culture')],
+    'type': lambda p: [p.get('type')],
+    'color': lambda p: [c.lower() for c in p.get('colors', [])],  # case-insensitive, like Catalog
+    'style_tag': lambda p: p.get('style_tags', []),
+}
+HERB_FACETS = {
+    'herb_category': lambda h: [h.get('category')],
+    'herb_tag': lambda h: h.get('tags', []),
+}
+
+# Score buckets of /api/combinations/all
+SCORE_BUCKETS = (('excellent', 70, 100), ('good', 50, 69), ('experimental', 0, 49))
+
+
+def pack(mask):
+    return np.packbits(mask)
+
+
+def unpack(bitmap, size):
+    return np.unpackbits(bitmap, count=size).view(bool)
+
+
+class FacetIndex:
+    """One facet over a record list: a packed bitmap and a membership column per value"""
+
+    def __init__(self, records, key_func):
+        self.size = len(records)
+        self.values = {}
+        rows, cols = [], []
+        for row, record in enumerate(records):
+            for value in dict.fromkeys(key_func(record)):
+                if value is None:
+                    continue
+                rows.append(row)
+                cols.append(self.values.setdefault(value, len(self.values)))
+        self.membership = np.zeros((self.size, len(self.values)), dtype=bool)
+        self.membership[rows, cols] = True
+        self.bitmaps = {value: pack(self.membership[:, col]) for value, col in self.values.items()}
+        self._empty = pack(np.zeros(self.size, dtype=bool))
+
+    def bitmap(self, values):
+        """Records matching any of values"""
+        return np.bitwise_or.reduce([self.bitmaps.get(value, self._empty) for value in values])
+
+    def counts(self, rows, weights):
+        """value -> sum of weights over the given rows that carry the value"""
+        if not self.values:
+            return {}
+        totals = weights.astype(np.float64) @ self.membership[rows]
+        return {value: int(round(totals[col])) for value, col in self.values.items() if totals[col]}
+
+
+def _score_histograms(scores, unique_rows, unique_cols, block_rows=None):
+    """Per pattern and per herb: how many unique partners score at least s (s = 0..101)"""
+    patterns, herbs = scores.shape
+    row_hist = np.zeros((patterns, SCORE_LEVELS), dtype=np.int32)
+    col_hist = np.zeros((herbs, SCORE_LEVELS), dtype=np.int64)
+    block_rows = block_rows or max(1, 65536 // max(herbs, 1))
+    levels = np.arange(herbs) * SCORE_LEVELS
+    for start in range(0, patterns, block_rows):
+        stop = min(start + block_rows, patterns)
+        block = np.clip(np.asarray(scores[start:stop], dtype=np.int64), 0, SCORE_LEVELS - 1)
+        valid = unique_rows[start:stop, None] & unique_cols[None, :]
+        rows = (np.arange(stop - start)[:, None] * SCORE_LEVELS + block)[valid]
+        row_hist[start:stop] = np.bincount(rows, minlength=(stop - start) * SCORE_LEVELS).reshape(-1, SCORE_LEVELS)
+        col_hist += np.bincount((levels[None, :] + block)[valid], minlength=herbs * SCORE_LEVELS).reshape(
+            herbs, SCORE_LEVELS)
+
+    def at_least(hist):
+        cumulative = np.zeros((hist.shape[0], SCORE_LEVELS + 1), dtype=hist.dtype)
+        cumulative[:, :SCORE_LEVELS] = np.cumsum(hist[:, ::-1], axis=1, dtype=hist.dtype)[:, ::-1]
+        dtype = np.uint16 if cumulative.max(initial=0) < 2 ** 16 else np.int32
+        return cumulative.astype(dtype)
+
+    return at_least(row_hist), at_least(col_hist)
+
+
+class CombinationFacets:
+    """Facet bitmaps over patterns and herbs plus score histograms, built once per snapshot"""
+
+    def __init__(self, patterns, herbs, scores, unique_rows, unique_cols):
+        self.patterns = patterns
+        self.herbs = herbs
+        self.scores = scores
+        self.pattern_facets = {name: FacetIndex(patterns, key) for name, key in PATTERN_FACETS.items()}
+        self.herb_facets = {name: FacetIndex(herbs, key) for name, key in HERB_FACETS.items()}
+        # Duplicate ids never form a combination, as in the ranked listings
+        self.all_patterns = pack(unique_rows)
+        self.all_herbs = pack(unique_cols)
+        self._pattern_total = int(unique_rows.sum())
+        self._herb_total = int(unique_cols.sum())
+        self._row_at_least, self._col_at_least = _score_histograms(scores, unique_rows, unique_cols)
+
+    @classmethod
+    def from_matcher(cls, matcher):
+        unique_rows, unique_cols = matcher.score_engine.unique_axes()
+        return cls(matcher.patterns, matcher.herbs, matcher.score_matrix(), unique_rows, unique_cols)
+
+    @staticmethod
+    def _intersect(base, facets, filters, skip=None):
+        bitmap = base
+        for name, values in filters.items():
+            if name != skip and name in facets and values:
+                bitmap = bitmap & facets[name].bitmap(values)
+        return bitmap
+
+    def _weights(self, mask, partners, full_partners, at_least, scan, low, high):
+        """Per record (0 where mask is False): partners whose pair score is in [low, high].
+
+        Full score range: the partner count. All partners selected: the
+        precomputed histogram. Otherwise scan() gives the selected records ×
+        selected partners block once.
+        """
+        weights = np.zeros(len(mask), dtype=np.int64)
+        rows = np.flatnonzero(mask)
+        if low <= 0 and high >= SCORE_LEVELS - 1:
+            weights[rows] = len(partners)
+        elif full_partners:
+            hist = at_least[rows]
+            weights[rows] = hist[:, max(low, 0)].astype(np.int64) - hist[:, min(high, SCORE_LEVELS - 1) + 1]
+        else:
+            block = scan()
+            weights[rows] = ((block >= low) & (block <= high)).sum(axis=1, dtype=np.int64)
+        return weights
+
+    def query(self, filters, min_score=0, max_score=100, limit=20, offset=0):
+        """Matching combinations (best first) plus per-facet and per-score-bucket counts.
+
+        filters maps facet names (PATTERN_FACETS, HERB_FACETS) to lists of
+        accepted values. Returns (total, [(pattern_index, herb_index, score)], facet counts).
+        """
+        pattern_count, herb_count = len(self.patterns), len(self.herbs)
+        pattern_rows = np.flatnonzero(unpack(
+            self._intersect(self.all_patterns, self.pattern_facets, filters), pattern_count))
+        herb_cols = np.flatnonzero(unpack(self._intersect(self.all_herbs, self.herb_facets, filters), herb_count))
+        unique_rows = unpack(self.all_patterns, pattern_count)
+        unique_cols = unpack(self.all_herbs, herb_count)
+        # With every (unique) herb or pattern selected, the precomputed histograms answer score ranges
+        full_herbs = len(herb_cols) == self._herb_total
+        full_patterns = len(pattern_rows) == self._pattern_total
+
+        # Each side is scanned at most once, against the other side's full filter set
+        herb_block, pattern_block = [], []
+
+        def scan_herbs():
+            if not herb_block:
+                herb_block.append(np.asarray(self.scores[np.ix_(np.flatnonzero(unique_rows), herb_cols)]))
+            return herb_block[0]
+
+        def scan_patterns():
+            if not pattern_block:
+                pattern_block.append(np.asarray(self.scores[np.ix_(pattern_rows, np.flatnonzero(unique_cols))]).T)
+            return pattern_block[0]
+
+        def herbs_per_pattern(low, high):
+            return self._weights(unique_rows, herb_cols, full_herbs, self._row_at_least, scan_herbs, low, high)
+
+        row_weights = herbs_per_pattern(min_score, max_score)
+        col_weights = self._weights(unique_cols, pattern_rows, full_patterns, self._col_at_least, scan_patterns,
+                                    min_score, max_score)
+
+        counts = {}
+        for name, facet in self.pattern_facets.items():
+            others = np.flatnonzero(unpack(
+                self._intersect(self.all_patterns, self.pattern_facets, filters, skip=name), pattern_count))
+            counts[name] = facet.counts(others, row_weights[others])
+        for name, facet in self.herb_facets.items():
+            others = np.flatnonzero(unpack(
+                self._intersect(self.all_herbs, self.herb_facets, filters, skip=name), herb_count))
+            counts[name] = facet.counts(others, col_weights[others])
+        # Score buckets ignore the score range, like the other facets ignore their own filter
+        counts['score'] = {bucket: int(herbs_per_pattern(low, high)[pattern_rows].sum())
+                           for bucket, low, high in SCORE_BUCKETS}
+
+        total = int(row_weights[pattern_rows].sum())
+        results = []
+        if total and limit > 0 and offset < total:
+            if herb_block:
+                block = herb_block[0][np.isin(np.flatnonzero(unique_rows), pattern_rows, assume_unique=True)]
+            elif len(pattern_rows) == pattern_count and len(herb_cols) == herb_count:
+                block = self.scores  # nothing filtered out: rank the matrix itself, no copy
+            else:
+                block = self.scores[np.ix_(pattern_rows, herb_cols)]
+            in_range = None
+            if min_score > 0 or max_score < SCORE_LEVELS - 1:
+                in_range = (block >= min_score) & (block <= max_score)
+            # Flat order of the block follows catalog order, so ties rank like top_k on the full matrix
+            for flat_index in top_k(block, offset + limit, mask=in_range)[offset:]:
+                row, col = divmod(int(flat_index), len(herb_cols))
+                results.append((int(pattern_rows[row]), int(herb_cols[col]), int(block[row, col])))
+        return total, results, counts
@@ -0,0 +1,93 @@
+# file_sender.py
+"""File responses backed by an in-memory stat cache.
+
+send_from_directory() stats the file on every request, and the image routes
+checked os.path.exists() first, so each image cost two stat() calls before a
+byte was sent. FileStatCache remembers (size, mtime) per path for a few seconds,
+missing files included. send_cached_file() then builds the same response
+werkzeug would:
+- the body is a wsgi.file_wrapper, which gunicorn sends with sendfile(2);
+- conditional GETs (ETag, Last-Modified) return 304;
+- Range requests return 206.
+"""
+import mimetypes
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from flask import current_app, request
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
+from werkzeug.wsgi import wrap_file
+
+# The os.stat_result fields used here, so a FileStat can stand in for one
+FileStat = namedtuple('FileStat', ['st_size', 'st_mtime', 'st_mtime_ns'])
+
+
+class FileStatCache:
+    """path -> FileStat (None for missing files), re-checked after ttl seconds.
+
+    A file replaced in place is picked up within ttl seconds; until then the old
+    size and ETag are used.
+    """
+
+    def __init__(self, ttl=5.0, maxsize=8192):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # path -> (checked_at, FileStat or None)
+        self._lock = threading.Lock()
+
+    def stat(self, path):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and now - entry[0] < self.ttl:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        try:
+            st = os.stat(path)
+            result = FileStat(st.st_size, st.st_mtime, st.st_mtime_ns)
+        except OSError:
+            result = None
+
+        with self._lock:
+            self._entries[path] = (now, result)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def send_cached_file(path, file_stat, mimetype=None, etag=None, max_age=None, immutable=False):
+    """Like send_file(path, conditional=True), using an already known FileStat"""
+    if mimetype is None:
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    file = open(path, 'rb')
+    response = current_app.response_class(wrap_file(request.environ, file), mimetype=mimetype,
+                                          direct_passthrough=True)
+    response.content_length = file_stat.st_size
+    response.last_modified = file_stat.st_mtime
+    response.set_etag(etag or f"{file_stat.st_mtime_ns:x}-{file_stat.st_size:x}")
+
+    if max_age:
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+        response.expires = int(time.time() + max_age)
+        response.cache_control.immutable = immutable
+    else:
+        response.cache_control.no_cache = True
+
+    try:
+        return response.make_conditional(request.environ, accept_ranges=True, complete_length=file_stat.st_size)
+    except RequestedRangeNotSatisfiable:
+        file.close()
+        raise
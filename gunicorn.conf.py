@@ -0,0 +1,30 @@
+# gunicorn.conf.py
+"""Gunicorn settings: gunicorn -c gunicorn.conf.py wsgi:application
+
+Environment overrides: BIND, WEB_CONCURRENCY (worker processes),
+GUNICORN_THREADS (threads per worker).
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+
+# Threaded workers: a slow client or a long NDJSON stream holds one thread, not a whole process
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+keepalive = 5
+timeout = 60
+
+# Load the catalog, indexes and score matrix once in the master, then fork
+preload_app = True
+
+# Image bodies go out through wsgi.file_wrapper, which gunicorn sends with sendfile(2)
+sendfile = True
+
+
+def post_fork(server, worker):
+    # Threads don't survive fork(): each worker starts its own data watcher
+    from app import DATA_RELOAD_INTERVAL, data_store
+    if DATA_RELOAD_INTERVAL > 0:
+        data_store.start()
@@ -0,0 +1,145 @@
+# image_derivatives.py
+"""Resized WebP/JPEG derivatives of pattern and product images, cached on disk.
+
+Pre-generate the standard widths for every image (run from the project root):
+
+    python image_derivatives.py
+    python image_derivatives.py --widths 320 640 --formats webp --workers 4
+"""
+import argparse
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageOps
+
+from index_files import IMAGE_SOURCES, list_images
+
+CACHE_DIR = os.path.join('cache', 'images')
+IMAGE_DIRECTORIES = [directory for _, directory in IMAGE_SOURCES]
+
+# Requested widths snap up to one of these, so the cache can't be flooded with arbitrary sizes
+STANDARD_WIDTHS = (160, 320, 480, 640, 960, 1280)
+
+# format name -> (Pillow format, mimetype, file extension, save options)
+FORMATS = {
+    'webp': ('WEBP', 'image/webp', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'image/jpeg', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+FORMAT_ALIASES = {'jpg': 'jpeg'}
+
+# Derivatives are keyed by source mtime, so clients may keep them for a long time
+MAX_AGE = 30 * 24 * 3600
+
+
+def normalize_width(width):
+    """Snap a requested width to the smallest standard width that covers it"""
+    if width is None or width <= 0:
+        return None
+    for standard in STANDARD_WIDTHS:
+        if width <= standard:
+            return standard
+    return STANDARD_WIDTHS[-1]
+
+
+def normalize_format(fmt):
+    if not fmt:
+        return None
+    fmt = FORMAT_ALIASES.get(fmt.lower(), fmt.lower())
+    return fmt if fmt in FORMATS else None
+
+
+def derivative_key(src_path, stat, width, fmt):
+    """Cache key (also the ETag): source path, mtime, size and parameters"""
+    raw = f"{os.path.abspath(src_path)}|{stat.st_mtime_ns}|{stat.st_size}|{width}|{fmt}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def render_derivative(src_path, dest_path, width, fmt):
+    """Resize src_path to width (never upscaling) and save it as fmt"""
+    pil_format, _, _, options = FORMATS[fmt]
+    with Image.open(src_path) as image:
+        image = ImageOps.exif_transpose(image)
+        if width and image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.LANCZOS)
+
+        if pil_format == 'JPEG' and image.mode != 'RGB':
+            # JPEG has no alpha channel: flatten onto white
+            rgba = image.convert('RGBA')
+            image = Image.new('RGB', rgba.size, (255, 255, 255))
+            image.paste(rgba, mask=rgba.getchannel('A'))
+        elif pil_format == 'WEBP' and image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        # Write to a temp file and rename, so concurrent workers never see a partial file;
+        # the name is per thread, as threads of one worker may render the same derivative at once
+        tmp_path = f"{dest_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            image.save(tmp_path, pil_format, **options)
+            os.replace(tmp_path, dest_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+def get_derivative(src_path, width=None, fmt='jpeg', stat=None):
+    """Return (path, etag, mimetype) of the cached derivative, rendering it on first use.
+
+    stat: the source's os.stat() result, if the caller already has it
+    """
+    width = normalize_width(width)
+    fmt = normalize_format(fmt) or 'jpeg'
+    stat = stat or os.stat(src_path)
+    key = derivative_key(src_path, stat, width, fmt)
+    _, mimetype, extension, _ = FORMATS[fmt]
+    path = os.path.join(CACHE_DIR, key[:2], f"{key}.{extension}")
+
+    if not os.path.exists(path):
+        render_derivative(src_path, path, width, fmt)
+    return path, key, mimetype
+
+
+def _pregenerate(task):
+    src_path, width, fmt = task
+    try:
+        get_derivative(src_path, width, fmt)
+        return None
+    except Exception as e:
+        return f"{src_path} ({width}px {fmt}): {e}"
+
+
+def iter_source_images(directories=None):
+    for directory in directories or IMAGE_DIRECTORIES:
+        for name in list_images(directory):
+            yield os.path.join(directory, name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pre-generate resized image derivatives')
+    parser.add_argument('--widths', type=int, nargs='+', default=list(STANDARD_WIDTHS))
+    parser.add_argument('--formats', nargs='+', default=list(FORMATS), choices=list(FORMATS))
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    tasks = [(src, normalize_width(width), fmt)
+             for src in iter_source_images()
+             for width in args.widths
+             for fmt in args.formats]
+
+    start = time.time()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        errors = [e for e in executor.map(_pregenerate, tasks, chunksize=4) if e]
+
+    for error in errors:
+        print(f"Failed to generate derivative: {error}")
+    print(f"Generated {len(tasks) - len(errors)}/{len(tasks)} derivatives "
+          f"with {args.workers} workers in {time.time() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
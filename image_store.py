@@ -0,0 +1,278 @@
+# image_store.py
+"""Content-addressed view of the pattern and product images.
+
+Every image file is hashed once (SHA-256). Files whose bytes are identical
+share one digest and one canonical file, which /img/<digest> serves with
+immutable cache headers. Two 64-bit perceptual hashes of each distinct file
+flag near-duplicates:
+- a difference hash (dHash) of the artwork's grayscale thumbnail catches
+  re-encoded, resized and recolored copies;
+- a silhouette hash of the artwork's filled outline catches a line drawing
+  and its color-filled version (翼马 and 翼马_有颜色). Full-bleed images have a
+  rectangular silhouette, so they have no silhouette hash.
+Variants with a different layout, such as the single 联珠 motif and the
+repeated 联珠_有颜色 band, are not near-duplicates by either hash.
+
+The manifest (kind, name) -> digest, FileStat and hashes is kept in memory
+and saved to cache/image_store/manifest.json. It is built in a background
+thread, never in a request: until then, files whose size and mtime match the
+saved manifest are served by digest, and other files by name only. The source
+files are never moved or deleted: duplicates are reported, and served from one
+canonical copy.
+
+    python image_store.py        # build the manifest and print the duplicate report
+"""
+import hashlib
+import os
+import time
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from file_sender import FileStat
+from index_files import IMAGE_EXTENSIONS, IMAGE_SOURCES, read_manifest, write_manifest
+from visual_index import BackgroundIndexManager
+
+STORE_DIR = os.path.join('cache', 'image_store')
+SOURCES = IMAGE_SOURCES
+
+# Bump when the perceptual hashes change so saved hashes are recomputed instead of mixed
+HASH_VERSION = 'dhash8-crop+silhouette8-v1'
+# Hash bits (of 64) that may differ between near-duplicates; identical files are exact duplicates instead.
+# On data/, unrelated motifs are 18+ bits apart by dHash and 25+ by silhouette; 翼马 and 翼马_有颜色 are 3.
+NEAR_DUPLICATE_DISTANCE = 10
+# Silhouettes must also have about the same aspect ratio (the 8×8 grid hides it)
+MAX_ASPECT_RATIO = 1.25
+# Grayscale level below which a pixel belongs to the artwork rather than the white page
+BACKGROUND_LEVEL = 235
+# Silhouettes filling more of their bounding box than this are rectangles, not outlines
+SOLID_COVERAGE = 0.9
+
+StoredImage = namedtuple('StoredImage', ['kind', 'name', 'path', 'digest', 'stat', 'dhash', 'silhouette', 'aspect'])
+
+# Set bits per byte value; np.bitwise_count needs NumPy 2
+_POPCOUNT = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+
+def hamming(a, b):
+    """Differing bits between uint64 hash arrays (broadcast)"""
+    xor = np.ascontiguousarray(np.bitwise_xor(a, b), dtype=np.uint64)
+    return _POPCOUNT[xor.view(np.uint8)].reshape(*xor.shape, 8).sum(axis=-1, dtype=np.int64)
+
+
+def content_digest(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def _pack(bits):
+    return int(np.packbits(bits.ravel()).view('>u8')[0])
+
+
+def _read_gray(path):
+    """Grayscale image with transparent areas shown as white page"""
+    image = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+    if image is None:
+        raise ValueError(f"cannot decode {path}")
+    if image.ndim == 3 and image.shape[2] == 4:
+        alpha = image[:, :, 3:].astype(np.float32) / 255
+        image = (image[:, :, :3] * alpha + 255 * (1 - alpha)).astype(np.uint8)
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return image
+
+
+def perceptual_hashes(path):
+    """(dHash, silhouette hash or None, aspect ratio) of the artwork in an image.
+
+    The scans are small motifs on white pages, so both hashes look at the
+    bounding box of the non-background pixels; otherwise every page would
+    hash alike.
+    """
+    image = _read_gray(path)
+    artwork = image < BACKGROUND_LEVEL
+    rows, cols = np.nonzero(artwork)
+    if len(rows) >= 64:
+        box = (slice(rows.min(), rows.max() + 1), slice(cols.min(), cols.max() + 1))
+        image, artwork = image[box], artwork[box]
+    height, width = image.shape
+
+    # dHash: brightness gradients of a 9×8 thumbnail
+    thumbnail = cv2.resize(image, (9, 8), interpolation=cv2.INTER_AREA).astype(np.int16)
+    difference_hash = _pack(thumbnail[:, 1:] > thumbnail[:, :-1])
+
+    # Silhouette: close the strokes, fill enclosed holes, then sample an 8×8 grid
+    mask = artwork.astype(np.uint8)
+    size = max(3, int(0.05 * max(height, width)) | 1)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (size, size)))
+    outside = np.pad(mask, 1)
+    cv2.floodFill(outside, None, (0, 0), 2)
+    filled = (outside[1:-1, 1:-1] != 2).astype(np.float32)
+    grid = cv2.resize(filled, (8, 8), interpolation=cv2.INTER_AREA) > 0.5
+    silhouette = _pack(grid) if grid.mean() <= SOLID_COVERAGE else None
+    return difference_hash, silhouette, width / height
+
+
+def _list_images(directory):
+    """[(name, os.stat_result)] of the images in directory, by name"""
+    try:
+        entries = sorted(os.scandir(directory), key=lambda entry: entry.name)
+    except OSError:
+        return []
+    return [(entry.name, entry.stat()) for entry in entries
+            if entry.name.lower().endswith(IMAGE_EXTENSIONS) and entry.is_file()]
+
+
+class ImageManifest:
+    """One scan of the image directories: lookups by name and by digest, plus duplicate groups"""
+
+    def __init__(self, images):
+        self.images = images
+        self.by_name = {(image.kind, image.name): image for image in images}
+        self.by_digest = {}
+        for image in images:
+            self.by_digest.setdefault(image.digest, image)  # the first copy is the canonical one
+        self.version = hashlib.sha1(''.join(f"{i.kind}/{i.name}={i.digest};" for i in images)
+                                    .encode('utf-8')).hexdigest()[:16]
+
+    def lookup(self, kind, name):
+        return self.by_name.get((kind, name))
+
+    def exact_duplicates(self):
+        """[[StoredImage]] groups of files with identical bytes"""
+        groups = {}
+        for image in self.images:
+            groups.setdefault(image.digest, []).append(image)
+        return [group for group in groups.values() if len(group) > 1]
+
+    def near_duplicates(self, max_distance=NEAR_DUPLICATE_DISTANCE, block_rows=1024):
+        """[(StoredImage, StoredImage, bits)] of distinct files whose dHashes or silhouettes differ in few bits"""
+        canonical = [image for image in self.by_digest.values() if image.dhash is not None]
+        hashes = np.array([image.dhash for image in canonical], dtype=np.uint64)
+        has_silhouette = np.array([image.silhouette is not None for image in canonical], dtype=bool)
+        silhouettes = np.array([image.silhouette or 0 for image in canonical], dtype=np.uint64)
+        log_aspects = np.log([image.aspect for image in canonical]) if canonical else np.zeros(0)
+        pairs = []
+        for start in range(0, len(canonical), block_rows):
+            stop = min(start + block_rows, len(canonical))
+            distances = hamming(hashes[start:stop, None], hashes[None, :])
+            shape_distances = hamming(silhouettes[start:stop, None], silhouettes[None, :])
+            same_shape = (has_silhouette[start:stop, None] & has_silhouette[None, :]
+                          & (np.abs(log_aspects[start:stop, None] - log_aspects[None, :]) <= np.log(MAX_ASPECT_RATIO)))
+            distances = np.where(same_shape, np.minimum(distances, shape_distances), distances)
+            first, second = np.nonzero(distances <= max_distance)
+            for i, j in zip(first.tolist(), second.tolist()):
+                if start + i < j:
+                    pairs.append((canonical[start + i], canonical[j], int(distances[i, j])))
+        return sorted(pairs, key=lambda pair: pair[2])
+
+    def to_json(self):
+        return [{'kind': image.kind, 'name': image.name, 'digest': image.digest, 'size': image.stat.st_size,
+                 'mtime_ns': image.stat.st_mtime_ns,
+                 'dhash': None if image.dhash is None else f"{image.dhash:016x}",
+                 'silhouette': None if image.silhouette is None else f"{image.silhouette:016x}",
+                 'aspect': image.aspect}
+                for image in self.images]
+
+
+def build_manifest(sources=SOURCES, previous=None, hash_new=True):
+    """Scan the sources; files whose size and mtime are unchanged keep their digest and hashes.
+
+    With hash_new=False, files that would need hashing are left out instead.
+    """
+    known = previous or {}
+    hashes_by_digest = {}
+    images = []
+    for kind, directory in sources:
+        root = os.path.abspath(directory)
+        for name, stat in _list_images(root):
+            path = os.path.join(root, name)
+            file_stat = FileStat(stat.st_size, stat.st_mtime, stat.st_mtime_ns)
+            cached = known.get((kind, name))
+            if cached is not None and (cached['size'], cached['mtime_ns']) == (stat.st_size, stat.st_mtime_ns):
+                digest = cached['digest']
+                hashes = (None if cached['dhash'] is None else int(cached['dhash'], 16),
+                          None if cached['silhouette'] is None else int(cached['silhouette'], 16),
+                          cached['aspect'])
+            elif not hash_new:
+                continue
+            else:
+                try:
+                    digest = content_digest(path)
+                except OSError as e:
+                    print(f"Cannot hash image {path}: {e}")
+                    continue
+                if digest in hashes_by_digest:
+                    hashes = hashes_by_digest[digest]
+                else:
+                    try:
+                        hashes = perceptual_hashes(path)
+                    except Exception as e:
+                        print(f"Cannot compute perceptual hash of {path}: {e}")
+                        hashes = (None, None, 1.0)
+            hashes_by_digest[digest] = hashes
+            images.append(StoredImage(kind, name, path, digest, file_stat, *hashes))
+    return ImageManifest(images)
+
+
+def load_saved(store_dir=STORE_DIR):
+    """(kind, name) -> saved manifest entry, empty if there is none or it has other hashes"""
+    try:
+        saved = read_manifest(store_dir)
+        if saved.get('hashes') != HASH_VERSION:
+            return {}
+        return {(entry['kind'], entry['name']): entry for entry in saved['images']}
+    except (OSError, ValueError, KeyError, TypeError):
+        return {}
+
+
+def save(manifest, store_dir=STORE_DIR):
+    write_manifest(store_dir, {'version': manifest.version, 'hashes': HASH_VERSION, 'images': manifest.to_json()})
+
+
+class ImageStore(BackgroundIndexManager):
+    """Per-process manifest; a background thread rehashes changed files at most once per check_interval"""
+
+    def __init__(self, sources=SOURCES, store_dir=STORE_DIR, check_interval=5.0):
+        super().__init__(store_dir, check_interval)
+        self.sources = sources
+
+    def _signature_now(self):
+        return tuple((kind, name, stat.st_mtime_ns, stat.st_size)
+                     for kind, directory in self.sources for name, stat in _list_images(directory))
+
+    def _load(self):
+        # Only a directory scan: files without a valid saved entry wait for the background build
+        return build_manifest(self.sources, load_saved(self.index_dir), hash_new=False)
+
+    def _rebuild(self):
+        # Every worker hashes what changed itself; the saved manifest only spares work after a restart
+        previous = load_saved(self.index_dir)
+        if self._index is not None:
+            previous.update(((e['kind'], e['name']), e) for e in self._index.to_json())
+        manifest = build_manifest(self.sources, previous)
+        if self._index is None or manifest.version != self._index.version:
+            try:
+                save(manifest, self.index_dir)
+            except OSError as e:
+                print(f"Cannot save image manifest: {e}")
+        return manifest, True
+
+
+def main():
+    start = time.time()
+    manifest = ImageStore().refresh()
+    print(f"Image store: {len(manifest.images)} files, {len(manifest.by_digest)} distinct, "
+          f"built in {time.time() - start:.1f}s")
+    for group in manifest.exact_duplicates():
+        print("Identical: " + ', '.join(f"{image.kind}/{image.name}" for image in group))
+    for first, second, distance in manifest.near_duplicates():
+        print(f"Near-duplicate ({distance} bits): {first.kind}/{first.name} ~ {second.kind}/{second.name}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+# index_files.py
+"""On-disk layout shared by the image indexes (visual, color, image store) and image tools.
+
+An index directory holds manifest.json and, for the matrix-backed indexes, the
+.npy file the manifest names. A new matrix is saved under a fresh name and the
+manifest is then replaced in one rename, so readers see the old index or the
+new one, never a mix. build.lock keeps two processes from building at once.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+
+import numpy as np
+
+MANIFEST_FILE = 'manifest.json'
+LOCK_FILE = 'build.lock'
+STALE_LOCK_SECONDS = 600
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+PATTERN_IMAGES = os.path.join('data', 'patterns')
+PRODUCT_IMAGES = os.path.join('data', 'products')
+# (kind, directory) of every image the indexes cover
+IMAGE_SOURCES = (('pattern', PATTERN_IMAGES), ('product', PRODUCT_IMAGES))
+
+
+def list_images(directory):
+    """Sorted image file names in directory, empty if it doesn't exist"""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(name for name in os.listdir(directory) if name.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def read_manifest(directory):
+    """The directory's manifest; raises OSError or ValueError when it is missing or unreadable"""
+    with open(os.path.join(directory, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_manifest(directory, manifest):
+    """Atomically replace the directory's manifest"""
+    os.makedirs(directory, exist_ok=True)
+    # Per-process and per-thread, so concurrent writers never share a temp file
+    tmp_path = os.path.join(directory, f"{MANIFEST_FILE}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(directory, MANIFEST_FILE))
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def write_index(directory, prefix, matrix, manifest):
+    """Save matrix as a new {prefix}-<id>.npy, point the manifest at it, then remove older matrices"""
+    os.makedirs(directory, exist_ok=True)
+    matrix_file = f"{prefix}-{uuid.uuid4().hex[:12]}.npy"
+    np.save(os.path.join(directory, matrix_file), matrix)
+    write_manifest(directory, {**manifest, 'matrix': matrix_file})
+
+    # Old matrices may still be mapped by running workers; removal can fail on Windows
+    for name in os.listdir(directory):
+        if name.startswith(f"{prefix}-") and name.endswith('.npy') and name != matrix_file:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+
+def acquire_build_lock(directory):
+    """Cross-process build lock: the lock file's path, or None if another process holds it"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, LOCK_FILE)
+    try:
+        if time.time() - os.stat(path).st_mtime > STALE_LOCK_SECONDS:
+            os.remove(path)  # left behind by a crashed builder
+    except OSError:
+        pass
+    try:
+        os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return path
+    except FileExistsError:
+        return None
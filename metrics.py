@@ -0,0 +1,179 @@
+# metrics.py
+"""In-process counters and histograms rendered in the Prometheus text format.
+
+Metrics are per process: with several workers, scrape each one or sum them in
+Prometheus. Label values must come from a small, fixed set (route rules, stage
+names), never from raw URLs or user input.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from flask import g, request
+from flask.json.provider import DefaultJSONProvider
+
+# Seconds; covers sub-millisecond lookups up to multi-second bulk exports
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter, one series per label combination"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels.get(name, '') for name in self.labelnames), 0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+class Histogram:
+    """Cumulative-bucket histogram with _sum and _count, one series per label combination"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        # Per-bucket (non-cumulative) counts; the overflow slot is the +Inf bucket
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels):
+        series = self._series.get(tuple(labels.get(name, '') for name in self.labelnames))
+        return series[-1] if series else 0
+
+    def samples(self):
+        with self._lock:
+            series = sorted((key, list(values)) for key, values in self._series.items())
+        for key, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), values):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+                yield f"{self.name}_bucket", labels, cumulative
+            yield f"{self.name}_sum", _format_labels(self.labelnames, key), values[-2]
+            yield f"{self.name}_count", _format_labels(self.labelnames, key), values[-1]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.register(Counter(
+    'http_requests_total', 'HTTP requests by route rule, method and status', ('method', 'route', 'status')))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'http_request_duration_seconds', 'Time spent in the view and its hooks (not streamed bodies)', ('method', 'route')))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'matcher_stage_duration_seconds', 'Time spent in matcher stages', ('stage',)))
+IMAGE_BYTES = REGISTRY.register(Counter(
+    'image_bytes_served_total', 'Image bytes sent, originals and resized derivatives', ('kind',)))
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    'cache_lookups_total', 'Lookups in the page, response and template bytecode caches', ('cache', 'result')))
+PROFILES = REGISTRY.register(Counter(
+    'request_profiles_total', 'Requests that asked for a profile, by outcome', ('outcome',)))
+
+
+def stage(name):
+    """Context manager timing one stage: scoring, sorting, sampling, stories, assembly, similarity, serialization"""
+    return STAGE_SECONDS.time(stage=name)
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, with every serialization timed as the 'serialization' stage"""
+
+    def dumps(self, obj, **kwargs):
+        with stage('serialization'):
+            return super().dumps(obj, **kwargs)
+
+
+def init_app(app):
+    """Count and time every request by its route rule"""
+    app.json = TimedJSONProvider(app)
+
+    @app.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            # Unmatched URLs share one label so scanners can't create unbounded series
+            route = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+            REQUEST_SECONDS.observe(time.perf_counter() - start, method=request.method, route=route)
+            REQUESTS.inc(method=request.method, route=route, status=response.status_code)
+        return response
@@ -1,181 +1,320 @@
 # pattern_matcher.py
 import json
-import random
+import threading
+from collections import namedtuple
 from itertools import product
 
+import numpy as np
+
+from metrics import stage
+from score_engine import ScoreEngine, iter_ranked, top_k
+from similarity_engine import BLOCK_ROWS as SIMILARITY_BLOCK_ROWS, MATRIX_MAX_PATTERNS, SimilarityEngine, top_similar
+from story_engine import StoryEngine
+
+
+# Define matching rules
+MATCHING_RULES = {
+    'cultural': {
+        'chinese': ['Ginseng', 'Goji Berry', 'Chinese Angelica', 'Astragalus', 'Chrysanthemum'],
+        'muslim': ['Frankincense', 'Myrrh', 'Saffron', 'Clove', 'Cardamom', 'Cinnamon', 'Nutmeg']
+        # 添加更多适合穆斯林/印尼文化的中草药
+    },
+    'color_themes': {
+        'Red': ['Ginseng', 'Goji Berry', 'Safflower'],
+        'Green': ['Mint', 'Green Tea', 'Lotus Leaf'],
+        'Gold': ['Turmeric', 'Honeysuckle', 'Licorice'],
+        'Blue': ['Isatis Root', 'Gromwell', 'Seaweed'],
+        'Purple': ['Lavender', 'Echinacea', 'Bilberry'],
+        'White': ['Chrysanthemum', 'White Peony', 'Pearl']
+    },
+    'meaning_matches': {
+        'Auspicious': ['Ginseng', 'Lingzhi Mushroom'],
+        'Health': ['Goji Berry', 'Astragalus'],
+        'Harmony': ['Licorice', 'Chrysanthemum'],
+        'Strength': ['Chinese Angelica', 'Codonopsis'],
+        'Prosperity': ['Ginseng', 'Goji Berry'],
+        'Balance': ['Licorice', 'Schisandra'],
+        'Purity': ['Chrysanthemum', 'White Peony']
+    }
+}
+
+# Rule hits for one herb name: which cultures, color themes and meaning keywords list it
+RuleHits = namedtuple('RuleHits', ['cultures', 'colors', 'meanings'])
+NO_RULE_HITS = RuleHits(frozenset(), frozenset(), frozenset())
+
+# Rule-relevant features of one pattern
+PatternFeatures = namedtuple('PatternFeatures', ['culture', 'colors', 'meanings', 'tags'])
+
+
+def compile_rule_index(matching_rules):
+    """Invert matching_rules into herb name -> RuleHits"""
+    hits = {}
+    for field, section in (('cultures', 'cultural'), ('colors', 'color_themes'), ('meanings', 'meaning_matches')):
+        for key, herb_names in matching_rules[section].items():
+            for herb_name in herb_names:
+                hits.setdefault(herb_name, {'cultures': set(), 'colors': set(), 'meanings': set()})[field].add(key)
+    return {name: RuleHits(frozenset(h['cultures']), frozenset(h['colors']), frozenset(h['meanings']))
+            for name, h in hits.items()}
+
+
+def extract_pattern_features(pattern, matching_rules):
+    """Precompute the parts of a pattern that calculate_match_score looks at"""
+    meaning = pattern.get('meaning', '')
+    return PatternFeatures(
+        culture=pattern.get('culture', 'chinese'),
+        # Keep duplicates: a color listed twice scores twice
+        colors=tuple(c for c in pattern.get('colors', []) if c in matching_rules['color_themes']),
+        meanings=frozenset(k for k in matching_rules['meaning_matches'] if k in meaning),
+        tags=frozenset(pattern.get('style_tags', []))
+    )
+
 
 class PatternMatcher:
-    def __init__(self, patterns, herbs):
+    """Pattern + herb matcher.
+
+    Everything derived from the catalog is compiled in __init__ and is read-only
+    afterwards, so one instance can be shared by all requests and threads.
+    """
+
+    def __init__(self, patterns, herbs, matching_rules=None):
         self.patterns = patterns
         self.herbs = herbs
-
-        # Define matching rules
-        # 在 pattern_matcher.py 的 __init__ 方法中，更新 matching_rules
-
-        self.matching_rules = {
-            'cultural': {
-                'chinese': ['Ginseng', 'Goji Berry', 'Chinese Angelica', 'Astragalus', 'Chrysanthemum'],
-                'muslim': ['Frankincense', 'Myrrh', 'Saffron', 'Clove', 'Cardamom', 'Cinnamon', 'Nutmeg']
-                # 添加更多适合穆斯林/印尼文化的中草药
-            },
-            'color_themes': {
-                'Red': ['Ginseng', 'Goji Berry', 'Safflower'],
-                'Green': ['Mint', 'Green Tea', 'Lotus Leaf'],
-                'Gold': ['Turmeric', 'Honeysuckle', 'Licorice'],
-                'Blue': ['Isatis Root', 'Gromwell', 'Seaweed'],
-                'Purple': ['Lavender', 'Echinacea', 'Bilberry'],
-                'White': ['Chrysanthemum', 'White Peony', 'Pearl']
-            },
-            'meaning_matches': {
-                'Auspicious': ['Ginseng', 'Lingzhi Mushroom'],
-                'Health': ['Goji Berry', 'Astragalus'],
-                'Harmony': ['Licorice', 'Chrysanthemum'],
-                'Strength': ['Chinese Angelica', 'Codonopsis'],
-                'Prosperity': ['Ginseng', 'Goji Berry'],
-                'Balance': ['Licorice', 'Schisandra'],
-                'Purity': ['Chrysanthemum', 'White Peony']
-            }
-        }
-
-    def find_all_combinations(self, max_results=50):
+        self.matching_rules = matching_rules or MATCHING_RULES
+
+        # Inverted rule index and per-record features
+        self.rule_index = compile_rule_index(self.matching_rules)
+        self._pattern_features = {}
+        for pattern in patterns:
+            self._pattern_features.setdefault(
+                pattern.get('id'), (pattern, extract_pattern_features(pattern, self.matching_rules)))
+        self._herb_tags = {}
+        for herb in herbs:
+            self._herb_tags.setdefault(herb.get('id'), (herb, frozenset(herb.get('tags', []))))
+        # Score matrix row / column of each id (first occurrence, like Catalog.get_pattern / get_herb)
+        self.pattern_rows = {}
+        for row, pattern in enumerate(patterns):
+            self.pattern_rows.setdefault(pattern.get('id'), row)
+        self.herb_cols = {}
+        for col, herb in enumerate(herbs):
+            self.herb_cols.setdefault(herb.get('id'), col)
+
+        self._lock = threading.Lock()
+        self._score_engine = None
+        self._score_matrix = None
+        self._unique_pairs = None
+        self._similarity_engine = None
+        self._similarity_matrix = None
+        self.story_engine = StoryEngine()
+
+    @property
+    def score_engine(self):
+        """Vectorized scorer over the current patterns and herbs (built on first use)"""
+        if self._score_engine is None:
+            with self._lock:
+                if self._score_engine is None:
+                    self._score_engine = ScoreEngine(self.patterns, self.herbs, self.matching_rules)
+        return self._score_engine
+
+    def score_matrix(self):
+        """Read-only P×H score matrix, computed once and shared"""
+        if self._score_matrix is None:
+            engine = self.score_engine
+            with self._lock:
+                if self._score_matrix is None:
+                    unique_pairs = engine.unique_pair_mask()
+                    with stage('scoring'):
+                        scores = engine.score_matrix()
+                    scores.setflags(write=False)
+                    self._unique_pairs = unique_pairs
+                    self._score_matrix = scores
+        return self._score_matrix
+
+    def attach_score_matrix(self, scores):
+        """Use a precomputed (e.g. memory-mapped) P×H score matrix instead of computing one"""
+        if scores.shape != (len(self.patterns), len(self.herbs)):
+            raise ValueError(f"score matrix shape {scores.shape} does not match the catalog")
+        engine = self.score_engine
+        with self._lock:
+            self._unique_pairs = engine.unique_pair_mask()
+            self._score_matrix = scores
+
+    @property
+    def similarity_engine(self):
+        """Vectorized pattern similarity over the current patterns (built on first use)"""
+        if self._similarity_engine is None:
+            with self._lock:
+                if self._similarity_engine is None:
+                    self._similarity_engine = SimilarityEngine(self.patterns)
+        return self._similarity_engine
+
+    def similarity_matrix(self):
+        """Read-only P×P pattern similarity matrix, computed once and shared.
+
+        None when the catalog is too large to hold it (MATRIX_MAX_PATTERNS);
+        similarity_rows() then scores the requested rows on the fly.
+        """
+        if len(self.patterns) > MATRIX_MAX_PATTERNS:
+            return None
+        if self._similarity_matrix is None:
+            engine = self.similarity_engine
+            with self._lock:
+                if self._similarity_matrix is None:
+                    self._similarity_matrix = engine.similarity_matrix()
+        return self._similarity_matrix
+
+    def similarity_rows(self, start, stop):
+        """Similarity scores (0-100) of patterns[start:stop] against every pattern"""
+        matrix = self.similarity_matrix()
+        if matrix is not None:
+            return matrix[start:stop]
+        return self.similarity_engine.similarity_block(start, stop)
+
+    def similarity_subset(self, rows):
+        """Similarity scores (0-100) among the given pattern rows, len(rows) × len(rows)"""
+        matrix = self.similarity_matrix()
+        if matrix is not None:
+            return matrix[np.ix_(rows, rows)]
+        return self.similarity_engine.similarity_subset(rows)
+
+    def score_pairs(self, pattern_rows, herb_cols):
+        """Scores of many (pattern row, herb column) pairs, gathered from the score matrix in one pass"""
+        scores = self.score_matrix()
+        with stage('scoring'):
+            return np.asarray(scores[np.asarray(pattern_rows, dtype=np.intp), np.asarray(herb_cols, dtype=np.intp)],
+                              dtype=np.int64)
+
+    def find_all_combinations(self, max_results=50, with_stories=True):
         """Generate all possible pattern + herb combinations - optimized for deduplication"""
-        all_combinations = []
-        seen_combinations = set()  # For deduplication
+        scores = self.score_matrix()
 
-        for pattern in self.patterns:
-            for herb in self.herbs:
-                # Create unique identifier
-                combination_key = f"{pattern.get('id', '')}_{herb.get('id', '')}"
+        # Top-k over the whole score matrix; duplicate id pairs are masked out
+        with stage('sorting'):
+            ranked = top_k(scores, max_results, mask=self._unique_pairs)
 
-                # Skip duplicate combinations
-                if combination_key in seen_combinations:
-                    continue
-
-                # Calculate match score
-                score = self.calculate_match_score(pattern, herb)
-
-                # Generate story
-                story = self.generate_story(pattern, herb)
+        all_combinations = []
+        with stage('stories' if with_stories else 'assembly'):
+            for flat_index in ranked:
+                pattern_index, herb_index = divmod(int(flat_index), len(self.herbs))
+                pattern = self.patterns[pattern_index]
+                herb = self.herbs[herb_index]
+                score = int(scores[pattern_index, herb_index])
 
-                # Add combination
                 all_combinations.append({
                     'pattern': pattern,
                     'herb': herb,
                     'score': score,
-                    'story': story,
+                    'story': self.generate_story(pattern, herb, score) if with_stories else None,
                     'combination_name': f"{pattern['name']}·{herb['name']} Series",
-                    'combination_id': combination_key  # Add unique ID
+                    'combination_id': f"{pattern.get('id', '')}_{herb.get('id', '')}"
                 })
 
-                seen_combinations.add(combination_key)
+        return all_combinations
 
-        # Sort by match score
-        all_combinations.sort(key=lambda x: x['score'], reverse=True)
+    def iter_ranked_combinations(self, min_score=0, pattern_mask=None, after=None):
+        """Stream (pattern_index, herb_index, score) over the whole space, best first.
 
-        # Limit number of results
-        return all_combinations[:max_results]
+        Reads from the shared score matrix when it is already built, otherwise
+        scores blocks of patterns on the fly; memory stays bounded either way.
+        """
+        engine = self.score_engine
+        if self._score_matrix is not None:
+            matrix = self._score_matrix
+            score_block = lambda start, stop: matrix[start:stop]
+        else:
+            score_block = engine.score_block
+        unique_rows, unique_cols = engine.unique_axes()
+        return iter_ranked(score_block, engine.shape, unique_rows, unique_cols,
+                           min_score=min_score, row_mask=pattern_mask, after=after)
+
+    def pattern_features(self, pattern):
+        """Precomputed features for catalog patterns, computed on the fly for anything else"""
+        cached = self._pattern_features.get(pattern.get('id'))
+        if cached is not None and cached[0] is pattern:
+            return cached[1]
+        return extract_pattern_features(pattern, self.matching_rules)
+
+    def herb_tags(self, herb):
+        cached = self._herb_tags.get(herb.get('id'))
+        if cached is not None and cached[0] is herb:
+            return cached[1]
+        return frozenset(herb.get('tags', []))
 
     def calculate_match_score(self, pattern, herb):
         """Calculate matching score between pattern and herb"""
-        score = 0
+        features = self.pattern_features(pattern)
+        hits = self.rule_index.get(herb.get('name', ''), NO_RULE_HITS)
 
         # 1. Cultural match
-        pattern_culture = pattern.get('culture', 'chinese')
-        herb_name = herb.get('name', '')
-
-        if pattern_culture == 'chinese' and herb_name in self.matching_rules['cultural']['chinese']:
-            score += 30
-        elif pattern_culture == 'muslim' and herb_name in self.matching_rules['cultural']['muslim']:
-            score += 30
-        else:
-            score += 10  # Base score
+        score = 30 if features.culture in hits.cultures else 10  # 10 = base score
 
         # 2. Color match
-        pattern_colors = pattern.get('colors', [])
-        for color in pattern_colors:
-            if color in self.matching_rules['color_themes']:
-                if herb_name in self.matching_rules['color_themes'][color]:
-                    score += 20
+        score += 20 * sum(1 for color in features.colors if color in hits.colors)
 
         # 3. Meaning match
-        pattern_meaning = pattern.get('meaning', '')
-        for keyword, herbs_list in self.matching_rules['meaning_matches'].items():
-            if keyword in pattern_meaning and herb_name in herbs_list:
-                score += 25
+        score += 25 * len(features.meanings & hits.meanings)
 
         # 4. Tag match (if there are common tags)
-        pattern_tags = set(pattern.get('style_tags', []))
-        herb_tags = set(herb.get('tags', []))
-        common_tags = pattern_tags.intersection(herb_tags)
-        score += len(common_tags) * 5
+        score += 5 * len(features.tags & self.herb_tags(herb))
 
         return min(score, 100)  # Ensure score doesn't exceed 100
 
-    def generate_story(self, pattern, herb):
-        """Generate combination story"""
-        pattern_name = pattern.get('name', '')
-        herb_name = herb.get('name', '')
-        pattern_meaning = pattern.get('meaning', '')
-        herb_effect = herb.get('effect', '')
-
-        # Select different story templates based on match score
-        score = self.calculate_match_score(pattern, herb)
-
-        if score >= 70:
-            story_type = "Perfect Match"
-            intro = f"✨【{story_type}】"
-            connection = "perfectly complements"
-        elif score >= 50:
-            story_type = "Excellent Combination"
-            intro = f"👍【{story_type}】"
-            connection = "harmoniously combines with"
-        else:
-            story_type = "Innovative Experiment"
-            intro = f"💡【{story_type}】"
-            connection = "innovatively fuses with"
-
-        stories = [
-            f"{intro} The 「{pattern_name}」 pattern {connection} {herb_name}, "
-            f"embodying the cultural significance of {pattern_meaning}, "
-            f"while integrating the health benefits of {herb_name} ({herb_effect}), "
-            f"infusing traditional wisdom into modern design.",
+    def generate_story(self, pattern, herb, score=None, language=None):
+        """Generate combination story (pass score when it is already known)"""
+        if score is None:
+            score = self.calculate_match_score(pattern, herb)
+        return self.story_engine.render(pattern, herb, score, language)
 
-            f"{intro} The {pattern_meaning} symbolism of {pattern_name} "
-            f"and the {herb_effect} properties of {herb_name} complement each other, "
-            f"creating culturally rich and practical design products.",
-
-            f"{intro} Merging the visual aesthetics of {pattern_name} "
-            f"with the natural attributes of {herb_name} "
-            f"forms a unique cultural IP suitable for home decor, fashion, and other fields."
-        ]
-
-        return random.choice(stories)
+    def _similar_rows(self, row, scores, top_n):
+        engine = self.similarity_engine
+        exclude = engine.id_codes == engine.id_codes[row]
+        return top_similar(scores, exclude, top_n)
 
     def find_similar_patterns(self, pattern_id, top_n=5):
-        """Find similar patterns"""
-        target_pattern = None
-        for pattern in self.patterns:
-            if pattern.get('id') == pattern_id:
-                target_pattern = pattern
-                break
-
-        if not target_pattern:
+        """Find similar patterns (a row lookup in the precomputed similarity matrix)"""
+        if not isinstance(pattern_id, (int, str)):
+            return []
+        row = self.similarity_engine.row_by_id.get(pattern_id)
+        if row is None:
             return []
 
-        similar_patterns = []
-        for pattern in self.patterns:
-            if pattern.get('id') != pattern_id:
-                # Calculate similarity
-                similarity = self.calculate_pattern_similarity(target_pattern, pattern)
-                if similarity > 0.3:
-                    similar_patterns.append({
-                        **pattern,
-                        'similarity': round(similarity, 2)
-                    })
-
-        # Sort by similarity
-        similar_patterns.sort(key=lambda x: x['similarity'], reverse=True)
-        return similar_patterns[:top_n]
+        with stage('similarity'):
+            similar = self._similar_rows(row, self.similarity_rows(row, row + 1)[0], top_n)
+        return [{**self.patterns[other], 'similarity': similarity} for other, similarity in similar]
+
+    def find_similar_batch(self, pattern_ids, top_n=5):
+        """pattern id -> [(pattern index, similarity)] for each known id; unknown ids are left out"""
+        rows = {pattern_id: self.similarity_engine.row_by_id[pattern_id]
+                for pattern_id in dict.fromkeys(pattern_ids) if pattern_id in self.similarity_engine.row_by_id}
+        matrix = self.similarity_matrix()
+        results = {}
+        items = list(rows.items())
+        with stage('similarity'):
+            for start in range(0, len(items), SIMILARITY_BLOCK_ROWS):
+                chunk = items[start:start + SIMILARITY_BLOCK_ROWS]
+                block_rows = np.array([row for _, row in chunk], dtype=np.intp)
+                block = matrix[block_rows] if matrix is not None else self.similarity_engine.similarity_of(block_rows)
+                for (pattern_id, row), scores in zip(chunk, block):
+                    results[pattern_id] = self._similar_rows(row, scores, top_n)
+        return results
+
+    def find_similar_for_all(self, top_n=5):
+        """pattern id -> [{'id', 'similarity'}] for every pattern (bulk export)"""
+        engine = self.similarity_engine
+        first_rows = {row: pattern_id for pattern_id, row in engine.row_by_id.items()}
+        results = {}
+        # Rows ascend block by block, so the result keeps catalog order
+        for start in range(0, len(self.patterns), SIMILARITY_BLOCK_ROWS):
+            stop = min(start + SIMILARITY_BLOCK_ROWS, len(self.patterns))
+            block = None
+            for row in range(start, stop):
+                if row not in first_rows:
+                    continue
+                if block is None:
+                    block = self.similarity_rows(start, stop)
+                results[first_rows[row]] = [
+                    {'id': self.patterns[other].get('id'), 'similarity': similarity}
+                    for other, similarity in self._similar_rows(row, block[row - start], top_n)]
+        return results
 
     def calculate_pattern_similarity(self, pattern1, pattern2):
         """Calculate similarity between two patterns"""
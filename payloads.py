@@ -0,0 +1,66 @@
+# payloads.py
+"""Smaller response shapes: normalized combinations and field projection.
+
+Combination payloads embed the full pattern and herb records in every
+combination, so a popular pattern is serialized once per herb it is paired
+with. normalize_combinations() replaces them with pattern_id / herb_id and
+side-loads each distinct record once, keyed by id:
+
+    {..., 'patterns': {id: pattern}, 'herbs': {id: herb}}
+
+A payload that is a plain list becomes {'combinations': [...], 'patterns': ..., 'herbs': ...}.
+Records are keyed by id, so if two records share an id only the first is sent.
+"""
+
+SHAPES = ('full', 'normalized')
+
+
+def normalize_combinations(payload):
+    """payload with every combination's 'pattern'/'herb' records moved to shared lookups"""
+    patterns, herbs = {}, {}
+
+    def strip(value):
+        if isinstance(value, dict):
+            pattern, herb = value.get('pattern'), value.get('herb')
+            if isinstance(pattern, dict) and isinstance(herb, dict):
+                patterns.setdefault(pattern.get('id'), pattern)
+                herbs.setdefault(herb.get('id'), herb)
+                slim = {'pattern_id': pattern.get('id'), 'herb_id': herb.get('id')}
+                slim.update((key, strip(item)) for key, item in value.items() if key not in ('pattern', 'herb'))
+                return slim
+            return {key: strip(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [strip(item) for item in value]
+        return value
+
+    body = strip(payload)
+    if not isinstance(body, dict):
+        body = {'combinations': body}
+    body['patterns'] = patterns
+    body['herbs'] = herbs
+    return body
+
+
+def record_fields(records):
+    """Every top-level key used by at least one record, in first-seen order"""
+    fields = {}
+    for record in records:
+        fields.update(dict.fromkeys(record))
+    return tuple(fields)
+
+
+def parse_fields(raw, known):
+    """?fields=a,b,c as a tuple of known field names, or None if absent.
+
+    Fields come back in the order of known, so every spelling of the same set
+    (?fields=a,b, ?fields=b,a,a) gives one tuple and one cache entry.
+    """
+    if raw is None:
+        return None
+    requested = {field.strip() for field in raw.split(',')}
+    return tuple(field for field in known if field in requested)
+
+
+def project(records, fields):
+    """Copies of records holding only the given fields (missing fields stay missing)"""
+    return [{field: record[field] for field in fields if field in record} for record in records]
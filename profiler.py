@@ -0,0 +1,79 @@
+# profiler.py
+"""Opt-in cProfile capture of single requests, safe to leave enabled in production.
+
+Profiling is off unless the PROFILE_TOKEN environment variable is set. A
+request whose X-Profile header carries that token is profiled, at most once per
+min_interval seconds per process. Other requests pay one header lookup. The
+stats go to cache/profiles/<id>.prof (open them with pstats or snakeviz), and
+the id is returned in the X-Profile-Id response header.
+
+Only the view and its hooks are profiled, not the body of streamed responses.
+"""
+import cProfile
+import hmac
+import os
+import threading
+import time
+import uuid
+
+from flask import g, request
+
+from metrics import PROFILES
+
+PROFILE_DIR = os.path.join('cache', 'profiles')
+HEADER = 'X-Profile'
+
+
+class RequestProfiler:
+    def __init__(self, token, directory=PROFILE_DIR, min_interval=60.0):
+        self.token = token or None
+        self.directory = directory
+        self.min_interval = min_interval
+        self._last_capture = None
+        self._lock = threading.Lock()
+
+    def _allowed(self):
+        """Token check and rate limit; records the outcome"""
+        supplied = request.headers.get(HEADER)
+        if supplied is None or self.token is None:
+            return False
+        if not hmac.compare_digest(supplied.encode('utf-8'), self.token.encode('utf-8')):
+            PROFILES.inc(outcome='rejected')
+            return False
+        with self._lock:
+            now = time.monotonic()
+            if self._last_capture is not None and now - self._last_capture < self.min_interval:
+                PROFILES.inc(outcome='rate_limited')
+                return False
+            self._last_capture = now
+        return True
+
+    def init_app(self, app):
+        @app.before_request
+        def start_profile():
+            if self._allowed():
+                profile = cProfile.Profile()
+                g.profile = profile
+                profile.enable()
+
+        @app.after_request
+        def save_profile(response):
+            profile = g.pop('profile', None)
+            if profile is not None:
+                profile.disable()
+                profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{request.endpoint or 'unmatched'}-{uuid.uuid4().hex[:8]}"
+                try:
+                    os.makedirs(self.directory, exist_ok=True)
+                    profile.dump_stats(os.path.join(self.directory, f"{profile_id}.prof"))
+                    response.headers['X-Profile-Id'] = profile_id
+                    PROFILES.inc(outcome='captured')
+                except OSError as e:
+                    print(f"Cannot save profile {profile_id}: {e}")
+            return response
+
+        @app.teardown_request
+        def stop_profile(exc):
+            # after_request is skipped when the view raises; never leave the profiler running
+            profile = g.pop('profile', None)
+            if profile is not None:
+                profile.disable()
@@ -0,0 +1,115 @@
+# recommendations.py
+"""Recommendation sets for /api/combinations/recommended, materialized once per data version.
+
+The candidates are the best CANDIDATE_POOL unique pairs of the shared score
+matrix. Each set is picked from them with maximal marginal relevance (MMR).
+Every step takes the candidate with the best
+    MMR_LAMBDA × score / 100 − (1 − MMR_LAMBDA) × its highest similarity to a pick so far.
+Two combinations are as similar as their patterns are
+(PatternMatcher.similarity_*), fully similar when they share the pattern, and
+HERB_SIMILARITY similar when they only share the herb. So one strong pattern
+or herb cannot fill a whole set.
+"""
+import numpy as np
+
+from pattern_matcher import NO_RULE_HITS
+from score_engine import top_k
+
+CANDIDATE_POOL = 300
+MMR_LAMBDA = 0.7
+HERB_SIMILARITY = 0.5
+
+TOP_PICKS = 3
+CULTURAL_MATCHES = 3
+MEANING_MATCHES = 3
+PER_COLOR = 2
+
+
+def mmr_select(relevance, similarity, k, eligible=None, weight=MMR_LAMBDA):
+    """Up to k candidate indices chosen greedily by maximal marginal relevance.
+
+    Ties go to the lower index, so a pool sorted best first keeps score order
+    when nothing is similar.
+    """
+    available = np.ones(len(relevance), dtype=bool) if eligible is None else eligible.copy()
+    closest = np.zeros(len(relevance))
+    selected = []
+    while len(selected) < k and available.any():
+        gain = np.where(available, weight * relevance - (1 - weight) * closest, -np.inf)
+        best = int(np.argmax(gain))
+        selected.append(best)
+        available[best] = False
+        closest = np.maximum(closest, similarity[best])
+    return selected
+
+
+def combination_similarity(matcher, pattern_rows, herb_cols):
+    """Pairwise similarity (0-1) of the candidate combinations"""
+    distinct_rows, pattern_slot = np.unique(pattern_rows, return_inverse=True)
+    scores = np.asarray(matcher.similarity_subset(distinct_rows), dtype=np.float64) / 100
+    # The pattern similarity is normalized by the first pattern's sets; use the larger direction
+    scores = np.maximum(scores, scores.T)
+    similarity = scores[np.ix_(pattern_slot, pattern_slot)]
+    similarity[pattern_rows[:, None] == pattern_rows[None, :]] = 1.0
+    same_herb = herb_cols[:, None] == herb_cols[None, :]
+    return np.maximum(similarity, HERB_SIMILARITY * same_herb)
+
+
+def build_recommendations(matcher):
+    """{'top_picks', 'cultural_matches', 'color_matches', 'meaning_matches'} lists of combinations"""
+    scores = matcher.score_matrix()
+    herb_count = len(matcher.herbs)
+    flat = top_k(scores, CANDIDATE_POOL, mask=matcher.score_engine.unique_pair_mask())
+    pattern_rows, herb_cols = np.divmod(flat, max(herb_count, 1))
+    pool_scores = np.asarray(scores[pattern_rows, herb_cols], dtype=np.int64)
+
+    recommendations = {'top_picks': [], 'cultural_matches': [], 'color_matches': [], 'meaning_matches': []}
+    if len(flat) == 0:
+        return recommendations
+
+    relevance = pool_scores / 100
+    similarity = combination_similarity(matcher, pattern_rows, herb_cols)
+
+    # Rule hits per candidate, from the same rules that produced the scores
+    cultural = np.zeros(len(flat), dtype=bool)
+    meaning = np.zeros(len(flat), dtype=bool)
+    main_colors = []
+    for i, (row, col) in enumerate(zip(pattern_rows.tolist(), herb_cols.tolist())):
+        pattern, herb = matcher.patterns[row], matcher.herbs[col]
+        features = matcher.pattern_features(pattern)
+        hits = matcher.rule_index.get(herb.get('name', ''), NO_RULE_HITS)
+        cultural[i] = features.culture in hits.cultures
+        meaning[i] = bool(features.meanings & hits.meanings)
+        colors = pattern.get('colors', [])
+        main_colors.append(colors[0] if colors else None)
+
+    combinations = {}
+
+    def combination(i):
+        # Sets share the dict (and the story) when they pick the same candidate
+        if i not in combinations:
+            pattern, herb = matcher.patterns[int(pattern_rows[i])], matcher.herbs[int(herb_cols[i])]
+            score = int(pool_scores[i])
+            combinations[i] = {
+                'pattern': pattern,
+                'herb': herb,
+                'score': score,
+                'story': matcher.generate_story(pattern, herb, score),
+                'combination_name': f"{pattern['name']}·{herb['name']} Series",
+                'combination_id': f"{pattern.get('id', '')}_{herb.get('id', '')}"
+            }
+        return combinations[i]
+
+    recommendations['top_picks'] = [combination(i) for i in mmr_select(relevance, similarity, TOP_PICKS)]
+    recommendations['cultural_matches'] = [
+        combination(i) for i in mmr_select(relevance, similarity, CULTURAL_MATCHES, eligible=cultural)]
+    recommendations['meaning_matches'] = [
+        combination(i) for i in mmr_select(relevance, similarity, MEANING_MATCHES, eligible=meaning)]
+
+    # Color themes by the pattern's main color, best-scoring theme first
+    main_colors = np.array(main_colors, dtype=object)
+    for color in dict.fromkeys(c for c in main_colors if c is not None):
+        picks = mmr_select(relevance, similarity, PER_COLOR, eligible=main_colors == color)
+        recommendations['color_matches'].extend(combination(i) for i in picks)
+
+    return recommendations
@@ -0,0 +1,198 @@
+# sampler.py
+"""Score-weighted random combinations in O(1) per draw.
+
+Scores are whole numbers from 0 to 100, so the pattern × herb space is grouped
+once per snapshot into levels of (pattern culture, score). Each level is a
+contiguous slice of the flat pair indices with that culture and score. A draw
+then takes two steps:
+1. pick a level from a Walker alias table whose weights are
+   level size × (score / best score) ** (1 / temperature);
+2. pick a pair uniformly inside that level.
+Every pair is therefore drawn in proportion to its own weight. The alias table
+has at most (cultures × 101) entries. Neither step depends on how many patterns
+or herbs the catalog holds.
+"""
+import base64
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+SCORE_LEVELS = 101  # scores are clipped to 0..100
+
+# Temperatures below this would turn every weight but the best into 0.0
+MIN_TEMPERATURE = 0.01
+# Pairs a ?session= token remembers; keeps the token (in the query string) well under 1 KB
+SESSION_MAX_PAIRS = 200
+
+
+class AliasTable:
+    """Walker's alias method (Vose's construction): O(n) to build, O(1) per draw"""
+
+    def __init__(self, weights):
+        n = len(weights)
+        total = float(sum(weights))
+        if n == 0 or total <= 0:
+            raise ValueError('alias table needs at least one positive weight')
+
+        scaled = [w * n / total for w in weights]
+        self.prob = [1.0] * n
+        self.alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.prob[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] += scaled[less] - 1.0
+            (small if scaled[more] < 1.0 else large).append(more)
+        # Whatever is left is 1.0 up to rounding error
+
+    def __len__(self):
+        return len(self.prob)
+
+    def draw(self, rng):
+        column = rng.randrange(len(self.prob))
+        return column if rng.random() < self.prob[column] else self.alias[column]
+
+
+class CombinationSampler:
+    """Pairs grouped by (culture, score), with alias tables per filter setting.
+
+    Built once per snapshot from the score matrix; read-only afterwards apart
+    from the small table cache.
+    """
+
+    def __init__(self, scores, unique_pairs, pattern_cultures, max_tables=64):
+        patterns, herbs = scores.shape
+        self.herb_count = herbs
+        self.cultures = list(dict.fromkeys(pattern_cultures))
+        culture_index = {culture: i for i, culture in enumerate(self.cultures)}
+        culture_codes = np.array([culture_index[c] for c in pattern_cultures], dtype=np.int32)
+
+        # Duplicate id pairs are never drawn, as in the ranked listings
+        flat = np.flatnonzero(np.asarray(unique_pairs).ravel())
+        flat_scores = np.clip(np.asarray(scores).ravel()[flat], 0, SCORE_LEVELS - 1).astype(np.int32)
+        keys = culture_codes[flat // max(herbs, 1)] * SCORE_LEVELS + flat_scores
+
+        index_type = np.int32 if patterns * herbs < 2 ** 31 else np.int64
+        self.pairs = flat[np.argsort(keys, kind='stable')].astype(index_type)
+        counts = np.bincount(keys, minlength=len(self.cultures) * SCORE_LEVELS)
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+
+        # (culture, score, start, size) for every non-empty level
+        self.levels = [(self.cultures[key // SCORE_LEVELS], key % SCORE_LEVELS, int(offsets[key]), int(counts[key]))
+                       for key in np.flatnonzero(counts).tolist()]
+
+        self.max_tables = max_tables
+        self._tables = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_matcher(cls, matcher):
+        return cls(matcher.score_matrix(), matcher.score_engine.unique_pair_mask(),
+                   [p.get('culture') for p in matcher.patterns])
+
+    def table(self, temperature=1.0, min_score=0, culture=None):
+        """(AliasTable, levels, pool size) for one filter setting, or None if nothing qualifies"""
+        temperature = max(round(float(temperature), 2), MIN_TEMPERATURE)
+        key = (temperature, int(min_score), culture)
+        with self._lock:
+            if key in self._tables:
+                self._tables.move_to_end(key)
+                return self._tables[key]
+
+        levels = [level for level in self.levels
+                  if level[1] >= min_score and (culture is None or level[0] == culture)]
+        entry = None
+        if levels:
+            # Relative to the best score in the pool, so low temperatures cannot underflow to all zeros
+            best = max(max(level[1] for level in levels), 1)
+            weights = [size * (max(score, 1) / best) ** (1.0 / temperature) for _, score, _, size in levels]
+            if sum(weights) > 0:
+                entry = (AliasTable(weights), levels, sum(level[3] for level in levels))
+
+        with self._lock:
+            self._tables[key] = entry
+            while len(self._tables) > self.max_tables:
+                self._tables.popitem(last=False)
+        return entry
+
+    def sample(self, count, rng, temperature=1.0, min_score=0, culture=None, exclude=()):
+        """Up to count distinct (pattern_index, herb_index, score) draws, skipping flat indices in exclude.
+
+        Repeats are rejected and redrawn, which stays O(1) per draw while the
+        excluded pairs are a small part of the pool. Fewer than count results
+        come back only when the pool is (nearly) used up.
+        """
+        entry = self.table(temperature, min_score, culture)
+        if entry is None or count <= 0:
+            return []
+        alias, levels, pool_size = entry
+
+        drawn = set()
+        results = []
+        attempts = 0
+        max_attempts = 32 * count + 64
+        while len(results) < min(count, pool_size) and attempts < max_attempts:
+            attempts += 1
+            _, score, start, size = levels[alias.draw(rng)]
+            flat_index = int(self.pairs[start + rng.randrange(size)])
+            if flat_index in drawn or flat_index in exclude:
+                continue
+            drawn.add(flat_index)
+            pattern_index, herb_index = divmod(flat_index, self.herb_count)
+            results.append((pattern_index, herb_index, score))
+        return results
+
+
+def _zigzag(value):
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def encode_session(version, flat_indices):
+    """Opaque ?session= token: the data version plus the last SESSION_MAX_PAIRS pairs served.
+
+    The history travels with the client rather than living in one worker's
+    memory, so it holds whichever worker serves the next request. Pairs are
+    stored as varint deltas, about 3 bytes each for a million-pair space.
+    """
+    data = bytearray()
+    previous = 0
+    for flat_index in flat_indices[-SESSION_MAX_PAIRS:]:
+        value = _zigzag(flat_index - previous)
+        previous = flat_index
+        while value >= 0x80:
+            data.append(value & 0x7f | 0x80)
+            value >>= 7
+        data.append(value)
+    raw = version.encode('utf-8') + b'.' + bytes(data)
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_session(token, version):
+    """Flat pair indices a session token holds; [] if it is malformed or from another data version"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+    except (ValueError, TypeError):
+        return []
+    token_version, _, data = raw.partition(b'.')
+    if token_version != version.encode('utf-8'):
+        return []  # pair indices mean nothing in another data version
+
+    flat_indices, previous, value, shift = [], 0, 0, 0
+    for byte in data:
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        if byte & 0x80:
+            if shift > 63:
+                return []
+            continue
+        previous += value // 2 if value % 2 == 0 else -(value + 1) // 2
+        if previous < 0:
+            return []
+        flat_indices.append(previous)
+        value, shift = 0, 0
+        if len(flat_indices) > SESSION_MAX_PAIRS:
+            return []
+    return flat_indices if shift == 0 else []
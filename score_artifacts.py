@@ -0,0 +1,165 @@
+# score_artifacts.py
+"""Offline pattern × herb score matrix, computed across a process pool.
+
+The matrix is written as artifacts/scores-<version>.npy with a JSON manifest
+of pattern and herb ids. The app memory-maps a matching artifact at startup
+instead of scoring inside a worker, so N workers share one copy through the
+page cache.
+
+    python score_artifacts.py                    # build for the current data
+    python score_artifacts.py --workers 8
+    python score_artifacts.py --benchmark        # time 1, 2, 4, ... workers
+    python score_artifacts.py --benchmark --repeat 2000   # ... on a catalog tiled 2000×
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from catalog import Catalog, load_herbs, load_patterns, load_products
+from pattern_matcher import MATCHING_RULES
+from score_engine import ScoreEngine, score_version
+
+ARTIFACT_DIR = 'artifacts'
+SHARD_ROWS = 4096
+
+_worker_state = {}
+
+
+def artifact_paths(version, directory=ARTIFACT_DIR):
+    return (os.path.join(directory, f"scores-{version}.npy"),
+            os.path.join(directory, f"scores-{version}.json"))
+
+
+def _init_worker(herbs, matching_rules, matrix_path):
+    _worker_state['herbs'] = herbs
+    _worker_state['rules'] = matching_rules
+    _worker_state['matrix'] = np.load(matrix_path, mmap_mode='r+')
+
+
+def _score_shard(task):
+    """Score one shard of patterns and write it straight into the shared output file"""
+    start, patterns = task
+    engine = ScoreEngine(patterns, _worker_state['herbs'], _worker_state['rules'])
+    matrix = _worker_state['matrix']
+    matrix[start:start + len(patterns)] = engine.score_matrix()
+    matrix.flush()
+    return len(patterns)
+
+
+def compute_scores(patterns, herbs, matching_rules, output_path, workers):
+    """Write the full int16 score matrix to output_path using a process pool"""
+    matrix = np.lib.format.open_memmap(output_path, mode='w+', dtype=np.int16,
+                                       shape=(len(patterns), len(herbs)))
+    del matrix  # workers reopen it; the header is already on disk
+
+    tasks = [(start, patterns[start:start + SHARD_ROWS]) for start in range(0, len(patterns), SHARD_ROWS)]
+    if workers <= 1:
+        _init_worker(herbs, matching_rules, output_path)
+        for task in tasks:
+            _score_shard(task)
+        _worker_state.clear()
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(herbs, matching_rules, output_path)) as executor:
+        for _ in executor.map(_score_shard, tasks):
+            pass
+
+
+def build_artifact(catalog, matching_rules=MATCHING_RULES, directory=ARTIFACT_DIR, workers=None):
+    """Compute and publish the artifact for this catalog; returns its version"""
+    version = score_version(catalog.version, matching_rules)
+    matrix_path, manifest_path = artifact_paths(version, directory)
+    os.makedirs(directory, exist_ok=True)
+
+    tmp_path = f"{matrix_path}.{os.getpid()}.tmp.npy"
+    compute_scores(catalog.patterns, catalog.herbs, matching_rules, tmp_path, workers or os.cpu_count())
+    os.replace(tmp_path, matrix_path)
+
+    manifest = {
+        'version': version,
+        'data_version': catalog.version,
+        'shape': [len(catalog.patterns), len(catalog.herbs)],
+        'dtype': 'int16',
+        'pattern_ids': [p.get('id') for p in catalog.patterns],
+        'herb_ids': [h.get('id') for h in catalog.herbs],
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+    # The manifest is written last: its presence means the matrix is complete
+    tmp_manifest = f"{manifest_path}.{os.getpid()}.tmp"
+    with open(tmp_manifest, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp_manifest, manifest_path)
+    return version
+
+
+def load_artifact(catalog, matching_rules=MATCHING_RULES, directory=ARTIFACT_DIR):
+    """Memory-map the artifact for this exact catalog + rules, or return None"""
+    version = score_version(catalog.version, matching_rules)
+    matrix_path, manifest_path = artifact_paths(version, directory)
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        matrix = np.load(matrix_path, mmap_mode='r')
+    except (OSError, ValueError):
+        return None
+
+    if (manifest.get('version') != version
+            or tuple(manifest.get('shape', ())) != matrix.shape
+            or manifest.get('pattern_ids') != [p.get('id') for p in catalog.patterns]
+            or manifest.get('herb_ids') != [h.get('id') for h in catalog.herbs]):
+        print(f"Ignoring score artifact {matrix_path}: it does not match the loaded catalog")
+        return None
+    return matrix
+
+
+def benchmark(catalog, max_workers):
+    """Time the batch scorer at 1, 2, 4, ... workers and print the speedup"""
+    counts = []
+    workers = 1
+    while workers < max_workers:
+        counts.append(workers)
+        workers *= 2
+    counts.append(max_workers)
+
+    print(f"Scoring {len(catalog.patterns)} patterns × {len(catalog.herbs)} herbs")
+    baseline = None
+    with tempfile.TemporaryDirectory() as directory:
+        for workers in counts:
+            path = os.path.join(directory, f"bench-{workers}.npy")
+            start = time.perf_counter()
+            compute_scores(catalog.patterns, catalog.herbs, MATCHING_RULES, path, workers)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(f"  {workers:>3} workers: {elapsed:8.2f}s  speedup {baseline / elapsed:5.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Precompute the pattern × herb score matrix')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--directory', default=ARTIFACT_DIR)
+    parser.add_argument('--benchmark', action='store_true', help='time 1..N workers instead of writing an artifact')
+    parser.add_argument('--repeat', type=int, default=1, help='benchmark only: tile the patterns this many times')
+    args = parser.parse_args()
+
+    catalog = Catalog(load_patterns(True), load_herbs(True), load_products(True))
+    if args.benchmark:
+        if args.repeat > 1:
+            patterns = [dict(p, id=f"{p.get('id')}_{copy}") for copy in range(args.repeat) for p in catalog.patterns]
+            catalog = Catalog(patterns, catalog.herbs)
+        benchmark(catalog, args.workers)
+        return
+
+    start = time.time()
+    version = build_artifact(catalog, directory=args.directory, workers=args.workers)
+    print(f"Wrote {artifact_paths(version, args.directory)[0]} "
+          f"({len(catalog.patterns)}×{len(catalog.herbs)}) in {time.time() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
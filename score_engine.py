@@ -0,0 +1,176 @@
+# score_engine.py
+import hashlib
+import json
+
+import numpy as np
+
+# Bump when the scoring semantics change, so precomputed score artifacts are rebuilt
+SCORE_ENGINE_VERSION = 1
+
+
+class ScoreEngine:
+    """Batched pattern × herb scoring with the same rules as PatternMatcher.calculate_match_score"""
+
+    def __init__(self, patterns, herbs, matching_rules):
+        self.patterns = patterns
+        self.herbs = herbs
+        self.matching_rules = matching_rules
+        self._encode()
+
+    def _encode(self):
+        """Encode patterns and herbs into feature arrays"""
+        rules = self.matching_rules
+        herb_names = [herb.get('name', '') for herb in self.herbs]
+
+        # 1. Culture: one row per rule culture, plus an all-False row for "no rule"
+        cultures = list(rules['cultural'])
+        culture_index = {culture: i for i, culture in enumerate(cultures)}
+        self.herb_culture = np.zeros((len(cultures) + 1, len(self.herbs)), dtype=bool)
+        for culture, names in rules['cultural'].items():
+            self.herb_culture[culture_index[culture]] = [name in names for name in herb_names]
+        self.pattern_culture = np.array(
+            [culture_index.get(p.get('culture', 'chinese'), len(cultures)) for p in self.patterns],
+            dtype=np.intp)
+
+        # 2. Colors: a pattern listing the same color twice scores twice
+        colors = list(rules['color_themes'])
+        color_index = {color: i for i, color in enumerate(colors)}
+        self.pattern_colors = np.zeros((len(self.patterns), len(colors)), dtype=np.float32)
+        for row, pattern in enumerate(self.patterns):
+            for color in pattern.get('colors', []):
+                if color in color_index:
+                    self.pattern_colors[row, color_index[color]] += 1
+        self.herb_colors = np.array(
+            [[name in names for name in herb_names] for names in rules['color_themes'].values()],
+            dtype=np.float32).reshape(len(colors), len(self.herbs))
+
+        # 3. Meaning keywords (substring match on the pattern meaning)
+        keywords = list(rules['meaning_matches'])
+        self.pattern_meanings = np.array(
+            [[keyword in p.get('meaning', '') for keyword in keywords] for p in self.patterns],
+            dtype=np.float32).reshape(len(self.patterns), len(keywords))
+        self.herb_meanings = np.array(
+            [[name in names for name in herb_names] for names in rules['meaning_matches'].values()],
+            dtype=np.float32).reshape(len(keywords), len(self.herbs))
+
+        # 4. Tags: only tags carried by at least one herb can ever overlap
+        tag_index = {}
+        for herb in self.herbs:
+            for tag in herb.get('tags', []):
+                tag_index.setdefault(tag, len(tag_index))
+        self.herb_tags = np.zeros((len(tag_index), len(self.herbs)), dtype=np.float32)
+        for col, herb in enumerate(self.herbs):
+            for tag in set(herb.get('tags', [])):
+                self.herb_tags[tag_index[tag], col] = 1
+        self.pattern_tags = np.zeros((len(self.patterns), len(tag_index)), dtype=np.float32)
+        for row, pattern in enumerate(self.patterns):
+            for tag in set(pattern.get('style_tags', [])):
+                if tag in tag_index:
+                    self.pattern_tags[row, tag_index[tag]] = 1
+
+    @property
+    def shape(self):
+        return len(self.patterns), len(self.herbs)
+
+    def score_block(self, start=0, stop=None):
+        """Score patterns[start:stop] against every herb, returns an int16 matrix"""
+        rows = slice(start, stop)
+        scores = np.where(self.herb_culture[self.pattern_culture[rows]], 30, 10).astype(np.float32)
+        scores += 20 * (self.pattern_colors[rows] @ self.herb_colors)
+        scores += 25 * (self.pattern_meanings[rows] @ self.herb_meanings)
+        scores += 5 * (self.pattern_tags[rows] @ self.herb_tags)
+        return np.minimum(scores, 100).astype(np.int16)
+
+    def score_matrix(self):
+        """Score every pattern against every herb in one batched pass"""
+        return self.score_block()
+
+    def unique_axes(self):
+        """(pattern rows, herb columns) that are the first occurrence of their id"""
+        return (first_occurrences([p.get('id', '') for p in self.patterns]),
+                first_occurrences([h.get('id', '') for h in self.herbs]))
+
+    def unique_pair_mask(self):
+        """Mask of pattern/herb pairs whose id combination has not been seen earlier"""
+        unique_rows, unique_cols = self.unique_axes()
+        return unique_rows[:, None] & unique_cols[None, :]
+
+
+def score_version(data_version, matching_rules):
+    """Identifies a score matrix: the catalog data, the matching rules and the engine"""
+    raw = json.dumps([SCORE_ENGINE_VERSION, data_version, matching_rules], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+
+def first_occurrences(values):
+    """Boolean array marking the first occurrence of each value"""
+    seen = set()
+    mask = np.zeros(len(values), dtype=bool)
+    for i, value in enumerate(values):
+        if value not in seen:
+            seen.add(value)
+            mask[i] = True
+    return mask
+
+
+def top_k(scores, k, mask=None):
+    """Flat indices of the k best scores, ordered like a stable descending sort"""
+    flat = scores.ravel().astype(np.int32)
+    if mask is not None:
+        flat = np.where(mask.ravel(), flat, -1)
+    if k is None or k >= flat.size:
+        candidates = np.arange(flat.size)
+    elif k <= 0:
+        return np.empty(0, dtype=np.intp)
+    else:
+        # argpartition finds the k-th best score; ties at that score keep catalog order
+        kth = flat[np.argpartition(-flat, k - 1)[k - 1]]
+        above = np.flatnonzero(flat > kth)
+        ties = np.flatnonzero(flat == kth)[:k - len(above)]
+        candidates = np.concatenate([above, ties])
+    candidates = candidates[flat[candidates] >= 0]
+    return candidates[np.lexsort((candidates, -flat[candidates]))]
+
+
+def iter_ranked(score_block, shape, unique_rows, unique_cols, min_score=0, row_mask=None, after=None,
+                block_rows=None):
+    """Yield (pattern_index, herb_index, score) best first, in the same order as top_k.
+
+    score_block(start, stop) returns the scores of a block of pattern rows. The
+    ranking is produced one score level at a time, re-reading the rows in
+    blocks, so memory stays bounded by the block size rather than P×H.
+    after=(score, flat_index) resumes right after that position.
+    """
+    patterns, herbs = shape
+    if patterns == 0 or herbs == 0:
+        return
+    block_rows = block_rows or max(1, 65536 // herbs)
+    valid_rows = unique_rows if row_mask is None else unique_rows & row_mask
+
+    def blocks():
+        for start in range(0, patterns, block_rows):
+            stop = min(start + block_rows, patterns)
+            rows = valid_rows[start:stop]
+            if not rows.any():
+                continue
+            scores = np.asarray(score_block(start, stop), dtype=np.int32)
+            # Drop duplicate id pairs and filtered rows
+            scores = np.where(rows[:, None] & unique_cols[None, :], scores, -1)
+            yield start, scores
+
+    # First pass: which score levels exist at all
+    levels = set()
+    for _, scores in blocks():
+        levels.update(np.unique(scores).tolist())
+    levels = sorted((level for level in levels if level >= max(min_score, 0)), reverse=True)
+    if after is not None:
+        levels = [level for level in levels if level <= after[0]]
+
+    for level in levels:
+        for start, scores in blocks():
+            flat = np.flatnonzero(scores == level) + start * herbs
+            if after is not None and level == after[0]:
+                flat = flat[flat > after[1]]
+            for flat_index in flat.tolist():
+                pattern_index, herb_index = divmod(flat_index, herbs)
+                yield pattern_index, herb_index, level
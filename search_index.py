@@ -0,0 +1,145 @@
+# search_index.py
+import bisect
+import os
+import re
+from collections import defaultdict
+
+# Relevance weight of a hit in each searchable field
+FIELD_WEIGHTS = {
+    'name': 3.0,
+    'image': 3.0,  # image file names carry the Chinese pattern names, e.g. 忍冬纹_page-0001.jpg
+    'style_tags': 2.0,
+    'elements': 2.0,
+    'meaning': 1.5,
+    'description': 1.0
+}
+
+# A prefix hit ("honey" -> "honeysuckle") counts less than a whole-word hit
+PREFIX_WEIGHT = 0.5
+
+_WORD_RE = re.compile(r'[0-9a-z]+')
+_CJK_RE = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+')
+_PAGE_SUFFIX_RE = re.compile(r'_page-\d+$')
+
+
+def tokenize(text):
+    """Lowercased word tokens, plus CJK character unigrams and bigrams"""
+    text = str(text).lower()
+    tokens = _WORD_RE.findall(text)
+    for run in _CJK_RE.findall(text):
+        tokens.extend(run)
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def query_terms(text):
+    """Terms a document must all contain to match a query"""
+    text = str(text).lower()
+    terms = [(word, True) for word in _WORD_RE.findall(text)]
+    for run in _CJK_RE.findall(text):
+        if len(run) == 1:
+            terms.append((run, False))
+        else:
+            terms.extend((run[i:i + 2], False) for i in range(len(run) - 1))
+    return terms
+
+
+def _field_values(pattern, field):
+    value = pattern.get(field)
+    if not value:
+        return []
+    if field == 'image':
+        return [_PAGE_SUFFIX_RE.sub('', os.path.splitext(value)[0])]
+    if isinstance(value, (list, tuple)):
+        return value
+    return [value]
+
+
+class SearchIndex:
+    """Inverted index over pattern text fields, built once when the catalog loads"""
+
+    def __init__(self, patterns):
+        self.patterns = patterns
+        self.postings = defaultdict(dict)  # term -> {doc: weight}
+        self.culture_postings = defaultdict(list)  # culture -> [doc, ...] in catalog order
+        self.field_texts = []  # doc -> [(weight, lowercased value)] for the substring fallback
+
+        for doc, pattern in enumerate(patterns):
+            self.culture_postings[pattern.get('culture')].append(doc)
+            texts = []
+            self.field_texts.append(texts)
+            for field, weight in FIELD_WEIGHTS.items():
+                for value in _field_values(pattern, field):
+                    texts.append((weight, str(value).lower()))
+                    for term in tokenize(value):
+                        postings = self.postings[term]
+                        postings[doc] = postings.get(doc, 0.0) + weight
+
+        self.postings = dict(self.postings)
+        self.culture_postings = {c: frozenset(docs) for c, docs in self.culture_postings.items()}
+        # Sorted vocabulary of word terms for prefix expansion
+        self.vocabulary = sorted(term for term in self.postings if _WORD_RE.fullmatch(term))
+
+    def _expand(self, word):
+        """Vocabulary terms starting with word"""
+        start = bisect.bisect_left(self.vocabulary, word)
+        end = bisect.bisect_left(self.vocabulary, word + '\uffff')
+        return self.vocabulary[start:end]
+
+    def _term_scores(self, term, is_word):
+        if not is_word:
+            return self.postings.get(term, {})
+        scores = {}
+        for expanded in self._expand(term):
+            factor = 1.0 if expanded == term else PREFIX_WEIGHT
+            for doc, weight in self.postings[expanded].items():
+                scores[doc] = max(scores.get(doc, 0.0), weight * factor)
+        return scores
+
+    def _substring_docs(self, keyword, allowed):
+        """Docs with a field value containing keyword, like the old linear scan; ranked by field weight"""
+        needle = keyword.lower()
+        scores = {}
+        for doc, texts in enumerate(self.field_texts):
+            if allowed is not None and doc not in allowed:
+                continue
+            score = sum(weight for weight, text in texts if needle in text)
+            if score:
+                scores[doc] = score
+        return sorted(scores, key=lambda doc: (-scores[doc], doc))
+
+    def search_docs(self, keyword='', culture=None):
+        """Matching doc numbers ranked by relevance (catalog order when there is no keyword).
+
+        Queries are matched by whole words, word prefixes and CJK bigrams. A
+        query none of those find (an infix like "suckle" in "Honeysuckle", or
+        only punctuation) falls back to a substring scan of the same fields.
+        """
+        allowed = self.culture_postings.get(culture, frozenset()) if culture else None
+        terms = query_terms(keyword) if keyword else []
+
+        if not terms:
+            if keyword and keyword.strip():
+                return self._substring_docs(keyword, allowed)
+            if allowed is None:
+                return list(range(len(self.patterns)))
+            return sorted(allowed)
+
+        scores = None
+        # Intersect the rarest posting lists first
+        for term_scores in sorted((self._term_scores(t, w) for t, w in terms), key=len):
+            if scores is None:
+                scores = {doc: s for doc, s in term_scores.items() if allowed is None or doc in allowed}
+            else:
+                scores = {doc: s + term_scores[doc] for doc, s in scores.items() if doc in term_scores}
+            if not scores:
+                return self._substring_docs(keyword, allowed)
+
+        return sorted(scores, key=lambda doc: (-scores[doc], doc))
+
+    def search(self, keyword='', culture=None, limit=None, offset=0):
+        """Return (page of matching patterns, total match count)"""
+        docs = self.search_docs(keyword, culture)
+        offset = max(offset or 0, 0)
+        page = docs[offset:] if limit is None else docs[offset:offset + max(limit, 0)]
+        return [self.patterns[doc] for doc in page], len(docs)
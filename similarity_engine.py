@@ -0,0 +1,103 @@
+# similarity_engine.py
+import numpy as np
+
+# Rows are computed in blocks so the float64 intermediates stay small
+BLOCK_ROWS = 1024
+# Largest catalog whose full P×P float32 matrix is kept in memory (256 MB); larger ones score rows on demand
+MATRIX_MAX_PATTERNS = 8192
+
+
+def _codes(values):
+    """Integer code per value (None is a value too, matching == semantics)"""
+    index = {}
+    return np.array([index.setdefault(value, len(index)) for value in values], dtype=np.int32)
+
+
+def _membership(records, field):
+    """Boolean record × distinct-value matrix (set semantics) and per-record set sizes"""
+    index = {}
+    for record in records:
+        for value in record.get(field, []):
+            index.setdefault(value, len(index))
+    matrix = np.zeros((len(records), len(index)), dtype=np.float32)
+    for row, record in enumerate(records):
+        for value in record.get(field, []):
+            matrix[row, index[value]] = 1
+    return matrix, matrix.sum(axis=1, dtype=np.float64)
+
+
+class SimilarityEngine:
+    """Full pattern × pattern similarity matrix, same weighting as PatternMatcher.calculate_pattern_similarity"""
+
+    def __init__(self, patterns):
+        self.patterns = patterns
+        self.culture = _codes(p.get('culture') for p in patterns)
+        self.type = _codes(p.get('type') for p in patterns)
+        self.colors, self.color_counts = _membership(patterns, 'colors')
+        self.tags, self.tag_counts = _membership(patterns, 'style_tags')
+        # First row for each id, and id codes so "every pattern with this id" is one comparison
+        self.row_by_id = {}
+        for row, pattern in enumerate(patterns):
+            self.row_by_id.setdefault(pattern.get('id'), row)
+        self.id_codes = _codes(p.get('id') for p in patterns)
+
+    def similarity_block(self, start=0, stop=None):
+        """Similarity scores (0-100) of patterns[start:stop] against every pattern"""
+        return self.similarity_of(slice(start, stop))
+
+    def similarity_of(self, rows):
+        """Similarity scores (0-100) of the given rows (a slice or row indices) against every pattern"""
+        score = 20.0 * (self.culture[rows, None] == self.culture[None, :])
+        score += 20.0 * (self.type[rows, None] == self.type[None, :])
+        # Overlap is measured against the first pattern's set size, like the scalar version
+        color_overlap = (self.colors[rows] @ self.colors.T).astype(np.float64)
+        score += color_overlap / np.maximum(self.color_counts[rows], 1)[:, None] * 30
+        tag_overlap = (self.tags[rows] @ self.tags.T).astype(np.float64)
+        score += tag_overlap / np.maximum(self.tag_counts[rows], 1)[:, None] * 30
+        return np.minimum(score, 100)
+
+    def similarity_subset(self, rows):
+        """Similarity scores (0-100) among the given rows only, len(rows) × len(rows)"""
+        rows = np.asarray(rows, dtype=np.intp)
+        score = 20.0 * (self.culture[rows, None] == self.culture[None, rows])
+        score += 20.0 * (self.type[rows, None] == self.type[None, rows])
+        color_overlap = (self.colors[rows] @ self.colors[rows].T).astype(np.float64)
+        score += color_overlap / np.maximum(self.color_counts[rows], 1)[:, None] * 30
+        tag_overlap = (self.tags[rows] @ self.tags[rows].T).astype(np.float64)
+        score += tag_overlap / np.maximum(self.tag_counts[rows], 1)[:, None] * 30
+        return np.minimum(score, 100)
+
+    def similarity_matrix(self):
+        """Precompute the whole score matrix (float32, 0-100) in one vectorized pass over row blocks.
+
+        Scores rather than 0-1 similarities are stored because halves and quarters
+        (e.g. 42.5) are exact in float32, so dividing by 100 later rounds the same
+        way the scalar version does.
+        """
+        count = len(self.patterns)
+        matrix = np.empty((count, count), dtype=np.float32)
+        for start in range(0, count, BLOCK_ROWS):
+            stop = min(start + BLOCK_ROWS, count)
+            matrix[start:stop] = self.similarity_block(start, stop)
+        matrix.setflags(write=False)
+        return matrix
+
+
+def top_similar(scores, exclude, top_n=5, threshold=0.3):
+    """[(index, similarity)] of the top_n entries above threshold.
+
+    Ranked like the scalar version: a stable sort on the similarity rounded to 2 decimals.
+    """
+    similarities = scores.astype(np.float64) / 100
+    candidates = np.flatnonzero((similarities > threshold) & ~exclude)
+    if len(candidates) == 0 or top_n <= 0:
+        return []
+
+    # Narrow down with numpy, then round the survivors exactly as Python's round() does
+    if len(candidates) > top_n:
+        approx = np.round(similarities[candidates], 2)
+        kth = -np.partition(-approx, top_n - 1)[top_n - 1]
+        candidates = candidates[approx >= kth - 0.011]
+    rounded = [round(float(value), 2) for value in similarities[candidates]]
+    ranked = sorted(zip(candidates.tolist(), rounded), key=lambda item: (-item[1], item[0]))
+    return ranked[:top_n]
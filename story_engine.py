@@ -0,0 +1,139 @@
+# story_engine.py
+import threading
+import zlib
+from collections import OrderedDict
+
+# Score tiers: (minimum score, story type, icon, connection phrase)
+STORY_TIERS = {
+    'en': [
+        (70, 'Perfect Match', '✨', 'perfectly complements'),
+        (50, 'Excellent Combination', '👍', 'harmoniously combines with'),
+        (0, 'Innovative Experiment', '💡', 'innovatively fuses with'),
+    ],
+    'zh': [
+        (70, '完美匹配', '✨', '完美契合'),
+        (50, '优秀组合', '👍', '和谐融合'),
+        (0, '创新尝试', '💡', '创新融合'),
+    ],
+}
+
+STORY_VARIANTS = {
+    'en': [
+        "{intro} The 「{{pattern_name}}」 pattern {connection} {{herb_name}}, "
+        "embodying the cultural significance of {{pattern_meaning}}, "
+        "while integrating the health benefits of {{herb_name}} ({{herb_effect}}), "
+        "infusing traditional wisdom into modern design.",
+
+        "{intro} The {{pattern_meaning}} symbolism of {{pattern_name}} "
+        "and the {{herb_effect}} properties of {{herb_name}} complement each other, "
+        "creating culturally rich and practical design products.",
+
+        "{intro} Merging the visual aesthetics of {{pattern_name}} "
+        "with the natural attributes of {{herb_name}} "
+        "forms a unique cultural IP suitable for home decor, fashion, and other fields."
+    ],
+    'zh': [
+        "{intro}「{{pattern_name}}」纹样与{{herb_name}}{connection}，"
+        "既承载了{{pattern_meaning}}的文化寓意，"
+        "又融入了{{herb_name}}（{{herb_effect}}）的养生功效，"
+        "让传统智慧走进现代设计。",
+
+        "{intro}{{pattern_name}}的{{pattern_meaning}}寓意"
+        "与{{herb_name}}的{{herb_effect}}功效相得益彰，"
+        "打造兼具文化内涵与实用价值的设计产品。",
+
+        "{intro}将{{pattern_name}}的视觉美感"
+        "与{{herb_name}}的自然属性相融合，"
+        "形成适用于家居、服饰等领域的独特文化IP。"
+    ],
+}
+
+
+class StoryEngine:
+    """Render combination stories from precompiled templates, with a bounded LRU cache"""
+
+    def __init__(self, maxsize=4096, default_language='en'):
+        self.maxsize = maxsize
+        self.default_language = default_language
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Precompile: bake tier intro/connection into each variant, leaving only the record fields
+        self._templates = {}
+        for language, tiers in STORY_TIERS.items():
+            self._templates[language] = [
+                (min_score, [variant.format(intro=f"{icon}【{story_type}】", connection=connection)
+                             for variant in STORY_VARIANTS[language]])
+                for min_score, story_type, icon, connection in tiers
+            ]
+
+    def _tier(self, language, score):
+        for index, (min_score, _) in enumerate(self._templates[language]):
+            if score >= min_score:
+                return index
+        return len(self._templates[language]) - 1
+
+    @staticmethod
+    def variant_index(pattern_id, herb_id, language, count):
+        """Deterministic variant choice for a (pattern, herb, language) triple"""
+        return zlib.crc32(f"{pattern_id}|{herb_id}|{language}".encode('utf-8')) % count
+
+    def render(self, pattern, herb, score, language=None, cache=True):
+        """Render the story for an already-scored pattern + herb combination.
+
+        cache=False skips the LRU, for bulk exports that would only evict hot entries.
+        """
+        if language not in self._templates:
+            language = self.default_language
+        pattern_id = pattern.get('id', '')
+        herb_id = herb.get('id', '')
+        tier = self._tier(language, score)
+        key = (pattern_id, herb_id, language, tier)
+
+        if not cache:
+            return self._format(pattern, herb, language, tier)
+
+        with self._lock:
+            story = self._cache.get(key)
+            if story is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return story
+            self.misses += 1
+
+        story = self._format(pattern, herb, language, tier)
+
+        with self._lock:
+            self._cache[key] = story
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return story
+
+    def _format(self, pattern, herb, language, tier):
+        variants = self._templates[language][tier][1]
+        template = variants[self.variant_index(pattern.get('id', ''), herb.get('id', ''), language, len(variants))]
+        return template.format(
+            pattern_name=pattern.get('name', ''),
+            herb_name=herb.get('name', ''),
+            pattern_meaning=pattern.get('meaning', ''),
+            herb_effect=herb.get('effect', '')
+        )
+
+    def cache_info(self):
+        """Hit/miss counters and current cache size"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'maxsize': self.maxsize,
+                'currsize': len(self._cache)
+            }
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
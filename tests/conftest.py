@@ -0,0 +1,24 @@
+# tests/conftest.py
+"""The app modules are top-level and read data/ and cache/ relative to the working directory."""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope='session', autouse=True)
+def repo_root():
+    cwd = os.getcwd()
+    os.chdir(ROOT)
+    yield
+    os.chdir(cwd)
+
+
+@pytest.fixture(scope='session')
+def client(repo_root):
+    from app import app
+    app.config['TESTING'] = True
+    return app.test_client()
@@ -0,0 +1,37 @@
+# tests/synthetic_data.py
+"""Seeded synthetic catalogs for the equivalence tests."""
+import random
+
+from pattern_matcher import MATCHING_RULES
+
+
+def synthetic_catalog(pattern_count=120, herb_count=30, seed=7):
+    """Records using the rule vocabulary, with duplicate ids, repeated colors and missing fields"""
+    rng = random.Random(seed)
+    herb_names = sorted({name for section in MATCHING_RULES.values() for names in section.values() for name in names})
+    colors = list(MATCHING_RULES['color_themes']) + ['Black', 'Brown']
+    meanings = list(MATCHING_RULES['meaning_matches']) + ['Longevity']
+    tags = ['floral', 'geometric', 'classic', 'modern', 'bold']
+
+    patterns = []
+    for i in range(pattern_count):
+        pattern = {
+            'id': f"pattern_{i % (pattern_count - 10)}",  # the last ten ids repeat earlier ones
+            'name': f"Pattern {i}",
+            'type': rng.choice(['floral', 'animal', 'geometric']),
+            'colors': rng.sample(colors, rng.randint(0, 3)) + rng.sample(colors, rng.randint(0, 1)),
+            'meaning': ' and '.join(rng.sample(meanings, rng.randint(0, 2))),
+            'style_tags': rng.sample(tags, rng.randint(0, 3)),
+        }
+        if rng.random() < 0.9:
+            pattern['culture'] = rng.choice(['chinese', 'muslim', 'indonesian'])
+        patterns.append(pattern)
+
+    herbs = []
+    for i in range(herb_count):
+        herb = {'id': f"herb_{i % (herb_count - 3)}", 'name': rng.choice(herb_names + ['Unknown Herb']),
+                'tags': rng.sample(tags, rng.randint(0, 2))}
+        if rng.random() < 0.9:
+            herb['category'] = rng.choice(['root', 'flower', 'leaf'])
+        herbs.append(herb)
+    return patterns, herbs
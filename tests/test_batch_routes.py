@@ -0,0 +1,73 @@
+# tests/test_batch_routes.py
+"""The batch routes against the single-item routes they batch."""
+import pytest
+
+
+@pytest.fixture(scope='module')
+def ids(client):
+    from app import catalog
+    return [p['id'] for p in catalog.patterns], [h['id'] for h in catalog.herbs]
+
+
+def test_combine_batch_matches_combine_story(client, ids):
+    pattern_ids, herb_ids = ids
+    pairs = [{'pattern_id': p, 'herb_id': h} for p in pattern_ids[:6] for h in herb_ids[:4]]
+    batch = client.post('/api/combine/batch', json={'pairs': pairs, 'language': 'zh'}).get_json()
+    assert batch['count'] == len(pairs) and batch['errors'] == 0
+    for pair, result in zip(pairs, batch['results']):
+        single = client.post('/api/combine/story', json=dict(pair, language='zh')).get_json()
+        assert result['match_score'] == single['match_score']
+        assert result['story'] == single['story']
+        assert result['combination_name'] == single['combination_name']
+        assert batch['patterns'][pair['pattern_id']] == single['pattern']
+        assert batch['herbs'][pair['herb_id']] == single['herb']
+
+
+def test_combine_batch_inline_errors(client, ids):
+    pattern_ids, herb_ids = ids
+    pairs = [{'pattern_id': pattern_ids[0], 'herb_id': herb_ids[0]},
+             {'pattern_id': 'missing', 'herb_id': herb_ids[0]},
+             {'pattern_id': pattern_ids[0], 'herb_id': 'missing'},
+             {'pattern_id': pattern_ids[0]},
+             {'pattern_id': ['unhashable'], 'herb_id': herb_ids[0]},
+             'not a pair']
+    response = client.post('/api/combine/batch', json={'pairs': pairs, 'stories': False})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['errors'] == 5
+    assert 'match_score' in body['results'][0] and 'story' not in body['results'][0]
+    assert [result.get('error') for result in body['results'][1:]] == [
+        'Pattern not found', 'Herbal medicine not found', 'pattern_id and herb_id are required',
+        'Pattern not found', 'Each pair must be an object with pattern_id and herb_id']
+
+
+def test_match_patterns_batch_matches_single(client, ids):
+    pattern_ids, _ = ids
+    batch = client.post('/api/match/patterns', json={'pattern_ids': pattern_ids + ['missing']}).get_json()
+    assert batch['errors'] == 1 and batch['results'][-1] == {'pattern_id': 'missing', 'error': 'Pattern not found'}
+    for pattern_id, result in zip(pattern_ids, batch['results']):
+        single = client.post('/api/match/patterns', json={'pattern_id': pattern_id}).get_json()
+        assert result['similar'] == [{'id': p['id'], 'similarity': p['similarity']} for p in single]
+        for match in result['similar']:
+            assert batch['patterns'][match['id']]['id'] == match['id']
+
+
+@pytest.mark.parametrize('body', [
+    {'pattern_ids': []},
+    {'pattern_ids': 'pattern_1'},
+    {'pattern_ids': ['pattern_1'], 'top_n': None},
+    {'pattern_ids': ['pattern_1'], 'top_n': 'abc'},
+    {'pattern_ids': ['pattern_1'], 'top_n': 2.5},
+    {'pattern_ids': ['pattern_1'], 'top_n': True},
+])
+def test_match_patterns_batch_rejects_bad_input(client, body):
+    response = client.post('/api/match/patterns', json=body)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+@pytest.mark.parametrize('body', [{}, {'pairs': []}, {'pairs': {'pattern_id': 'x'}}])
+def test_combine_batch_rejects_bad_input(client, body):
+    response = client.post('/api/combine/batch', json=body)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
@@ -0,0 +1,76 @@
+# tests/test_batch_scoring.py
+"""The batch routes read scores and similarities from the vectorized engines;
+these check them against the scalar PatternMatcher methods they replace."""
+import random
+
+import pytest
+
+import pattern_matcher
+from catalog import load_herbs, load_patterns
+from synthetic_data import synthetic_catalog
+from pattern_matcher import PatternMatcher
+
+
+@pytest.fixture(params=['synthetic', 'data'])
+def matcher(request):
+    patterns, herbs = synthetic_catalog() if request.param == 'synthetic' else (load_patterns(), load_herbs())
+    return PatternMatcher(patterns, herbs)
+
+
+def expected_similar(matcher, pattern_id, top_n):
+    """find_similar_patterns as the scalar loop computed it"""
+    pattern = matcher.patterns[matcher.pattern_rows[pattern_id]]
+    candidates = []
+    for index, other in enumerate(matcher.patterns):
+        if other.get('id') == pattern_id:
+            continue
+        similarity = matcher.calculate_pattern_similarity(pattern, other)
+        if similarity > 0.3:
+            candidates.append((index, round(similarity, 2)))
+    return sorted(candidates, key=lambda item: (-item[1], item[0]))[:top_n]
+
+
+def test_score_pairs_matches_calculate_match_score(matcher):
+    pairs = [(row, col) for row in range(len(matcher.patterns)) for col in range(len(matcher.herbs))]
+    random.Random(1).shuffle(pairs)
+    scores = matcher.score_pairs([row for row, _ in pairs], [col for _, col in pairs]).tolist()
+    assert scores == [matcher.calculate_match_score(matcher.patterns[row], matcher.herbs[col]) for row, col in pairs]
+
+
+def test_score_pairs_by_id_uses_first_occurrence(matcher):
+    # Catalog.get_pattern / get_herb return the first record with an id; the batch route must score that one
+    for pattern_id, row in matcher.pattern_rows.items():
+        assert matcher.patterns[row] is next(p for p in matcher.patterns if p.get('id') == pattern_id)
+    for herb_id, col in matcher.herb_cols.items():
+        assert matcher.herbs[col] is next(h for h in matcher.herbs if h.get('id') == herb_id)
+
+
+def test_score_pairs_empty(matcher):
+    assert matcher.score_pairs([], []).tolist() == []
+
+
+@pytest.mark.parametrize('top_n', [1, 5, 50])
+def test_find_similar_batch_matches_calculate_pattern_similarity(matcher, top_n):
+    pattern_ids = list(matcher.pattern_rows)
+    similar = matcher.find_similar_batch(pattern_ids + ['missing'], top_n)
+    assert 'missing' not in similar
+    for pattern_id in pattern_ids:
+        assert similar[pattern_id] == expected_similar(matcher, pattern_id, top_n)
+
+
+def test_find_similar_batch_without_similarity_matrix(matcher, monkeypatch):
+    # Catalogs too large for the P×P matrix score the requested rows on the fly
+    monkeypatch.setattr(pattern_matcher, 'MATRIX_MAX_PATTERNS', 0)
+    pattern_ids = list(matcher.pattern_rows)
+    similar = matcher.find_similar_batch(pattern_ids, 5)
+    for pattern_id in pattern_ids:
+        assert similar[pattern_id] == expected_similar(matcher, pattern_id, 5)
+
+
+def test_find_similar_batch_matches_find_similar_patterns(matcher):
+    pattern_ids = list(matcher.pattern_rows)
+    similar = matcher.find_similar_batch(pattern_ids, 5)
+    for pattern_id in pattern_ids:
+        single = matcher.find_similar_patterns(pattern_id)
+        assert [(p['id'], p['similarity']) for p in single] == [
+            (matcher.patterns[index]['id'], similarity) for index, similarity in similar[pattern_id]]
@@ -0,0 +1,26 @@
+# tests/test_color_index.py
+import pytest
+
+from color_index import lab_to_hex, parse_hex
+
+
+@pytest.mark.parametrize('value', ['#c03a2b', 'c03a2b', ' C03A2B '])
+def test_parse_hex_round_trips(value):
+    assert lab_to_hex(parse_hex(value)) == '#c03a2b'
+
+
+def test_parse_hex_expands_short_form():
+    assert lab_to_hex(parse_hex('#f00')) == '#ff0000'
+
+
+@pytest.mark.parametrize('value', ['zzzzzz', '+fffff', 'c03a2', '#12345g', ''])
+def test_parse_hex_rejects_non_hex(value):
+    with pytest.raises(ValueError, match='hex must be 3 or 6 hex digits'):
+        parse_hex(value)
+
+
+@pytest.mark.parametrize('route', ['/api/combinations/by-color', '/api/colors/search'])
+def test_color_routes_report_a_clean_error(client, route):
+    response = client.get(f'{route}?hex=zzzzzz')
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'hex must be 3 or 6 hex digits, e.g. c03a2b'}
@@ -0,0 +1,100 @@
+# tests/test_facets.py
+"""/api/combinations/query's bitmap facets against a brute-force scan of every combination."""
+import random
+
+import pytest
+
+from catalog import load_herbs, load_patterns
+from facets import HERB_FACETS, PATTERN_FACETS, SCORE_BUCKETS, CombinationFacets
+from pattern_matcher import PatternMatcher
+from synthetic_data import synthetic_catalog
+
+
+def facet_values(records, key):
+    return {value for record in records for value in key(record) if value is not None}
+
+
+def unique_combinations(matcher):
+    """(pattern row, herb column, scalar score) of every unique id pair, in catalog order"""
+    unique_rows, unique_cols = matcher.score_engine.unique_axes()
+    return [(row, col, matcher.calculate_match_score(pattern, herb))
+            for row, pattern in enumerate(matcher.patterns) if unique_rows[row]
+            for col, herb in enumerate(matcher.herbs) if unique_cols[col]]
+
+
+def brute_force(matcher, combinations, filters, min_score, max_score, limit, offset):
+    """(total, ranked, counts) from a scan of every combination"""
+    def accepted(records, facets, skip):
+        """Indices of the records that pass every filter on facets except skip"""
+        return {index for index, record in enumerate(records)
+                if all(any(value in values for value in facets[name](record))
+                       for name, values in filters.items() if name in facets and name != skip)}
+
+    accepted_pairs = {}
+
+    def passes(row, col, skip=None):
+        if skip not in accepted_pairs:
+            accepted_pairs[skip] = (accepted(matcher.patterns, PATTERN_FACETS, skip),
+                                    accepted(matcher.herbs, HERB_FACETS, skip))
+        rows, cols = accepted_pairs[skip]
+        return row in rows and col in cols
+
+    in_range = [(row, col, score) for row, col, score in combinations if min_score <= score <= max_score]
+    matching = [combination for combination in in_range if passes(*combination[:2])]
+    ranked = sorted(matching, key=lambda combination: -combination[2])[offset:offset + limit]
+
+    counts = {}
+    for facets, side in ((PATTERN_FACETS, 0), (HERB_FACETS, 1)):
+        records = matcher.patterns if side == 0 else matcher.herbs
+        for name, key in facets.items():
+            others = [combination for combination in in_range if passes(*combination[:2], skip=name)]
+            counts[name] = {}
+            for combination in others:
+                for value in dict.fromkeys(key(records[combination[side]])):
+                    if value is not None:
+                        counts[name][value] = counts[name].get(value, 0) + 1
+    counts['score'] = {bucket: sum(1 for row, col, score in combinations if low <= score <= high and passes(row, col))
+                       for bucket, low, high in SCORE_BUCKETS}
+    return len(matching), ranked, counts
+
+
+def random_query(rng, matcher):
+    filters = {}
+    for facets, records in ((PATTERN_FACETS, matcher.patterns), (HERB_FACETS, matcher.herbs)):
+        for name, key in facets.items():
+            if rng.random() < 0.4:
+                values = sorted(facet_values(records, key), key=str)
+                filters[name] = rng.sample(values, min(len(values), rng.randint(1, 2)))
+                if rng.random() < 0.1:
+                    filters[name].append('no-such-value')
+    min_score = rng.choice([0, 0, 10, 30, 50])
+    max_score = rng.choice([100, 100, 40, 60, 75])
+    if min_score > max_score:
+        min_score, max_score = max_score, min_score
+    return filters, min_score, max_score, rng.choice([0, 5, 20]), rng.choice([0, 0, 3, 50])
+
+
+@pytest.mark.parametrize('source', ['synthetic', 'data'])
+def test_query_matches_brute_force(source):
+    patterns, herbs = synthetic_catalog() if source == 'synthetic' else (load_patterns(), load_herbs())
+    matcher = PatternMatcher(patterns, herbs)
+    facets = CombinationFacets.from_matcher(matcher)
+    combinations = unique_combinations(matcher)
+    rng = random.Random(20)
+    for _ in range(200):
+        query = random_query(rng, matcher)
+        assert facets.query(*query) == brute_force(matcher, combinations, *query), query
+
+
+def test_query_route_normalizes_filters(client):
+    from app import catalog
+    color = catalog.patterns[0]['colors'][0]
+    mixed = client.get(f'/api/combinations/query?color={color.upper()}&culture=chinese,muslim').get_json()
+    split = client.get(f'/api/combinations/query?color={color.lower()}&culture=chinese&culture=muslim').get_json()
+    assert mixed == split
+    assert mixed['filters']['color'] == [color.lower()]
+
+
+def test_query_route_rejects_an_empty_score_range(client):
+    response = client.get('/api/combinations/query?min_score=60&max_score=40')
+    assert response.status_code == 400
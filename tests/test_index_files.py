@@ -0,0 +1,38 @@
+# tests/test_index_files.py
+"""The shared index directory layout: atomic manifests, pruned matrices, one builder at a time."""
+import os
+
+import numpy as np
+
+from index_files import acquire_build_lock, read_manifest, write_index, write_manifest
+
+
+def test_write_index_points_the_manifest_at_the_new_matrix(tmp_path):
+    write_index(tmp_path, 'embeddings', np.zeros((2, 3), dtype=np.float32), {'entries': ['a', 'b']})
+    write_index(tmp_path, 'embeddings', np.ones((1, 3), dtype=np.float32), {'entries': ['c']})
+    manifest = read_manifest(tmp_path)
+    assert manifest['entries'] == ['c']
+    assert np.load(tmp_path / manifest['matrix']).tolist() == [[1.0, 1.0, 1.0]]
+    # Older matrices with the same prefix are pruned; nothing else is touched
+    assert sorted(os.listdir(tmp_path)) == sorted(['manifest.json', manifest['matrix']])
+
+
+def test_write_index_keeps_other_prefixes(tmp_path):
+    write_index(tmp_path, 'palettes', np.zeros(1), {})
+    write_index(tmp_path, 'embeddings', np.zeros(1), {})
+    assert len([name for name in os.listdir(tmp_path) if name.startswith('palettes-')]) == 1
+
+
+def test_write_manifest_leaves_no_temp_files(tmp_path):
+    write_manifest(tmp_path, {'version': 1})
+    write_manifest(tmp_path, {'version': 2})
+    assert read_manifest(tmp_path) == {'version': 2}
+    assert os.listdir(tmp_path) == ['manifest.json']
+
+
+def test_build_lock_is_exclusive(tmp_path):
+    lock = acquire_build_lock(tmp_path)
+    assert lock is not None
+    assert acquire_build_lock(tmp_path) is None
+    os.remove(lock)
+    assert acquire_build_lock(tmp_path) is not None
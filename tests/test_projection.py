@@ -0,0 +1,40 @@
+# tests/test_projection.py
+"""?fields= projections: one cache entry per field set, kept apart from the precomputed bodies."""
+import itertools
+
+from payloads import parse_fields, project
+
+KNOWN = ('id', 'name', 'image', 'culture', 'type', 'colors')
+
+
+def test_parse_fields_is_order_independent():
+    assert parse_fields('type,id', KNOWN) == parse_fields('id,,type, id', KNOWN) == ('id', 'type')
+    assert parse_fields('zzz', KNOWN) == ()
+    assert parse_fields(None, KNOWN) is None
+
+
+def test_project_keeps_missing_fields_missing():
+    assert project([{'id': 1, 'name': 'a'}, {'id': 2}], ('id', 'name')) == [{'id': 1, 'name': 'a'}, {'id': 2}]
+
+
+def test_field_orderings_share_one_cached_body(client):
+    from app import current_snapshot
+    snapshot = current_snapshot()
+    before = set(snapshot.projections._entries)
+    orderings = list(itertools.islice(itertools.permutations(KNOWN), 300))
+    bodies = {client.get(f"/api/patterns?fields={','.join(fields)}").get_data() for fields in orderings}
+    assert len(bodies) == 1
+    assert set(snapshot.projections._entries) - before <= {f"patterns?fields={','.join(KNOWN)}"}
+    assert len(snapshot.projections._entries) <= len(before) + 1
+    assert 'recommended' in snapshot.responses._entries
+
+
+def test_projections_cannot_evict_precomputed_bodies(client):
+    from app import current_snapshot
+    snapshot = current_snapshot()
+    known = ('id', 'name', 'image', 'culture', 'type', 'meaning', 'elements', 'colors')
+    for size in range(1, len(known) + 1):
+        for fields in itertools.combinations(known, size):
+            assert client.get(f"/api/patterns?fields={','.join(fields)}").status_code == 200
+    assert len(snapshot.projections._entries) <= snapshot.projections.max_entries
+    assert 'recommended' in snapshot.responses._entries
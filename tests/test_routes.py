@@ -0,0 +1,26 @@
+# tests/test_routes.py
+"""Malformed request bodies get a 4xx JSON answer, never a 500."""
+import pytest
+
+
+@pytest.mark.parametrize('top_k', [None, 'abc', [5]])
+def test_match_visual_rejects_bad_top_k(client, top_k):
+    response = client.post('/api/match/visual', json={'image': 'x.png', 'top_k': top_k})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'top_k must be an integer'}
+
+
+@pytest.mark.parametrize('body', [
+    {'pattern_id': [1], 'herb_id': 'herb_1'},
+    {'pattern_id': 'pattern_1', 'herb_id': {'id': 1}},
+])
+def test_combine_story_unhashable_ids_are_not_found(client, body):
+    response = client.post('/api/combine/story', json=body)
+    assert response.status_code == 404
+    assert response.get_json() == {'error': 'Pattern or herbal medicine not found'}
+
+
+def test_match_patterns_unhashable_id_finds_nothing(client):
+    response = client.post('/api/match/patterns', json={'pattern_id': [1]})
+    assert response.status_code == 200
+    assert response.get_json() == []
@@ -0,0 +1,68 @@
+# tests/test_sampler.py
+"""?session= tokens for the random feed: the history a client carries between requests."""
+import base64
+import random
+
+import pytest
+
+from sampler import SESSION_MAX_PAIRS, decode_session, encode_session
+
+VERSION = '3f2a9c0d81b4e6a7'
+
+
+def raw_token(raw):
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+@pytest.mark.parametrize('flat_indices', [
+    [],
+    [0],
+    [5, 5, 0, 3],
+    [10 ** 6, 3, 999_999, 0, 2 ** 40],
+    random.Random(3).sample(range(2_000_000), SESSION_MAX_PAIRS),
+])
+def test_session_round_trips(flat_indices):
+    token = encode_session(VERSION, flat_indices)
+    assert set(token) <= set('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_')
+    assert decode_session(token, VERSION) == flat_indices
+
+
+def test_session_keeps_the_most_recent_pairs():
+    flat_indices = list(range(SESSION_MAX_PAIRS + 50))
+    assert decode_session(encode_session(VERSION, flat_indices), VERSION) == flat_indices[-SESSION_MAX_PAIRS:]
+
+
+def test_session_from_another_data_version_is_empty():
+    token = encode_session(VERSION, [1, 2, 3])
+    assert decode_session(token, 'another-version') == []
+    assert decode_session(token, VERSION[:-1]) == []
+
+
+@pytest.mark.parametrize('token', [
+    '!!!',
+    raw_token(b'no separator'),
+    raw_token(VERSION.encode() + b'.\x85'),  # varint cut off mid-number
+    raw_token(VERSION.encode() + b'.' + b'\xff' * 10 + b'\x01'),  # varint wider than 64 bits
+    raw_token(VERSION.encode() + b'.\x01'),  # first delta -1: a negative index
+    raw_token(VERSION.encode() + b'.' + b'\x02' * (SESSION_MAX_PAIRS + 1)),  # more pairs than a token holds
+])
+def test_malformed_session_is_empty(token):
+    assert decode_session(token, VERSION) == []
+
+
+def test_random_feed_does_not_repeat_within_a_session(client):
+    served, session = [], ''
+    for seed in range(5):
+        response = client.get(f'/api/combinations/random?count=20&seed={seed}&session={session}')
+        assert response.status_code == 200
+        session = response.headers['X-Session']
+        served.extend((c['pattern']['id'], c['herb']['id']) for c in response.get_json())
+    assert len(served) == 100
+    assert len(set(served)) == 100
+
+
+def test_random_feed_ignores_a_foreign_session(client):
+    response = client.get(f"/api/combinations/random?count=3&session={encode_session('old-version', [0, 1])}")
+    assert response.status_code == 200
+    from app import current_snapshot
+    assert len(decode_session(response.headers['X-Session'], current_snapshot().version)) == 3
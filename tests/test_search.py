@@ -0,0 +1,67 @@
+# tests/test_search.py
+"""Pattern search: token, prefix and CJK matches, with a substring fallback for everything else."""
+import pytest
+
+from search_index import FIELD_WEIGHTS, SearchIndex
+
+PATTERNS = [
+    {'id': 'p1', 'name': 'Honeysuckle Pattern', 'culture': 'chinese', 'image': '忍冬纹_page-0001.jpg',
+     'meaning': 'Longevity and endurance', 'style_tags': ['floral', 'classic'], 'elements': ['vine']},
+    {'id': 'p2', 'name': 'Lotus Scroll', 'culture': 'chinese', 'image': '莲花纹.png',
+     'meaning': 'Purity', 'description': 'A honey-colored lotus scroll', 'style_tags': ['floral']},
+    {'id': 'p3', 'name': 'Kawung Palm Fruit Pattern', 'culture': 'indonesian', 'image': 'kawung.jpg',
+     'meaning': 'Justice (and order)', 'style_tags': ['geometric'], 'elements': ['palm fruit']},
+]
+
+
+@pytest.fixture(scope='module')
+def index():
+    return SearchIndex(PATTERNS)
+
+
+def ids(index, keyword, culture=None):
+    return [pattern['id'] for pattern in index.search(keyword, culture)[0]]
+
+
+def old_substring_search(keyword, culture=None):
+    """The linear scan search replaced, over the fields the index covers"""
+    needle = keyword.lower()
+    return [pattern['id'] for pattern in PATTERNS
+            if (not culture or pattern.get('culture') == culture)
+            and any(needle in value.lower() for field in FIELD_WEIGHTS
+                    for value in ([pattern[field]] if isinstance(pattern.get(field), str) else pattern.get(field, [])))]
+
+
+def test_whole_words_and_prefixes(index):
+    assert ids(index, 'lotus') == ['p2']
+    assert ids(index, 'honey') == ['p1', 'p2']  # name prefix outranks a description word
+    assert ids(index, 'floral scroll') == ['p2']
+
+
+def test_cjk_bigrams_match_image_names(index):
+    assert ids(index, '忍冬') == ['p1']
+    assert ids(index, '忍冬纹') == ['p1']
+
+
+@pytest.mark.parametrize('keyword', ['suckle', 'ckle', 'otus', 'ung palm', '(', 'ice (and', 'SUCKLE'])
+def test_queries_without_token_hits_fall_back_to_substrings(index, keyword):
+    assert ids(index, keyword) == old_substring_search(keyword)
+    assert ids(index, keyword)
+
+
+def test_fallback_respects_culture(index):
+    assert ids(index, 'suckle', 'chinese') == ['p1']
+    assert ids(index, 'suckle', 'indonesian') == []
+
+
+def test_no_match_and_no_keyword(index):
+    assert ids(index, 'zzz') == []
+    assert ids(index, '') == ['p1', 'p2', 'p3']
+    assert ids(index, '', 'chinese') == ['p1', 'p2']
+    assert index.search('', limit=1, offset=1) == ([PATTERNS[1]], 3)
+
+
+def test_search_route_finds_infixes(client):
+    response = client.get('/api/search/patterns?q=suckle')
+    assert [pattern['name'] for pattern in response.get_json()] == ['Honeysuckle Pattern']
+    assert response.headers['X-Total-Count'] == '1'
@@ -0,0 +1,83 @@
+# tests/test_similarity.py
+"""The precomputed similarity matrix against the scalar loop it replaced."""
+import numpy as np
+import pytest
+
+import pattern_matcher
+from catalog import load_herbs, load_patterns
+from pattern_matcher import PatternMatcher
+from similarity_engine import SimilarityEngine
+from synthetic_data import synthetic_catalog
+
+
+def old_similarity(pattern1, pattern2):
+    """calculate_pattern_similarity as it was before the matrix"""
+    score = 0
+    if pattern1.get('culture') == pattern2.get('culture'):
+        score += 20
+    if pattern1.get('type') == pattern2.get('type'):
+        score += 20
+    colors1, colors2 = set(pattern1.get('colors', [])), set(pattern2.get('colors', []))
+    score += len(colors1 & colors2) / max(len(colors1), 1) * 30
+    tags1, tags2 = set(pattern1.get('style_tags', [])), set(pattern2.get('style_tags', []))
+    score += len(tags1 & tags2) / max(len(tags1), 1) * 30
+    return min(score, 100) / 100
+
+
+def old_find_similar_patterns(patterns, pattern_id, top_n=5):
+    """find_similar_patterns as it was before the matrix: a scan, a threshold and a stable sort"""
+    target = next((pattern for pattern in patterns if pattern.get('id') == pattern_id), None)
+    if not target:
+        return []
+    similar = [{**pattern, 'similarity': round(old_similarity(target, pattern), 2)}
+               for pattern in patterns
+               if pattern.get('id') != pattern_id and old_similarity(target, pattern) > 0.3]
+    similar.sort(key=lambda x: x['similarity'], reverse=True)
+    return similar[:top_n]
+
+
+@pytest.fixture(params=['seed-7', 'seed-11', 'data'])
+def patterns(request):
+    if request.param == 'data':
+        return load_patterns()
+    return synthetic_catalog(seed=int(request.param.split('-')[1]))[0]
+
+
+def test_similarity_matrix_matches_old_similarity(patterns):
+    matrix = SimilarityEngine(patterns).similarity_matrix()
+    for i, first in enumerate(patterns):
+        for j, second in enumerate(patterns):
+            expected = old_similarity(first, second)
+            similarity = float(matrix[i, j]) / 100
+            assert round(similarity, 2) == round(expected, 2)
+            assert (similarity > 0.3) == (expected > 0.3)
+
+
+def test_similarity_blocks_and_subsets_match_the_matrix(patterns):
+    engine = SimilarityEngine(patterns)
+    matrix = engine.similarity_matrix()
+    assert np.array_equal(np.float32(engine.similarity_block(3, 40)), matrix[3:40])
+    count = len(patterns)
+    rows = np.array([count // 2, 0, count - 1, count // 2, 1])  # unsorted, with a repeat
+    assert np.array_equal(np.float32(engine.similarity_of(rows)), matrix[rows])
+    assert np.array_equal(np.float32(engine.similarity_subset(rows)), matrix[np.ix_(rows, rows)])
+
+
+@pytest.mark.parametrize('use_matrix', [True, False])
+@pytest.mark.parametrize('top_n', [1, 5, 20])
+def test_find_similar_patterns_matches_old_implementation(patterns, monkeypatch, use_matrix, top_n):
+    if not use_matrix:
+        monkeypatch.setattr(pattern_matcher, 'MATRIX_MAX_PATTERNS', 0)
+    matcher = PatternMatcher(patterns, load_herbs())
+    for pattern_id in dict.fromkeys(pattern.get('id') for pattern in patterns):
+        assert matcher.find_similar_patterns(pattern_id, top_n) == old_find_similar_patterns(patterns, pattern_id, top_n)
+    assert matcher.find_similar_patterns('missing') == []
+
+
+def test_find_similar_for_all_matches_old_implementation(patterns):
+    matcher = PatternMatcher(patterns, load_herbs())
+    similar = matcher.find_similar_for_all(5)
+    assert list(similar) == list(dict.fromkeys(pattern.get('id') for pattern in patterns))
+    for pattern_id, matches in similar.items():
+        assert matches == [{'id': p['id'], 'similarity': p['similarity']}
+                           for p in old_find_similar_patterns(patterns, pattern_id, 5)]
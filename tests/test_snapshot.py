@@ -0,0 +1,9 @@
+# tests/test_snapshot.py
+"""A new snapshot carries every structure the request path reads, built before it is swapped in."""
+
+
+def test_build_snapshot_warms_request_path_structures(client):
+    from app import build_snapshot
+    snapshot = build_snapshot()
+    assert {'recommendations', 'combination_sampler', 'combination_facets'} <= set(snapshot._derived)
+    assert 'recommended' in snapshot.responses._entries
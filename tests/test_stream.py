@@ -0,0 +1,99 @@
+# tests/test_stream.py
+"""The ranked combination stream and its resume cursors."""
+import json
+
+import numpy as np
+import pytest
+
+from pattern_matcher import PatternMatcher
+from score_engine import iter_ranked
+from synthetic_data import synthetic_catalog
+
+
+def old_ranking(matcher):
+    """find_all_combinations' order before the score matrix: first id pair wins, stable sort on score"""
+    ranked, seen = [], set()
+    for pattern_index, pattern in enumerate(matcher.patterns):
+        for herb_index, herb in enumerate(matcher.herbs):
+            key = f"{pattern.get('id', '')}_{herb.get('id', '')}"
+            if key in seen:
+                continue
+            seen.add(key)
+            ranked.append((pattern_index, herb_index, matcher.calculate_match_score(pattern, herb)))
+    ranked.sort(key=lambda item: item[2], reverse=True)
+    return ranked
+
+
+@pytest.fixture(scope='module')
+def matcher():
+    return PatternMatcher(*synthetic_catalog())
+
+
+@pytest.fixture(scope='module')
+def expected(matcher):
+    return old_ranking(matcher)
+
+
+def resume_points(ranked):
+    """Positions worth resuming after: both ends and the edges of every score level"""
+    points = {0, len(ranked) - 1}
+    for position in range(1, len(ranked)):
+        if ranked[position][2] != ranked[position - 1][2]:
+            points.update((position - 1, position))
+    return sorted(points)
+
+
+def test_stream_order_matches_old_ranking(matcher, expected):
+    assert list(matcher.iter_ranked_combinations()) == expected
+
+
+def test_stream_order_from_the_score_matrix(expected):
+    matcher = PatternMatcher(*synthetic_catalog())
+    matcher.score_matrix()
+    assert list(matcher.iter_ranked_combinations()) == expected
+
+
+@pytest.mark.parametrize('block_rows', [1, 7, 1000])
+def test_resume_has_no_gaps_or_duplicates(matcher, expected, block_rows):
+    engine = matcher.score_engine
+    herbs = len(matcher.herbs)
+    for position in resume_points(expected):
+        pattern_index, herb_index, score = expected[position]
+        after = (score, pattern_index * herbs + herb_index)
+        resumed = iter_ranked(engine.score_block, engine.shape, *engine.unique_axes(), after=after,
+                              block_rows=block_rows)
+        assert list(resumed) == expected[position + 1:]
+
+
+def test_filters_match_old_ranking(matcher, expected):
+    mask = np.array([p.get('culture') == 'chinese' for p in matcher.patterns], dtype=bool)
+    assert list(matcher.iter_ranked_combinations(min_score=30, pattern_mask=mask)) == [
+        item for item in expected if item[2] >= 30 and mask[item[0]]]
+
+
+def read_lines(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_route_pages_through_the_whole_stream(client):
+    full = read_lines(client.get('/api/combinations/stream'))
+    keys = [(line['pattern_id'], line['herb_id']) for line in full]
+    assert len(keys) == len(set(keys))
+
+    paged, cursor = [], None
+    while True:
+        url = '/api/combinations/stream?limit=7' + (f'&cursor={cursor}' if cursor else '')
+        page = read_lines(client.get(url))
+        if not page:
+            break
+        paged.extend(page)
+        cursor = page[-1]['cursor']
+    assert paged == full
+
+
+def test_route_rejects_foreign_and_malformed_cursors(client):
+    from app import encode_cursor
+    response = client.get(f"/api/combinations/stream?cursor={encode_cursor('other-version', 50, 0)}")
+    assert response.status_code == 409
+    response = client.get('/api/combinations/stream?cursor=not-a-cursor')
+    assert response.status_code == 400
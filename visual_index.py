@@ -0,0 +1,284 @@
+# visual_index.py
+"""Image-based pattern similarity over a memory-mapped descriptor matrix.
+
+Every image in data/patterns is reduced to a CPU-only descriptor: an HSV color
+histogram plus a grid of gradient-orientation (texture) histograms. The rows
+are stored as a .npy matrix that every worker opens with mmap, so the OS page
+cache holds a single copy.
+
+Build or incrementally update the index at deploy time (run from the project
+root); the app also updates it in a background thread, never in a request:
+
+    python visual_index.py
+    python visual_index.py --workers 4
+"""
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from index_files import LOCK_FILE, PATTERN_IMAGES, acquire_build_lock, list_images, read_manifest, write_index
+
+INDEX_DIR = os.path.join('cache', 'visual')
+IMAGE_DIRECTORY = PATTERN_IMAGES
+
+# Bump when the descriptor changes so old indexes are rebuilt instead of mixed
+DESCRIPTOR = 'hsv-8x4x4+grad-4x4x8-v1'
+DESCRIPTOR_SIZE = 8 * 4 * 4 + 4 * 4 * 8
+WORKING_SIZE = 256
+
+
+def _read_image(path):
+    """cv2.imread can't open non-ASCII paths on Windows; decode from bytes instead"""
+    image = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError(f"cannot decode {path}")
+    return cv2.resize(image, (WORKING_SIZE, WORKING_SIZE), interpolation=cv2.INTER_AREA)
+
+
+def compute_descriptor(path):
+    """L2-normalized color + texture descriptor of one image"""
+    image = _read_image(path)
+
+    # Color: HSV histogram
+    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+    color = cv2.calcHist([hsv], [0, 1, 2], None, [8, 4, 4], [0, 180, 0, 256, 0, 256]).ravel()
+
+    # Texture: magnitude-weighted gradient orientations on a 4x4 grid
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY).astype(np.float32)
+    gx = cv2.Sobel(gray, cv2.CV_32F, 1, 0, ksize=3)
+    gy = cv2.Sobel(gray, cv2.CV_32F, 0, 1, ksize=3)
+    magnitude, angle = cv2.cartToPolar(gx, gy)
+    bins = (np.mod(angle, np.pi) / np.pi * 8).astype(np.intp).clip(0, 7)
+    cell = WORKING_SIZE // 4
+    cell_row = np.arange(WORKING_SIZE)[:, None] // cell
+    cell_col = np.arange(WORKING_SIZE)[None, :] // cell
+    flat_bins = (cell_row * 4 + cell_col) * 8 + bins
+    texture = np.bincount(flat_bins.ravel(), weights=magnitude.ravel(), minlength=4 * 4 * 8)
+
+    parts = []
+    for part in (color, texture):
+        # Hellinger (square-root) mapping makes cosine behave well on histograms
+        part = np.sqrt(part / max(part.sum(), 1e-12))
+        parts.append(part / max(np.linalg.norm(part), 1e-12))
+    descriptor = np.concatenate(parts).astype(np.float32)
+    return descriptor / max(np.linalg.norm(descriptor), 1e-12)
+
+
+def _file_state(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _describe(path):
+    try:
+        return compute_descriptor(path), None
+    except Exception as e:
+        return None, str(e)
+
+
+def build_index(image_directory=IMAGE_DIRECTORY, index_dir=INDEX_DIR, workers=1):
+    """Create or incrementally update the index; only new or modified images are decoded.
+
+    Returns the number of images (re)computed.
+    """
+    previous = VisualIndex.load(index_dir)
+    reusable = {}
+    if previous is not None:
+        for row, entry in enumerate(previous.entries):
+            reusable[entry['name']] = (entry['mtime_ns'], entry['size'], row)
+
+    entries, rows, pending = [], [], []
+    for name in list_images(image_directory):
+        path = os.path.join(image_directory, name)
+        mtime_ns, size = _file_state(path)
+        cached = reusable.get(name)
+        if cached is not None and cached[:2] == (mtime_ns, size):
+            rows.append(previous.matrix[cached[2]])
+        else:
+            rows.append(None)
+            pending.append((len(entries), path))
+        entries.append({'name': name, 'mtime_ns': mtime_ns, 'size': size})
+
+    if not pending and previous is not None and len(entries) == len(previous.entries):
+        return 0
+
+    paths = [path for _, path in pending]
+    if workers > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_describe, paths))
+    else:
+        results = [_describe(path) for path in paths]
+
+    failed = set()
+    for (position, path), (descriptor, error) in zip(pending, results):
+        if descriptor is None:
+            print(f"Cannot describe image {path}: {error}")
+            failed.add(position)
+        rows[position] = descriptor
+
+    keep = [i for i in range(len(entries)) if i not in failed]
+    matrix = np.zeros((len(keep), DESCRIPTOR_SIZE), dtype=np.float32)
+    for out_row, position in enumerate(keep):
+        matrix[out_row] = rows[position]
+    write_index(index_dir, 'embeddings', matrix,
+                {'descriptor': DESCRIPTOR, 'dim': DESCRIPTOR_SIZE, 'entries': [entries[i] for i in keep]})
+    return len(pending) - len(failed)
+
+
+class VisualIndex:
+    """Read-only view of a built index; the matrix is memory-mapped"""
+
+    def __init__(self, entries, matrix):
+        self.entries = entries
+        self.matrix = matrix
+        self.row_by_name = {entry['name']: row for row, entry in enumerate(entries)}
+
+    @classmethod
+    def load(cls, index_dir=INDEX_DIR):
+        """Open the index, or return None if it is missing or was built with another descriptor"""
+        try:
+            manifest = read_manifest(index_dir)
+            if manifest.get('descriptor') != DESCRIPTOR:
+                return None
+            matrix = np.load(os.path.join(index_dir, manifest['matrix']), mmap_mode='r')
+        except (OSError, ValueError, KeyError):
+            return None
+        return cls(manifest['entries'], matrix)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def similar(self, vector, top_k=5, exclude_row=None):
+        """[(image name, cosine similarity)] for the top_k rows, one matrix-vector product"""
+        if len(self.entries) == 0:
+            return []
+        similarities = np.asarray(self.matrix @ vector, dtype=np.float32)
+        if exclude_row is not None:
+            similarities[exclude_row] = -np.inf
+        k = min(top_k, len(similarities) - (exclude_row is not None))
+        if k <= 0:
+            return []
+        best = np.argpartition(-similarities, k - 1)[:k]
+        best = best[np.argsort(-similarities[best], kind='stable')]
+        return [(self.entries[row]['name'], float(similarities[row])) for row in best]
+
+    def similar_to_image(self, name, top_k=5):
+        row = self.row_by_name.get(name)
+        if row is None:
+            return None
+        return self.similar(np.asarray(self.matrix[row]), top_k, exclude_row=row)
+
+
+class BackgroundIndexManager:
+    """Per-process handle on an index that is checked and rebuilt by a daemon thread.
+
+    Requests never build: get() returns the last loaded index (at first, what
+    is already on disk, else None) and, at most once per check_interval,
+    starts a thread that compares the sources' signature and rebuilds when
+    they changed. Subclasses provide _signature_now(), _load() and _build().
+    """
+
+    def __init__(self, index_dir, check_interval=5.0):
+        self.index_dir = index_dir
+        self.check_interval = check_interval
+        self._index = None
+        self._loaded = False
+        self._signature = None
+        self._checked_at = None
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Current index (None until one exists); never waits for a build"""
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return self._index
+
+        with self._lock:
+            if not self._loaded:
+                self._index = self._load()
+                self._loaded = True
+            due = self._checked_at is None or now - self._checked_at >= self.check_interval
+            if due and not self._refreshing:
+                self._checked_at = now
+                self._refreshing = True
+                threading.Thread(target=self._refresh_in_background, daemon=True,
+                                 name=f"{type(self).__name__}-refresh").start()
+            return self._index
+
+    def refresh(self):
+        """Check the sources and rebuild if they changed, in the calling thread"""
+        signature = self._signature_now()
+        if self._index is not None and signature == self._signature:
+            return self._index
+        index, complete = self._rebuild()
+        self._index = index
+        self._loaded = True
+        if complete:
+            self._signature = signature
+        return index
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"Cannot refresh {type(self).__name__}: {e}")
+        finally:
+            self._refreshing = False
+
+    def _rebuild(self):
+        """(index, whether it is up to date); another process holding the build lock means 'not yet'"""
+        lock = acquire_build_lock(self.index_dir)
+        if lock is None:
+            return self._load(), False
+        try:
+            self._build()
+        finally:
+            os.remove(lock)
+        return self._load(), True
+
+
+class VisualIndexManager(BackgroundIndexManager):
+    """Visual index of data/patterns, refreshed when images are added or changed"""
+
+    def __init__(self, image_directory=IMAGE_DIRECTORY, index_dir=INDEX_DIR, check_interval=5.0):
+        super().__init__(index_dir, check_interval)
+        self.image_directory = image_directory
+
+    def _signature_now(self):
+        images = list_images(self.image_directory)
+        return tuple((name, *_file_state(os.path.join(self.image_directory, name))) for name in images)
+
+    def _load(self):
+        return VisualIndex.load(self.index_dir)
+
+    def _build(self):
+        build_index(self.image_directory, self.index_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or update the visual similarity index')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    lock = acquire_build_lock(INDEX_DIR)
+    if lock is None:
+        print(f"Another process is building the index ({os.path.join(INDEX_DIR, LOCK_FILE)})")
+        return
+
+    start = time.time()
+    try:
+        updated = build_index(workers=args.workers)
+    finally:
+        os.remove(lock)
+    index = VisualIndex.load()
+    print(f"Visual index: {len(index) if index else 0} images, {updated} (re)computed in {time.time() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,10 @@
+# wsgi.py
+"""Production entry point (the debug server in app.py is for development only).
+
+    gunicorn -c gunicorn.conf.py wsgi:application
+
+Importing the app loads the catalog, builds the indexes and the score matrix
+and freezes the heap. With preload_app the gunicorn master does this once,
+and every forked worker shares those pages instead of building its own copy.
+"""
+from app import app as application